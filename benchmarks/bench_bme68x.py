@@ -0,0 +1,154 @@
+"""
+Compares the vendor library's BME68x measurement path with the forced-mode engine.
+
+Compensation: cost per sample of the vendor's per-field `_calc_*` methods plus a
+scalar dew point, against `compensate` over batches of raw samples that each mix
+`CHIPS` chips, as an engine batch across adapters does, checking both give the
+same metrics.
+
+Measurement: simulated BME680s on separate adapters, each read once per round
+with `get_sensor_data` and its attributes, or through `bme68x_engine`. Reports
+wall time per round, I2C transactions per sample and how many samples were fresh.
+
+    PYTHONPATH=src python benchmarks/bench_bme68x.py
+"""
+import asyncio
+import math
+import random
+import time
+
+import bme680
+import EasyMCP2221
+
+from piphi_network_official_i2c_library.lib.adapter_io import AdapterIO
+from piphi_network_official_i2c_library.lib.bme68x import (
+    FIELD0,
+    FIELD_LENGTH,
+    BME68xChip,
+    bme68x_engine,
+    compensate,
+    parse_field,
+)
+from piphi_network_official_i2c_library.lib.drivers import BME68xDriver
+from piphi_network_official_i2c_library.lib.simulator import BME680Model, SimulatedDevice
+
+BATCH_SIZES = (1, 16, 256)
+
+SAMPLES = 4096
+
+CHIPS = 16
+
+SENSOR_COUNTS = (1, 10, 50)
+
+ROUNDS = 5
+
+I2C_LATENCY = 0.002
+
+
+def dew_point(temperature, humidity):
+    x = math.log(humidity / 100) + (17.625 * temperature) / (243.04 + temperature)
+    return (243.04 * x) / (17.625 - x)
+
+
+def vendor_compensate(sensor, raw):
+    adc_temp, adc_pres, adc_hum, adc_gas, gas_range = raw
+    temperature = sensor._calc_temperature(adc_temp) / 100.0
+    pressure = sensor._calc_pressure(adc_pres) / 100.0
+    humidity = sensor._calc_humidity(adc_hum) / 1000.0
+    gas = sensor._calc_gas_resistance(adc_gas, gas_range)
+    return {
+        "temperature": temperature,
+        "pressure": pressure,
+        "humidity": humidity,
+        "gas": gas,
+        "dew_pt": dew_point(temperature, humidity),
+    }
+
+
+def open_chip(latency=0.0, seed=0, tph_time=0.034):
+    model = BME680Model(rng=random.Random(seed), tph_time=tph_time)
+    device = SimulatedDevice([model], latency=latency, rng=random.Random(seed))
+    bus = EasyMCP2221.SMBus(mcp=device)
+    sensor = bme680.BME680(i2c_addr=model.address, i2c_device=bus)
+    BME68xDriver.configure(sensor)
+    return model, device, bus, sensor
+
+
+def bench_compensation():
+    chips = []
+    for seed in range(CHIPS):
+        model, _, _, sensor = open_chip(seed=seed, tph_time=0)
+        chips.append((model, sensor, BME68xChip(sensor, None, model.address)))
+    samples = []
+    for index in range(SAMPLES):
+        model, sensor, chip = chips[index % CHIPS]
+        model.measure()
+        raw = parse_field(model.registers[FIELD0:FIELD0 + FIELD_LENGTH], chip.calibration.variant)
+        samples.append((sensor, chip.calibration, raw))
+
+    started = time.perf_counter()
+    expected = [vendor_compensate(sensor, raw) for sensor, _, raw in samples]
+    vendor_us = (time.perf_counter() - started) / SAMPLES * 1e6
+
+    pairs = [(calibration, raw) for _, calibration, raw in samples]
+    print(f"{'batch':>6}{'vendor us':>11}{'engine us':>11}{'speedup':>9}")
+    for size in BATCH_SIZES:
+        started = time.perf_counter()
+        columns = {}
+        for offset in range(0, SAMPLES, size):
+            for metric, values in compensate(pairs[offset:offset + size]).items():
+                columns.setdefault(metric, []).extend(values)
+        engine_us = (time.perf_counter() - started) / SAMPLES * 1e6
+        for index, metrics in enumerate(expected):
+            for metric, value in metrics.items():
+                assert math.isclose(columns[metric][index], value, rel_tol=1e-12), (metric, index)
+        print(f"{size:>6}{vendor_us:>11.2f}{engine_us:>11.2f}{vendor_us / engine_us:>8.1f}x")
+
+
+async def vendor_round(sensors):
+    async def read(io, sensor):
+        fresh = await io.run(sensor.get_sensor_data)
+        data = sensor.data
+        return fresh, (data.temperature, data.pressure, data.humidity, data.gas_resistance)
+
+    return [fresh for fresh, _ in await asyncio.gather(*(read(io, sensor) for io, sensor in sensors))]
+
+
+async def engine_round(chips):
+    results = await asyncio.gather(*(bme68x_engine.measure(io, chip) for io, chip in chips))
+    return [metrics is not None for metrics in results]
+
+
+async def bench_measurement():
+    print(f"\n{'sensors':>8}{'path':>8}{'round ms':>10}{'tx/sample':>11}{'fresh':>7}")
+    for count in SENSOR_COUNTS:
+        adapters = []
+        for index in range(count):
+            _, device, bus, sensor = open_chip(I2C_LATENCY, index)
+            io = AdapterIO(f"/dev/ttyBENCH{index}")
+            adapters.append((io, device, bus, sensor))
+        sensors = [(io, sensor) for io, _, _, sensor in adapters]
+        chips = [(io, BME68xChip(sensor, bus, sensor.i2c_addr)) for io, _, bus, sensor in adapters]
+        for name, run, targets in (("vendor", vendor_round, sensors), ("engine", engine_round, chips)):
+            transactions = sum(device.transactions for _, device, _, _ in adapters)
+            fresh = 0
+            started = time.perf_counter()
+            for _ in range(ROUNDS):
+                fresh += sum(await run(targets))
+            elapsed = (time.perf_counter() - started) / ROUNDS * 1000
+            transactions = sum(device.transactions for _, device, _, _ in adapters) - transactions
+            print(
+                f"{count:>8}{name:>8}{elapsed:>10.1f}{transactions / (count * ROUNDS):>11.1f}"
+                f"{fresh / (count * ROUNDS):>7.0%}"
+            )
+        for io, _, _, _ in adapters:
+            io.executor.shutdown(wait=False)
+
+
+def main():
+    bench_compensation()
+    asyncio.run(bench_measurement())
+
+
+if __name__ == "__main__":
+    main()
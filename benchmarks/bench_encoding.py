@@ -0,0 +1,65 @@
+"""
+Compares the JSON telemetry message with the compact encoding.
+
+Reports bytes per message and encode cost per message for every registered driver.
+
+    PYTHONPATH=src python benchmarks/bench_encoding.py
+"""
+import datetime
+import json
+import time
+
+from piphi_network_official_i2c_library.lib.drivers import drivers
+from piphi_network_official_i2c_library.lib.encoding import CompactEncoder
+
+ITERATIONS = 20000
+
+SAMPLES = {
+    "BME68x": {"temperature": 21.37, "pressure": 1012.6, "humidity": 41.2, "gas": 182340.0, "dew_pt": 7.8},
+    "BME280": {"temperature": 21.37, "pressure": 1012.6, "humidity": 41.2},
+    "AHT20": {"temperature": 21.37, "humidity": 41.2},
+    "PMSA003I": {field: 12 + index for index, field in enumerate(drivers["PMSA003I"].fields)},
+}
+
+HEADERS = {
+    "x-container-id": "3f1c9a2be7d04c55",
+    "x-piphi-signature": "9b1f0c6e2d7a4b3c8e5f1a2d3c4b5a6f7e8d9c0b1a2f3e4d5c6b7a8f9e0d1c2b",
+    "device_id": "c0ffee00-1234-5678-9abc-def012345678",
+}
+
+
+def encode_json(driver, metrics):
+    data = dict(HEADERS)
+    data["metrics"] = driver.format(metrics)
+    data["timestamp"] = datetime.datetime.now().isoformat()
+    data["units"] = driver.units
+    return json.dumps(data).encode("utf-8")
+
+
+def encode_compact(encoder, metrics):
+    schema, _ = encoder.schema_for(metrics)
+    return encoder.encode(schema, metrics, time.time())
+
+
+def measure(fn, *args):
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        payload = fn(*args)
+    return len(payload), (time.perf_counter() - started) / ITERATIONS * 1e6
+
+
+def main():
+    print(f"{'sensor':<10}{'json B':>8}{'compact B':>11}{'ratio':>7}{'json us':>9}{'compact us':>12}")
+    for name, metrics in SAMPLES.items():
+        driver = drivers[name]
+        encoder = CompactEncoder(dict(HEADERS, sensor=name, units=driver.units))
+        json_bytes, json_us = measure(encode_json, driver, metrics)
+        compact_bytes, compact_us = measure(encode_compact, encoder, metrics)
+        print(
+            f"{name:<10}{json_bytes:>8}{compact_bytes:>11}{json_bytes / compact_bytes:>7.1f}"
+            f"{json_us:>9.2f}{compact_us:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
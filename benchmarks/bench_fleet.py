@@ -0,0 +1,123 @@
+"""
+Runs the service against fleets of simulated MCP2221 adapters and an in-process broker.
+
+For each fleet size, reports the time `refresh_discovery` takes to probe every
+adapter, the sustained poll throughput against the configured rate, scheduler lag and
+overruns, and the end-to-end latency from taking a sample to the broker receiving it.
+
+    PYTHONPATH=src python benchmarks/bench_fleet.py
+"""
+import asyncio
+import datetime
+import json
+import logging
+import os
+import statistics
+import time
+
+os.environ.setdefault("SPOOL_ENABLED", "0")
+os.environ.setdefault("HISTORY_ENABLED", "0")
+
+from piphi_network_official_i2c_library.contract import config
+from piphi_network_official_i2c_library.contract.schema import I2cSensorsSchema
+from piphi_network_official_i2c_library.lib.adapter_io import AdapterIO
+from piphi_network_official_i2c_library.lib.common import PiPhiMCP2221
+from piphi_network_official_i2c_library.lib.publisher import publisher
+from piphi_network_official_i2c_library.lib.scheduler import scheduler
+from piphi_network_official_i2c_library.lib.simulator import SimulatedBroker, SimulatedFleet
+
+FLEET_SIZES = (1, 10, 50, 200)
+
+POLL_INTERVAL = 1.0
+
+DURATION = 10.0
+
+I2C_LATENCY = 0.002
+
+
+def reset_discovery():
+    PiPhiMCP2221.reset()
+    AdapterIO.shutdown_all()
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def run_fleet(count: int) -> dict:
+    reset_discovery()
+    SimulatedFleet(count, latency=I2C_LATENCY).install()
+    broker = SimulatedBroker()
+    publisher.client_factory = broker.client
+    latencies = []
+
+    def on_message(topic, payload, retain, received):
+        sampled = datetime.datetime.fromisoformat(json.loads(payload)["timestamp"]).timestamp()
+        latencies.append(received - sampled)
+
+    broker.listeners.append(on_message)
+    await publisher.start()
+    await scheduler.start()
+
+    service = PiPhiMCP2221()
+    started = time.perf_counter()
+    found = await service.refresh_discovery(full=True)
+    discovery = time.perf_counter() - started
+
+    for index, entry in enumerate(found):
+        await config.set_config(
+            I2cSensorsSchema(
+                usbpath=entry["usbpath"],
+                id=f"sim-{index}",
+                secret="benchmark",
+                container_id="benchmark",
+                interval=POLL_INTERVAL,
+            )
+        )
+    await asyncio.sleep(POLL_INTERVAL)
+    latencies.clear()
+    delivered = broker.delivered
+    overruns = scheduler.overruns
+    scheduler.max_lag = 0.0
+    await asyncio.sleep(DURATION)
+    throughput = (broker.delivered - delivered) / DURATION
+
+    for device_id in list(config.polling):
+        config.stop_polling(device_id)
+    await scheduler.stop()
+    await publisher.stop()
+    return {
+        "adapters": count,
+        "found": len(found),
+        "discovery_s": discovery,
+        "target_per_s": len(found) / POLL_INTERVAL,
+        "polls_per_s": throughput,
+        "max_lag_ms": scheduler.max_lag * 1000,
+        "overruns": scheduler.overruns - overruns,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": (statistics.fmean(latencies) if latencies else float("nan")) * 1000,
+    }
+
+
+async def main():
+    logging.basicConfig(level=logging.WARNING)
+    print(
+        f"{'adapters':>8}{'found':>7}{'discovery s':>13}{'target/s':>10}{'polls/s':>9}"
+        f"{'max lag ms':>12}{'overruns':>10}{'p50 ms':>8}{'p99 ms':>8}"
+    )
+    for count in FLEET_SIZES:
+        result = await run_fleet(count)
+        print(
+            f"{result['adapters']:>8}{result['found']:>7}{result['discovery_s']:>13.3f}"
+            f"{result['target_per_s']:>10.1f}{result['polls_per_s']:>9.1f}{result['max_lag_ms']:>12.1f}"
+            f"{result['overruns']:>10}{result['p50_ms']:>8.2f}{result['p99_ms']:>8.2f}"
+        )
+    AdapterIO.shutdown_all()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
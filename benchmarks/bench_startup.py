@@ -0,0 +1,91 @@
+"""
+Measures how quickly the service answers after it is started.
+
+Starts the app under uvicorn against simulated fleets whose adapters are slow to
+open and reports the import time of the app module, the time until `/health`
+first answers 200 and the time until `/health/ready` does, i.e. until the first
+discovery pass has finished in the background.
+
+    PYTHONPATH=src python benchmarks/bench_startup.py
+"""
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+SCENARIOS = (
+    # adapters, seconds to open each adapter; opens slower than I2C_CALL_TIMEOUT time out
+    (1, 0.01),
+    (50, 0.01),
+    (50, 2.0),
+    (200, 5.0),
+)
+
+PORT = 36690
+
+TIMEOUT = 60.0
+
+APP = "piphi_network_official_i2c_library.app"
+
+
+def environment(adapters: int, open_latency: float) -> dict:
+    env = dict(os.environ)
+    env.update(
+        SIMULATED_ADAPTERS=str(adapters),
+        SIMULATED_OPEN_LATENCY=str(open_latency),
+        DISCOVERY_TIMEOUT=str(open_latency * 4 + 10),
+        DISCOVERY_ADAPTER_TIMEOUT=str(open_latency * 2 + 5),
+        SPOOL_ENABLED="0",
+        MQTT_PORT="1",
+        LOG_LEVEL="error",
+    )
+    return env
+
+
+def import_time() -> float:
+    script = f"import time; started = time.perf_counter(); import {APP}; print(time.perf_counter() - started)"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    return float(output.stdout.strip())
+
+
+def wait_for(url: str, started: float) -> float:
+    while time.perf_counter() - started < TIMEOUT:
+        try:
+            with urllib.request.urlopen(url, timeout=1.0) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.005)
+    return float("nan")
+
+
+def run_scenario(adapters: int, open_latency: float) -> dict:
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{APP}:app", "--port", str(PORT), "--log-level", "error"],
+        env=environment(adapters, open_latency),
+    )
+    try:
+        healthy = wait_for(f"http://127.0.0.1:{PORT}/health", started)
+        ready = wait_for(f"http://127.0.0.1:{PORT}/health/ready", started)
+    finally:
+        server.terminate()
+        server.wait()
+    return {"adapters": adapters, "open_s": open_latency, "health_s": healthy, "ready_s": ready}
+
+
+def main():
+    print(f"app import: {import_time() * 1000:.0f} ms")
+    print(f"{'adapters':>8}{'open s':>8}{'first 200 s':>13}{'ready s':>9}")
+    for adapters, open_latency in SCENARIOS:
+        result = run_scenario(adapters, open_latency)
+        print(
+            f"{result['adapters']:>8}{result['open_s']:>8.2f}{result['health_s']:>13.3f}{result['ready_s']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
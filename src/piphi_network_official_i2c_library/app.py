@@ -1,4 +1,6 @@
 import json
+import logging
+import os
 import multiprocessing
 from pathlib import Path
 from fastapi import FastAPI
@@ -7,11 +9,22 @@ import aiofiles
 from piphi_network_official_i2c_library.contract.discovery import discovery_router
 from piphi_network_official_i2c_library.lib.lifespan import lifespan
 from piphi_network_official_i2c_library.contract.config import router as config_router
+from piphi_network_official_i2c_library.contract.health import router as health_router
+from piphi_network_official_i2c_library.contract.history import router as history_router
+from piphi_network_official_i2c_library.contract.live import router as live_router
+from piphi_network_official_i2c_library.contract.metrics import router as metrics_router
+
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "info").upper())
+
 app = FastAPI(lifespan=lifespan)
 
 
 app.include_router(discovery_router)
 app.include_router(router=config_router)
+app.include_router(router=health_router)
+app.include_router(router=metrics_router)
+app.include_router(router=live_router)
+app.include_router(router=history_router)
 
 
 @app.get("/manifest.json")
@@ -1,29 +1,42 @@
 import asyncio
 import datetime
+import functools
 import hashlib
 import hmac
 import json
+import logging
 import math
 import os
 import sys
-from typing import Dict, List
-import aiomqtt
-import bme680
+import time
+from typing import Dict, List, Optional
 from fastapi import APIRouter, HTTPException
-from bme680 import BME680
 from piphi_network_official_i2c_library.contract.schema import I2cSensorsSchema
+from piphi_network_official_i2c_library.lib import sharding
+from piphi_network_official_i2c_library.lib.breaker import CircuitBreaker
 from piphi_network_official_i2c_library.lib.common import PiPhiMCP2221
+from piphi_network_official_i2c_library.lib.deadband import AdaptiveInterval, Deadband, DeadbandRule
+from piphi_network_official_i2c_library.lib.drivers import SensorDriver, drivers
+from piphi_network_official_i2c_library.lib.encoding import COMPACT_TOPIC, CompactEncoder, flatten_stats
+from piphi_network_official_i2c_library.lib.history import history
+from piphi_network_official_i2c_library.lib.latest import latest
+from piphi_network_official_i2c_library.lib.metrics import deadband_suppressed
+from piphi_network_official_i2c_library.lib.publisher import publisher
+from piphi_network_official_i2c_library.lib.ringbuffer import SampleWindow
+from piphi_network_official_i2c_library.lib.scheduler import scheduler
 
 if sys.platform.lower() == "win32" or os.name.lower() == "nt":
     from asyncio import set_event_loop_policy, WindowsSelectorEventLoopPolicy
 
     set_event_loop_policy(WindowsSelectorEventLoopPolicy())
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(tags=["config"])
 
-device_store = {}
+TELEMETRY_TOPIC = "piphi/telemetry"
 
-polling: Dict[str, asyncio.Task] = {}
+polling: Dict[str, dict] = {}
 
 
 def sign_payload(payload: dict, secret: str):
@@ -33,226 +46,369 @@ def sign_payload(payload: dict, secret: str):
     ).hexdigest()
 
 
-async def calculate_dew_pt(sensor: BME680):
+async def set_sensor(usbpath: str, sensor_id: Optional[str] = None):
+    """
+    Initialises a discovered sensor for polling.
+
+    The sensor is claimed before its driver is initialised, so concurrent configs
+    for different devices cannot both take it, and released again if init fails.
+
+    Args:
+        usbpath (str): The adapter carrying the sensor.
+        sensor_id (Optional[str]): The sensor on the adapter, defaults to the first one found.
+
+    Returns:
+        Optional[dict]: The sensor's poll state, or None if it is unknown, unsupported or already polled.
     """
-    Calculate dew point using the BME680's temperature and humidity readings.
-    This function uses a more efficient algorithm to reduce the number of operations.
+    topology = PiPhiMCP2221.mcp_mapping.get(usbpath)
+    node = topology.find(sensor_id) if topology is not None else None
+    logger.debug("configuring sensor %s on %s: %s", sensor_id, usbpath, node and node.describe())
+    if node is None or node.active or node.driver not in drivers:
+        return None
+    driver = drivers[node.driver]
+    io = topology.io_for(node)
+    node.active = True
+    try:
+        handle = await driver.init(io, topology.mcp, topology.bus, node.address)
+    except BaseException:
+        node.active = False
+        raise
+    return {
+        "driver": driver,
+        "handle": handle,
+        "io": io,
+        "usbpath": usbpath,
+        "node": node,
+        "breaker": CircuitBreaker.for_adapter(usbpath),
+    }
+
+
+async def reopen_sensors(usbpath: str):
     """
-    a = 17.625
-    b = 243.04
-    t = sensor.data.temperature
-    h = sensor.data.humidity / 100
-    x = math.log(h) + (a * t) / (b + t)
-    dew_pt = (b * x) / (a - x)
-    return dew_pt
-
-
-async def set_sensor(usbpath: str):
-    print(PiPhiMCP2221.mcp_mapping[usbpath])
-    if (
-        PiPhiMCP2221.mcp_mapping[usbpath]["active"] == False
-        and PiPhiMCP2221.mcp_mapping[usbpath]["sensor"] == "BME68x"
-    ):
-        bme = await PiPhiMCP2221.get_bme680_sensor(
-            PiPhiMCP2221.mcp_mapping[usbpath]["bus"], usbpath
-        )
-        return {"bme68x": bme}
-    if (
-        PiPhiMCP2221.mcp_mapping[usbpath]["active"] == False
-        and PiPhiMCP2221.mcp_mapping[usbpath]["sensor"] == "BME280"
-    ):
-        bme = await PiPhiMCP2221.get_bme280_sensor(
-            PiPhiMCP2221.mcp_mapping[usbpath]["bus"], usbpath
+    Reopens an adapter and rebuilds the handles of every sensor polled on it.
+
+    Each poller is pointed at the adapter's current I/O worker and breaker, which
+    may have been replaced while the adapter was away.
+    """
+    topology = await PiPhiMCP2221.reopen_adapter(usbpath)
+    if topology is None:
+        return
+    for sensor_dict in polling.values():
+        if sensor_dict["usbpath"] != usbpath:
+            continue
+        node = topology.find(sensor_dict["node"].sensor_id) or sensor_dict["node"]
+        node.active = True
+        sensor_dict["node"] = node
+        sensor_dict["io"] = topology.io_for(node)
+        sensor_dict["breaker"] = CircuitBreaker.for_adapter(usbpath)
+        sensor_dict["handle"] = await sensor_dict["driver"].init(
+            sensor_dict["io"], topology.mcp, topology.bus, node.address
         )
-        if bme is not None:
-            PiPhiMCP2221.mcp_mapping[usbpath]["active"] = True
-        return {"bme280": bme}
-    if (
-        PiPhiMCP2221.mcp_mapping[usbpath]["active"] == False
-        and PiPhiMCP2221.mcp_mapping[usbpath]["sensor"] == "AHT20"
-    ):
-        return {"aht20": PiPhiMCP2221.mcp_mapping[usbpath]["mcp"]}
-    if (
-        PiPhiMCP2221.mcp_mapping[usbpath]["active"] == False
-        and PiPhiMCP2221.mcp_mapping[usbpath]["sensor"] == "PMSA003I"
-    ):
-        return {"pmsa003i": PiPhiMCP2221.mcp_mapping[usbpath]["bus"]}
-
-
-async def poll_sensor(sensor_dict: dict, container_id: str, signature: str):
-    data = {}
-    data["x-container-id"] = container_id
-    data["x-piphi-signature"] = signature
-    if "bme68x" in sensor_dict:
-        sensor_dict["bme68x"].set_humidity_oversample(bme680.constants.OS_2X)
-        sensor_dict["bme68x"].set_pressure_oversample(bme680.constants.OS_4X)
-        sensor_dict["bme68x"].set_temperature_oversample(bme680.constants.OS_8X)
-        sensor_dict["bme68x"].set_filter(bme680.constants.FILTER_SIZE_3)
-        sensor_dict["bme68x"].set_gas_status(bme680.constants.ENABLE_GAS_MEAS)
-        sensor_dict["bme68x"].set_gas_heater_temperature(320)
-        sensor_dict["bme68x"].set_gas_heater_duration(150)
-        sensor_dict["bme68x"].select_gas_heater_profile(0)
-        while True:
-            data["metrics"]["temperature"] = round(sensor_dict["bme68x"].data.temperature)
-            data["metrics"]["pressure"] = round(sensor_dict["bme68x"].data.pressure)
-            data["metrics"]["humidity"] = round(sensor_dict["bme68x"].data.humidity)
-            data["metrics"]["gas"] = round(sensor_dict["bme68x"].data.gas_resistance)
-            data["metrics"]["dew_pt"] = round(await calculate_dew_pt(sensor_dict["bme68x"]))
-            data["device_id"] = device_store.get("id")
-            data["timestamp"] = datetime.datetime.now().isoformat()
-            data["units"] = {
-                "temperature": "C",
-                "pressure": "hPa",
-                "humidity": "%",
-                "gas": "ohm",
-                "dew_pt": "C",
-            }
-            async with aiomqtt.Client("localhost") as client:
-                await client.publish(
-                    "piphi/telemetry", json.dumps(data), qos=1, retain=True
-                )
-            await asyncio.sleep(10)
-    if "bme280" in sensor_dict:
-        while True:
-            data["metrics"]["temperature"] = sensor_dict["bme280"].get_temperature()
-            data["metrics"]["pressure"] = sensor_dict["bme280"].get_pressure()
-            data["metrics"]["humidity"] = sensor_dict["bme280"].get_humidity()
-            data["device_id"] = device_store.get("id")
-            data["timestamp"] = datetime.datetime.now().isoformat()
-            data["units"] = {"temperature": "C", "pressure": "hPa", "humidity": "%"}
-            async with aiomqtt.Client("localhost") as client:
-                await client.publish(
-                    "piphi/telemetry", json.dumps(data), qos=1, retain=True
-                )
-            await asyncio.sleep(10)
-    if "aht20" in sensor_dict:
-        while True:
-            sensor_dict["aht20"].I2C_write(0x38, [0xAC, 0x33, 0x00])
-            await asyncio.sleep(10)
-            mcp_data = sensor_dict["aht20"].I2C_read(0x38, 7)
-            if mcp_data[0] & 0x80 == 0:
-                humidity_raw = (
-                    (mcp_data[1] << 12) | (mcp_data[2] << 4) | (mcp_data[3] >> 4)
-                )
-                humidity = (humidity_raw / 1048576.0) * 100
-                temp_raw = (
-                    ((mcp_data[3] & 0x0F) << 16) | (mcp_data[4] << 8) | mcp_data[5]
-                )
-                temperature = (temp_raw / 1048576.0) * 200 - 50
-                data["metrics"]["temperature"] = round(temperature)
-                data["metrics"]["humidity"] = round(humidity)
-                data["device_id"] = device_store.get("id")
-                data["timestamp"] = datetime.datetime.now().isoformat()
-                data["units"] = {"temperature": "C", "humidity": "%"}
-                async with aiomqtt.Client("localhost") as client:
-                    await client.publish(
-                        "piphi/telemetry", json.dumps(data), qos=1, retain=True
-                    )
-            await asyncio.sleep(10)
-    if "pmsa003i" in sensor_dict:
-        while True:
-            pdata = sensor_dict["pmsa003i"].read_i2c_block_data(0x12, 0x00, 32)
-            if len(pdata) != 32 or pdata[0] != 0x42 or pdata[1] != 0x4D:
-                print("Invalid header or length")
-            checksum = sum(pdata[:30]) & 0xFFFF
-            received_checksum = (pdata[30] << 8) | pdata[31]
-            if checksum != received_checksum:
-                print(
-                    f"Checksum mismatch: calculated {checksum:04X}, received {received_checksum:04X}"
-                )
-            pm1_0_standard = (pdata[4] << 8) | pdata[5]
-            pm2_5_standard = (pdata[6] << 8) | pdata[7]
-            pm10_standard = (pdata[8] << 8) | pdata[9]
-            pm1_0_env = (pdata[10] << 8) | pdata[11]
-            pm2_5_env = (pdata[12] << 8) | pdata[13]
-            pm10_env = (pdata[14] << 8) | pdata[15]
-            particles_03um = (pdata[16] << 8) | pdata[17]
-            particles_05um = (pdata[18] << 8) | pdata[19]
-            particles_10um = (pdata[20] << 8) | pdata[21]
-            particles_25um = (pdata[22] << 8) | pdata[23]
-            particles_50um = (pdata[24] << 8) | pdata[25]
-            particles_100um = (pdata[26] << 8) | pdata[27]
-
-            aqdata ={
-                "pm10_standard": pm1_0_standard,
-                "pm25_standard": pm2_5_standard,
-                "pm100_standard": pm10_standard,
-                "pm10_env": pm1_0_env,
-                "pm25_env": pm2_5_env,
-                "pm100_env": pm10_env,
-                "particles_03um": particles_03um,
-                "particles_05um": particles_05um,
-                "particles_10um": particles_10um,
-                "particles_25um": particles_25um,
-                "particles_50um": particles_50um,
-                "particles_100um": particles_100um,
-            }
-            if aqdata:
-                print("\nConcentration Units (standard)")
-                print("---------------------------------------")
-                print(
-                    f"PM 1.0: {aqdata['pm10_standard']}\tPM2.5: {aqdata['pm25_standard']}\tPM10: {aqdata['pm100_standard']}"
-                )
-                print("Concentration Units (environmental)")
-                print("---------------------------------------")
-                print(
-                    f"PM 1.0: {aqdata['pm10_env']}\tPM2.5: {aqdata['pm25_env']}\tPM10: {aqdata['pm100_env']}"
-                )
-                print("---------------------------------------")
-                print(f"Particles > 0.3um / 0.1L air: {aqdata['particles_03um']}")
-                print(f"Particles > 0.5um / 0.1L air: {aqdata['particles_05um']}")
-                print(f"Particles > 1.0um / 0.1L air: {aqdata['particles_10um']}")
-                print(f"Particles > 2.5um / 0.1L air: {aqdata['particles_25um']}")
-                print(f"Particles > 5.0um / 0.1L air: {aqdata['particles_50um']}")
-                print(f"Particles > 10 um / 0.1L air: {aqdata['particles_100um']}")
-                print("---------------------------------------")
-                data["metrics"] = aqdata
-                data["device_id"] = device_store.get("id")
-                data["timestamp"] = datetime.datetime.now().isoformat()
-                data["units"] = {
-                    "pm10_standard": "ug/m3",
-                    "pm25_standard": "ug/m3",
-                    "pm100_standard": "ug/m3",
-                    "pm10_env": "ug/m3",
-                    "pm25_env": "ug/m3",
-                    "pm100_env": "ug/m3",
-                    "particles_03um": "#/0.1L air",
-                    "particles_05um": "#/0.1L air",
-                    "particles_10um": "#/0.1L air",
-                    "particles_25um": "#/0.1L air",
-                    "particles_50um": "#/0.1L air",
-                    "particles_100um": "#/0.1L air",
-                }
-                async with aiomqtt.Client("localhost") as client:
-                    await client.publish(
-                        "piphi/telemetry", json.dumps(data), qos=1, retain=True
-                    )
-            else:
-                print("Unable to read from sensor, retrying...")
-            await asyncio.sleep(60)
 
 
-@router.post("/config")
-async def set_config(payload: I2cSensorsSchema):
-    device_store.update(payload)
-    existing_poll = polling.get(payload.id)
-    if existing_poll and not existing_poll.done():
-        polling[payload.id].cancel()
-        try:
-            await existing_poll
-        except asyncio.CancelledError:
-            pass
-    signature = sign_payload(payload.model_dump(), device_store.get("secret"))
-    sensor = await set_sensor(payload.usbpath)
-    if sensor is not None:
-        task = asyncio.create_task(
-            poll_sensor(
-                sensor,
-                signature=signature,
-                container_id=device_store.get("container_id"),
-            )
+async def take_sample(sensor_dict: dict) -> Optional[Dict[str, float]]:
+    """
+    Reads the sensor through its adapter's circuit breaker.
+
+    The breaker is looked up by usbpath on every sample, so the one reported by
+    /health/adapters is always the one gating the poller. A sample cancelled
+    part-way counts as a failure, so a half-open trial always ends in a verdict.
+
+    Returns:
+        Optional[Dict[str, float]]: The sample, or None if the breaker is holding the adapter back.
+    """
+    breaker = sensor_dict["breaker"] = CircuitBreaker.for_adapter(sensor_dict["usbpath"])
+    if not breaker.allow():
+        return None
+    try:
+        if breaker.needs_reopen:
+            await reopen_sensors(sensor_dict["usbpath"])
+        metrics = await sensor_dict["driver"].sample(sensor_dict["io"], sensor_dict["handle"])
+    except (Exception, asyncio.CancelledError) as error:
+        breaker.record_failure(error)
+        raise
+    breaker.record_success()
+    return metrics
+
+
+def release_sensor(sensor_dict: dict):
+    sensor_dict["node"].active = False
+
+
+def stop_polling(device_id: str):
+    existing_poll = polling.pop(device_id, None)
+    if existing_poll is not None:
+        scheduler.remove(device_id)
+        release_sensor(existing_poll)
+        history.close(device_id)
+        latest.forget(device_id)
+
+
+def publish_compact(encoder: CompactEncoder, metrics: Dict[str, float]):
+    schema, unpublished = encoder.schema_for(metrics, publisher.connections)
+    if unpublished:
+        publisher.publish(schema.topic, json.dumps(schema.document), retain=True)
+    publisher.publish(COMPACT_TOPIC, encoder.encode(schema, metrics, time.time()), retain=True)
+
+
+def report_by_exception(sensor_dict: dict, device_id: str, metrics: Dict[str, float]) -> bool:
+    """
+    Applies the device's deadband and adaptive interval to a sample.
+
+    Returns:
+        bool: True if the sample should be published.
+    """
+    deadband: Optional[Deadband] = sensor_dict.get("deadband")
+    if deadband is None:
+        return True
+    changed = deadband.changed(metrics)
+    adaptive: Optional[AdaptiveInterval] = sensor_dict.get("adaptive")
+    if adaptive is not None:
+        scheduler.set_interval(device_id, adaptive.next(changed))
+    if deadband.should_publish(metrics, time.monotonic(), changed):
+        return True
+    deadband_suppressed.inc()
+    return False
+
+
+async def poll_sensor(sensor_dict: dict, container_id: str, signature: str, device_id: str):
+    """
+    Takes one sample from the sensor and hands it to the publisher.
+
+    In high-rate mode the sample goes into the device's window instead, and the
+    window's summary is published once per publish interval. Devices configured
+    with the compact encoding publish packed values against a cached schema.
+    Every sample also refreshes the device's entry in the latest-value cache and
+    is folded into its history rollups.
+    Devices with a deadband only publish samples that moved past it. While the
+    adapter's circuit breaker is open, nothing is read or published.
+    """
+    driver: SensorDriver = sensor_dict["driver"]
+    metrics = await take_sample(sensor_dict)
+    if metrics is not None:
+        history.record(device_id, metrics, time.time())
+        latest.update(
+            device_id,
+            {
+                "device_id": device_id,
+                "sensor": driver.name,
+                "timestamp": datetime.datetime.now().isoformat(),
+                "metrics": driver.format(metrics),
+                "units": driver.units,
+            },
         )
-        polling[payload.id] = task
+    window: Optional[SampleWindow] = sensor_dict.get("window")
+    encoder: Optional[CompactEncoder] = sensor_dict.get("encoder")
+    data = {
+        "x-container-id": container_id,
+        "x-piphi-signature": signature,
+        "device_id": device_id,
+    }
+    if window is None:
+        if metrics is None or not report_by_exception(sensor_dict, device_id, metrics):
+            return
+        if encoder is not None:
+            publish_compact(encoder, metrics)
+            return
+        data["metrics"] = driver.format(metrics)
     else:
+        if metrics is not None:
+            window.add(metrics)
+        now = time.monotonic()
+        if now < sensor_dict["publish_at"]:
+            return
+        sensor_dict["publish_at"] = max(sensor_dict["publish_at"] + sensor_dict["publish_interval"], now)
+        stats = window.drain()
+        if not stats:
+            return
+        means = {metric: summary["mean"] for metric, summary in stats.items()}
+        if not report_by_exception(sensor_dict, device_id, means):
+            return
+        if encoder is not None:
+            publish_compact(encoder, flatten_stats(stats))
+            return
+        data["metrics"] = means
+        data["stats"] = stats
+    data["timestamp"] = datetime.datetime.now().isoformat()
+    data["units"] = driver.units
+    publisher.publish(sensor_dict.get("topic", TELEMETRY_TOPIC), json.dumps(data), retain=True)
+
+
+def configure_sensor(sensor: dict, payload: I2cSensorsSchema, signature: str):
+    """
+    Applies the software side of a device config to its poll state and schedules it.
+
+    Only the parts whose settings changed are rebuilt, so an in-place update keeps
+    the device's sample window, deadband reference and compact schema when they
+    are not affected; the schema is rebuilt whenever its static fields, the
+    signature included, differ. The chip itself is never touched here. The container id and
+    signature come from this payload alone, so concurrent configs cannot mix them.
+
+    Every setting is parsed before the poll state is touched, so a malformed config
+    is rejected with a 400 and leaves the device as it was.
+    """
+    config = payload.model_dump(exclude_unset=True)
+    container_id = getattr(payload, "container_id", None)
+    previous = sensor.get("config", {})
+
+    def changed(*keys: str) -> bool:
+        return not previous or any(previous.get(key) != config.get(key) for key in keys)
+
+    driver: SensorDriver = sensor["driver"]
+    deadband = getattr(payload, "deadband", None)
+    adaptive = getattr(payload, "adaptive", None)
+    try:
+        interval = float(getattr(payload, "interval", None) or driver.interval)
+        sample_rate = getattr(payload, "sample_rate", None)
+        poll_interval = 1 / float(sample_rate) if sample_rate else interval
+        new_deadband = Deadband.from_config(deadband) if deadband else None
+        new_adaptive = AdaptiveInterval.from_config(adaptive, poll_interval) if adaptive and not sample_rate else None
+    except (AttributeError, TypeError, ValueError, ZeroDivisionError) as error:
+        raise HTTPException(status_code=400, detail=f"Invalid settings: {error}") from error
+    if sample_rate:
+        if changed("interval", "sample_rate") or "window" not in sensor:
+            sensor["window"] = SampleWindow(driver.units, math.ceil(float(sample_rate) * interval))
+            sensor["publish_interval"] = interval
+            sensor["publish_at"] = time.monotonic() + interval
+    else:
+        sensor.pop("window", None)
+    if changed("deadband", "adaptive"):
+        if new_deadband is not None:
+            sensor["deadband"] = new_deadband
+        elif adaptive:
+            sensor["deadband"] = Deadband(default=DeadbandRule(percent=1.0), heartbeat=0)
+        else:
+            sensor.pop("deadband", None)
+    if new_adaptive is not None:
+        if changed("adaptive", "interval", "sample_rate") or "adaptive" not in sensor:
+            sensor["adaptive"] = new_adaptive
+        poll_interval = sensor["adaptive"].interval
+    else:
+        sensor.pop("adaptive", None)
+    if getattr(payload, "encoding", None) == "compact":
+        static = {
+            "device_id": payload.id,
+            "x-container-id": container_id,
+            "x-piphi-signature": signature,
+            "sensor": driver.name,
+            "units": driver.units,
+        }
+        if "encoder" not in sensor or sensor["encoder"].static != static:
+            sensor["encoder"] = CompactEncoder(static)
+    else:
+        sensor.pop("encoder", None)
+    sensor["topic"] = getattr(payload, "topic", None) or TELEMETRY_TOPIC
+    sensor["config"] = config
+    run = functools.partial(
+        poll_sensor,
+        sensor,
+        signature=signature,
+        container_id=container_id,
+        device_id=payload.id,
+    )
+    if scheduler.update(payload.id, poll_interval, run) is None:
+        scheduler.add(
+            payload.id,
+            adapter=payload.usbpath,
+            channel=sensor["node"].channel,
+            interval=poll_interval,
+            aligned=driver.aligned,
+            run=run,
+        )
+
+
+def reusable_sensor(payload: I2cSensorsSchema) -> Optional[dict]:
+    """Returns the device's current poll state if the new config targets the same sensor."""
+    existing = polling.get(payload.id)
+    if existing is None or existing["usbpath"] != payload.usbpath:
+        return None
+    topology = PiPhiMCP2221.mcp_mapping.get(payload.usbpath)
+    if topology is None or topology.find(getattr(payload, "sensor_id", None)) is not existing["node"]:
+        return None
+    return existing
+
+
+async def apply_config(payload: I2cSensorsSchema) -> dict:
+    """
+    Applies one device config.
+
+    A config that targets the sensor the device already polls is applied in place:
+    the poller keeps running and the chip is not reinitialised. Otherwise the old
+    poller is stopped and the sensor is initialised from scratch; if the config
+    then fails, the sensor is released so a corrected config can claim it.
+
+    Returns:
+        dict: The device id and `status`, one of `created`, `updated` or `reinitialised`.
+    """
+    signature = sign_payload(payload.model_dump(exclude_unset=True), getattr(payload, "secret", None))
+    existing = reusable_sensor(payload)
+    if existing is not None:
+        configure_sensor(existing, payload, signature)
+        return {"id": payload.id, "status": "updated"}
+    replaced = payload.id in polling
+    stop_polling(payload.id)
+    sensor = await set_sensor(payload.usbpath, getattr(payload, "sensor_id", None))
+    if sensor is None:
         raise HTTPException(status_code=404, detail="Sensor not supported")
-    return
+    try:
+        await asyncio.to_thread(history.open, payload.id, list(sensor["driver"].units))
+        configure_sensor(sensor, payload, signature)
+    except BaseException:
+        scheduler.remove(payload.id)
+        history.close(payload.id)
+        release_sensor(sensor)
+        raise
+    polling[payload.id] = sensor
+    return {"id": payload.id, "status": "reinitialised" if replaced else "created"}
+
+
+@router.post("/config")
+async def set_config(payload: I2cSensorsSchema):
+    if sharding.supervisor is not None:
+        return await sharding.supervisor.configure(payload.model_dump(exclude_unset=True))
+    if not await PiPhiMCP2221.wait_ready():
+        raise HTTPException(status_code=503, detail="Discovery is still running")
+    return await apply_config(payload)
+
+
+async def apply_batch_entry(payload: I2cSensorsSchema) -> dict:
+    try:
+        if sharding.supervisor is not None:
+            return await sharding.supervisor.configure(payload.model_dump(exclude_unset=True))
+        return await apply_config(payload)
+    except HTTPException as exception:
+        return {"id": payload.id, "status": "error", "status_code": exception.status_code, "detail": exception.detail}
+    except Exception as exception:
+        logger.exception("configuring %s failed", payload.id)
+        return {"id": payload.id, "status": "error", "status_code": 500, "detail": str(exception)}
+
+
+@router.post("/config/batch")
+async def set_config_batch(payloads: List[I2cSensorsSchema]):
+    """
+    Applies many device configs concurrently and reports the outcome of each.
+
+    Configs for different adapters initialise in parallel, and configs that only
+    change settings such as the interval, topic or secret are applied in place.
+    A device id that appears more than once is only applied the first time.
+    """
+    if sharding.supervisor is None and not await PiPhiMCP2221.wait_ready():
+        raise HTTPException(status_code=503, detail="Discovery is still running")
+    seen = set()
+    entries = []
+    for payload in payloads:
+        if payload.id in seen:
+            entries.append(None)
+            continue
+        seen.add(payload.id)
+        entries.append(apply_batch_entry(payload))
+    applied = iter(await asyncio.gather(*(entry for entry in entries if entry is not None)))
+    results = [
+        next(applied) if entry is not None else {"id": payload.id, "status": "error", "status_code": 409, "detail": "Duplicate device id"}
+        for payload, entry in zip(payloads, entries)
+    ]
+    return {
+        "results": results,
+        "applied": sum(1 for result in results if result["status"] != "error"),
+        "failed": sum(1 for result in results if result["status"] == "error"),
+    }
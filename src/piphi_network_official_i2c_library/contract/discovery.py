@@ -2,6 +2,7 @@
 
 from fastapi import APIRouter
 
+from piphi_network_official_i2c_library.lib import sharding
 from piphi_network_official_i2c_library.lib.common import PiPhiMCP2221
 
 discovery_router = APIRouter(tags=["discovery"])
@@ -9,9 +10,15 @@ discovery_router = APIRouter(tags=["discovery"])
 mcp_service = PiPhiMCP2221()
 
 @discovery_router.get("/discovery")
-async def discovery():
-    await mcp_service.identify_all_mcp2221()
-    devices = await mcp_service.build_discovery_results()
+async def discovery(refresh: bool = False):
+    """Returns the cached discovery results, or rescans every idle adapter when `refresh` is set."""
+    if sharding.supervisor is not None:
+        return await sharding.supervisor.discover(refresh)
+    if refresh:
+        devices = await mcp_service.refresh_discovery(full=True)
+    else:
+        devices = list(PiPhiMCP2221.discovery_cache.values())
     return {
-        "devices": devices
+        "devices": devices,
+        "timings": PiPhiMCP2221.probe_timings
     }
\ No newline at end of file
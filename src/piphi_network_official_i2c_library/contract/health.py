@@ -1,9 +1,51 @@
 from fastapi import APIRouter, HTTPException
 
+from piphi_network_official_i2c_library.lib import sharding
+from piphi_network_official_i2c_library.lib.breaker import CircuitBreaker
+from piphi_network_official_i2c_library.lib.common import PiPhiMCP2221
+from piphi_network_official_i2c_library.lib.scheduler import scheduler
+
 
 router = APIRouter(tags=['health'])
 
 
+def discovery_status() -> dict:
+    if sharding.supervisor is not None:
+        ready = sharding.supervisor.ready
+        return {'ready': ready, 'discovery': 'ready' if ready else 'running'}
+    return {'ready': PiPhiMCP2221.discovery_ready.is_set(), 'discovery': PiPhiMCP2221.discovery_state}
+
+
 @router.get('/health')
 async def health_report():
-    return {'status': 'ok'}
\ No newline at end of file
+    """Liveness: answers as soon as the API is up, reporting discovery progress without waiting for it."""
+    return {'status': 'ok', **discovery_status()}
+
+
+@router.get('/health/ready')
+async def readiness_report():
+    """Readiness: 503 until the first discovery pass has finished."""
+    status = discovery_status()
+    if not status['ready']:
+        raise HTTPException(status_code=503, detail=status)
+    return {'status': 'ok', **status}
+
+
+@router.get('/health/scheduler')
+async def scheduler_report():
+    return scheduler.stats()
+
+
+@router.get('/health/adapters')
+async def adapters_report():
+    """Circuit breaker state of every adapter that has been probed or polled."""
+    if sharding.supervisor is not None:
+        return {'adapters': await sharding.supervisor.breakers()}
+    return {'adapters': CircuitBreaker.report()}
+
+
+@router.get('/health/shards')
+async def shards_report():
+    if sharding.supervisor is None:
+        return {'enabled': False, 'workers': []}
+    return {'enabled': True, **sharding.supervisor.stats()}
@@ -0,0 +1,54 @@
+import datetime
+import time
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from piphi_network_official_i2c_library.lib.history import history, parse_resolution
+
+
+router = APIRouter(tags=['devices'])
+
+
+def parse_time(value: Optional[str], default: float) -> float:
+    """Accepts a Unix timestamp in seconds or an ISO 8601 date-time; naive times are local."""
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time {value}")
+
+
+@router.get('/devices/{device_id}/history')
+async def device_history(
+    device_id: str,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    resolution: Optional[str] = None,
+    metric: Optional[List[str]] = Query(None),
+):
+    """
+    Returns min, max, mean and count per time bucket for the device's metrics.
+
+    `from` and `to` default to the last hour. `resolution` such as `1m`, `15m`,
+    `1h` or `1d` must be a multiple of a minute; without it the store picks the
+    1-minute or 1-hour rollup from the range.
+    """
+    now = time.time()
+    end_time = parse_time(end, now)
+    start_time = parse_time(start, end_time - 3600)
+    if start_time > end_time:
+        raise HTTPException(status_code=400, detail="from is after to")
+    try:
+        seconds = parse_resolution(resolution) if resolution else None
+        result = history.query(device_id, start_time, end_time, seconds, metric, now)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    if result is None:
+        raise HTTPException(status_code=404, detail="No history for device")
+    return {"device_id": device_id, "from": start_time, "to": end_time, **result}
@@ -0,0 +1,63 @@
+import asyncio
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, WebSocket
+from fastapi.responses import StreamingResponse
+
+from piphi_network_official_i2c_library.lib.latest import latest
+
+
+router = APIRouter(tags=['devices'])
+
+keepalive_interval = float(os.environ.get("LIVE_KEEPALIVE_INTERVAL", 15.0))
+
+
+@router.get('/devices/{device_id}/latest')
+async def latest_reading(device_id: str):
+    """Returns the most recent reading taken by the device's poller, without touching the bus."""
+    reading = latest.get(device_id)
+    if reading is None:
+        raise HTTPException(status_code=404, detail="No reading for device")
+    return reading
+
+
+@router.get('/devices/stream')
+async def stream_readings(device_id: Optional[List[str]] = Query(None)):
+    """Streams readings as server-sent events, for every device or the `device_id`s given."""
+
+    async def events():
+        subscription = latest.subscribe(device_id)
+        try:
+            while True:
+                message = await subscription.get(timeout=keepalive_interval)
+                yield ": keepalive\n\n" if message is None else f"data: {message}\n\n"
+        finally:
+            latest.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.websocket('/devices/ws')
+async def stream_readings_ws(websocket: WebSocket, device_id: Optional[List[str]] = Query(None)):
+    """
+    Streams readings as WebSocket text frames, for every device or the `device_id`s given.
+
+    The subscription is dropped before the sender is reaped, since a handler
+    cancelled on shutdown may not get past that await.
+    """
+    await websocket.accept()
+    subscription = latest.subscribe(device_id)
+
+    async def forward():
+        while True:
+            await websocket.send_text(await subscription.get())
+
+    sender = asyncio.create_task(forward())
+    try:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        latest.unsubscribe(subscription)
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from piphi_network_official_i2c_library.lib.metrics import registry
+
+
+router = APIRouter(tags=['metrics'])
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+async def metrics_report():
+    """Exposes I2C, polling and publishing metrics in the Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
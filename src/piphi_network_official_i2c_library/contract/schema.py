@@ -1,7 +1,11 @@
-from pydantic import BaseModel, ConfigDict
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class I2cSensorsSchema(BaseModel):
     model_config = ConfigDict(
         extra='allow')
     usbpath: str
+    interval: Optional[float] = Field(default=None, gt=0, allow_inf_nan=False)
+    sample_rate: Optional[float] = Field(default=None, gt=0, allow_inf_nan=False)
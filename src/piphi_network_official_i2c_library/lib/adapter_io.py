@@ -0,0 +1,135 @@
+import abc
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import EasyMCP2221
+
+from piphi_network_official_i2c_library.lib.metrics import i2c_latency, i2c_not_ack, i2c_timeouts
+
+
+class BusIO(abc.ABC):
+    """
+    The I2C calls drivers make, on top of a single `run` that executes a blocking callable.
+
+    Implemented by `AdapterIO` for an adapter's own bus and by `ChannelIO` for a
+    channel behind a mux, so drivers take either without knowing which.
+    """
+
+    @abc.abstractmethod
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Runs a blocking callable against the bus."""
+
+    async def i2c_write(self, mcp: EasyMCP2221.Device, addr: int, data: List[int], timeout: Optional[float] = None):
+        return await self.run(mcp.I2C_write, addr, data, timeout=timeout)
+
+    async def i2c_read(self, mcp: EasyMCP2221.Device, addr: int, size: int = 1, timeout: Optional[float] = None) -> bytes:
+        return await self.run(mcp.I2C_read, addr, size, timeout=timeout)
+
+    async def read_byte_data(self, bus: EasyMCP2221.SMBus, addr: int, register: int, timeout: Optional[float] = None) -> int:
+        return await self.run(bus.read_byte_data, addr, register, timeout=timeout)
+
+    async def read_i2c_block_data(
+        self, bus: EasyMCP2221.SMBus, addr: int, register: int, length: int, timeout: Optional[float] = None
+    ) -> List[int]:
+        return await self.run(bus.read_i2c_block_data, addr, register, length, timeout=timeout)
+
+
+class AdapterIO(BusIO):
+    """
+    Runs the blocking USB-HID transactions of a single MCP2221 off the event loop.
+
+    Every adapter owns one worker thread, so transactions on the same adapter are
+    serialised while different adapters proceed in parallel. Each call is awaited
+    with a timeout; a timed out call keeps the worker busy until the adapter
+    returns, which holds back later transactions on that adapter only.
+    """
+
+    workers: Dict[str, "AdapterIO"] = {}
+
+    default_timeout = float(os.environ.get("I2C_CALL_TIMEOUT", 2.0))
+
+    def __init__(self, usbpath: str, timeout: Optional[float] = None):
+        self.usbpath = usbpath
+        self.timeout = timeout or AdapterIO.default_timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"mcp2221-{os.path.basename(usbpath)}"
+        )
+        self.latency = i2c_latency.labels(usbpath)
+        self.not_ack = i2c_not_ack.labels(usbpath)
+        self.timeouts = i2c_timeouts.labels(usbpath)
+
+    @classmethod
+    def for_adapter(cls, usbpath: str) -> "AdapterIO":
+        """
+        Returns the I/O worker for the adapter at the given usbpath, creating it on first use.
+
+        Args:
+            usbpath (str): The serial port path identifying the adapter.
+
+        Returns:
+            AdapterIO: The worker that owns the adapter's transactions.
+        """
+        worker = cls.workers.get(usbpath)
+        if worker is None:
+            worker = cls.workers[usbpath] = cls(usbpath)
+        return worker
+
+    @classmethod
+    def release(cls, usbpath: str):
+        worker = cls.workers.pop(usbpath, None)
+        if worker is not None:
+            worker.executor.shutdown(wait=False, cancel_futures=True)
+            for metric in (i2c_latency, i2c_not_ack, i2c_timeouts):
+                metric.remove(usbpath)
+
+    def reset(self):
+        """
+        Replaces the worker thread, abandoning a transaction that never returned.
+
+        The stuck thread is left to finish on its own; later calls run on the new one.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"mcp2221-{os.path.basename(self.usbpath)}"
+        )
+
+    @classmethod
+    def shutdown_all(cls):
+        for usbpath in list(cls.workers):
+            cls.release(usbpath)
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Runs a blocking callable on the adapter's worker thread.
+
+        Args:
+            fn (Callable): The blocking function to run.
+            timeout (Optional[float]): Seconds to wait before raising TimeoutError.
+
+        Returns:
+            Any: Whatever the callable returns.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, functools.partial(self._timed, fn, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except TimeoutError:
+            self.timeouts.inc()
+            raise
+
+    def _timed(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except EasyMCP2221.exceptions.NotAckError:
+            self.not_ack.inc()
+            raise
+        except EasyMCP2221.exceptions.TimeoutError:
+            self.timeouts.inc()
+            raise
+        finally:
+            self.latency.observe(time.perf_counter() - started)
@@ -0,0 +1,159 @@
+import asyncio
+import os
+from typing import List, Optional
+
+import EasyMCP2221
+
+from piphi_network_official_i2c_library.lib.adapter_io import BusIO
+from piphi_network_official_i2c_library.lib.metrics import registry
+
+TRIGGER_MEASUREMENT = [0xAC, 0x33, 0x00]
+
+STATUS_BUSY = 0x80
+
+
+def crc8(data: bytes) -> int:
+    """
+    Computes the AHT20 CRC-8 (polynomial 0x31, initial value 0xFF).
+
+    Args:
+        data (bytes): The status and measurement bytes covered by the checksum.
+
+    Returns:
+        int: The checksum byte.
+    """
+    crc = 0xFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+class AHT20Request:
+    def __init__(self, io: BusIO, mcp: EasyMCP2221.Device, address: int):
+        self.io = io
+        self.mcp = mcp
+        self.address = address
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class AHT20Engine:
+    """
+    Measures every AHT20 that asks for a reading at roughly the same time in one batch.
+
+    Requests arriving within `window` seconds are grouped: all conversions are
+    triggered together, the engine waits once for the conversion time, then reads
+    every result concurrently. A sensor still reporting busy is re-read a few
+    times at a short interval, and frames failing the CRC are rejected.
+    """
+
+    def __init__(
+        self,
+        conversion_time: float = 0.08,
+        window: float = 0.005,
+        busy_retries: int = 5,
+        busy_delay: float = 0.01,
+        check_crc: Optional[bool] = None,
+    ):
+        self.conversion_time = conversion_time
+        self.window = window
+        self.busy_retries = busy_retries
+        self.busy_delay = busy_delay
+        self.check_crc = (
+            check_crc if check_crc is not None else os.environ.get("AHT20_CRC", "1") != "0"
+        )
+        self.crc_errors = 0
+        self.busy_timeouts = 0
+        self._pending: List[AHT20Request] = []
+        self._collecting: Optional[asyncio.Task] = None
+
+    async def measure(self, io: BusIO, mcp: EasyMCP2221.Device, address: int = 0x38) -> Optional[bytes]:
+        """
+        Queues a measurement and waits for the batch it joins to complete.
+
+        Args:
+            io (BusIO): The I/O worker of the adapter owning the sensor.
+            mcp (EasyMCP2221.Device): The adapter the sensor is attached to.
+            address (int): The sensor's I2C address.
+
+        Returns:
+            Optional[bytes]: The 7-byte status/measurement frame, or None if it was invalid.
+        """
+        request = AHT20Request(io, mcp, address)
+        self._pending.append(request)
+        if self._collecting is None:
+            self._collecting = asyncio.create_task(self._run_batch())
+        return await request.future
+
+    async def stop(self):
+        """Cancels the batch being collected and every measurement still waiting to join one."""
+        task, self._collecting = self._collecting, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        pending, self._pending = self._pending, []
+        for request in pending:
+            request.future.cancel()
+
+    async def _trigger(self, request: AHT20Request):
+        await request.io.i2c_write(request.mcp, request.address, TRIGGER_MEASUREMENT)
+
+    async def _collect(self, request: AHT20Request) -> Optional[bytes]:
+        for attempt in range(self.busy_retries + 1):
+            frame = bytes(await request.io.i2c_read(request.mcp, request.address, 7))
+            if frame[0] & STATUS_BUSY == 0:
+                break
+            await asyncio.sleep(self.busy_delay)
+        else:
+            self.busy_timeouts += 1
+            return None
+        if self.check_crc and crc8(frame[:6]) != frame[6]:
+            self.crc_errors += 1
+            return None
+        return frame
+
+    @staticmethod
+    def _settle(request: AHT20Request, outcome):
+        if request.future.done():
+            return
+        if isinstance(outcome, BaseException):
+            request.future.set_exception(outcome)
+        else:
+            request.future.set_result(outcome)
+
+    async def _run_batch(self):
+        await asyncio.sleep(self.window)
+        batch, self._pending = self._pending, []
+        self._collecting = None
+        try:
+            triggered = await asyncio.gather(*(self._trigger(request) for request in batch), return_exceptions=True)
+            ready: List[AHT20Request] = []
+            for request, outcome in zip(batch, triggered):
+                if isinstance(outcome, BaseException):
+                    self._settle(request, outcome)
+                else:
+                    ready.append(request)
+            if not ready:
+                return
+            await asyncio.sleep(self.conversion_time)
+            frames = await asyncio.gather(*(self._collect(request) for request in ready), return_exceptions=True)
+            for request, outcome in zip(ready, frames):
+                self._settle(request, outcome)
+        finally:
+            for request in batch:
+                if not request.future.done():
+                    request.future.cancel()
+
+
+aht20_engine = AHT20Engine()
+
+registry.sampled(
+    "piphi_aht20_crc_errors_total", "AHT20 readings discarded for a CRC mismatch.", lambda: aht20_engine.crc_errors, "counter"
+)
+registry.sampled(
+    "piphi_aht20_busy_timeouts_total",
+    "AHT20 readings abandoned because the sensor stayed busy.",
+    lambda: aht20_engine.busy_timeouts,
+    "counter",
+)
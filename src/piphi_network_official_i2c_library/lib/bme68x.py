@@ -0,0 +1,343 @@
+import asyncio
+import math
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import EasyMCP2221
+
+from piphi_network_official_i2c_library.lib.adapter_io import BusIO
+from piphi_network_official_i2c_library.lib.metrics import registry
+
+if TYPE_CHECKING:
+    import bme680
+
+CTRL_MEAS = 0x74
+
+FIELD0 = 0x1D
+
+FIELD_LENGTH = 17
+
+FORCED_MODE = 0x01
+
+NEW_DATA = 0x80
+
+GAS_RANGE_MASK = 0x0F
+
+VARIANT_HIGH = 0x01
+
+OVERSAMPLING_CYCLES = (0, 1, 2, 4, 8, 16)
+
+RawSample = Tuple[int, int, int, int, int]
+
+
+def measurement_duration(os_temp: int, os_pres: int, os_hum: int, heater_ms: int) -> float:
+    """
+    Computes how long a forced-mode measurement takes, as in Bosch's `bme68x_get_meas_dur`.
+
+    Args:
+        os_temp (int): Temperature oversampling setting.
+        os_pres (int): Pressure oversampling setting.
+        os_hum (int): Humidity oversampling setting.
+        heater_ms (int): Gas heater duration in milliseconds, 0 without a gas measurement.
+
+    Returns:
+        float: The duration in seconds.
+    """
+    cycles = sum(OVERSAMPLING_CYCLES[setting] for setting in (os_temp, os_pres, os_hum))
+    duration_us = cycles * 1963 + 477 * 4 + 477 * 5 + 1000
+    return (duration_us // 1000 + 1 + heater_ms) / 1000
+
+
+def parse_field(regs: Sequence[int], variant: int) -> Optional[RawSample]:
+    """
+    Extracts the raw ADC values from a burst read of field 0.
+
+    Returns:
+        Optional[RawSample]: (temperature, pressure, humidity, gas, gas range), or None
+            if the field does not hold a new measurement.
+    """
+    if not regs[0] & NEW_DATA:
+        return None
+    if variant == VARIANT_HIGH:
+        gas, gas_range = (regs[15] << 2) | (regs[16] >> 6), regs[16] & GAS_RANGE_MASK
+    else:
+        gas, gas_range = (regs[13] << 2) | (regs[14] >> 6), regs[14] & GAS_RANGE_MASK
+    return (
+        (regs[5] << 12) | (regs[6] << 4) | (regs[7] >> 4),
+        (regs[2] << 12) | (regs[3] << 4) | (regs[4] >> 4),
+        (regs[8] << 8) | regs[9],
+        gas,
+        gas_range,
+    )
+
+
+class BME68xCalibration:
+    """
+    Compensation coefficients of one chip, with the constant parts of each formula folded in.
+
+    The integer arithmetic is the vendor library's, so results are identical to
+    `BME680.get_sensor_data`; only the work that does not depend on the sample is
+    moved out of the per-sample path. `coefficients` holds every value `compensate`
+    needs in one tuple, so a batch can mix samples from different chips.
+    """
+
+    def __init__(self, sensor: "bme680.BME680"):
+        from bme680.constants import lookupTable1, lookupTable2
+
+        c = sensor.calibration_data
+        self.variant = getattr(sensor, "_variant", 0)
+        high = self.variant == VARIANT_HIGH
+        if high:
+            gas_first = [1000000 * (262144 >> gas_range) for gas_range in range(16)]
+            gas_second = None
+        else:
+            gas_first = [((1340 + 5 * c.range_sw_err) * lookupTable1[gas_range]) >> 16 for gas_range in range(16)]
+            gas_second = [(lookupTable2[gas_range] * var1) >> 9 for gas_range, var1 in enumerate(gas_first)]
+        self.coefficients = (
+            c.par_t1 << 1, c.par_t2, c.par_t3 << 4, sensor.offset_temp_in_t_fine,
+            c.par_p1, c.par_p2, c.par_p3 << 5, c.par_p4 << 16, c.par_p5, c.par_p6,
+            c.par_p7 << 7, c.par_p8, c.par_p9, c.par_p10,
+            c.par_h1 * 16, c.par_h2, c.par_h3, c.par_h4, c.par_h5, c.par_h6 << 7, c.par_h7,
+            high, gas_first, gas_second,
+        )
+
+    def compensate(self, raws: Sequence[RawSample]) -> Dict[str, List[float]]:
+        """Converts a batch of raw samples from this chip into metric columns."""
+        return compensate([(self, raw) for raw in raws])
+
+
+def compensate(samples: Sequence[Tuple[BME68xCalibration, RawSample]]) -> Dict[str, List[float]]:
+    """
+    Converts a batch of raw samples, each paired with its chip's calibration, into metric columns.
+
+    Every sample goes through one pass of inlined arithmetic with its chip's
+    coefficients unpacked from a single tuple, instead of a method call and
+    attribute lookups per field as in the vendor library, so one call covers a
+    whole engine batch whichever chips it came from.
+
+    Args:
+        samples (Sequence[Tuple[BME68xCalibration, RawSample]]): Calibrations and raw samples from `parse_field`.
+
+    Returns:
+        Dict[str, List[float]]: One list per metric, in the order of `samples`.
+    """
+    log = math.log
+    temperatures: List[float] = []
+    pressures: List[float] = []
+    humidities: List[float] = []
+    gases: List[float] = []
+    dew_points: List[float] = []
+
+    for calibration, (adc_temp, adc_pres, adc_hum, adc_gas, gas_range) in samples:
+        (
+            t1x2, t2, t3x16, offset,
+            p1, p2, p3x32, p4x65536, p5, p6, p7x128, p8, p9, p10,
+            h1x16, h2, h3, h4, h5, h6x128, h7,
+            high, gas_first, gas_second,
+        ) = calibration.coefficients
+
+        var1 = (adc_temp >> 3) - t1x2
+        t_fine = ((var1 * t2) >> 11) + (((((var1 >> 1) * (var1 >> 1)) >> 12) * t3x16) >> 14) + offset
+        temp = ((t_fine * 5) + 128) >> 8
+
+        var1 = (t_fine >> 1) - 64000
+        var2 = ((((((var1 >> 2) * (var1 >> 2)) >> 11) * p6) >> 2) + ((var1 * p5) << 1) >> 2) + p4x65536
+        var1 = ((32768 + (((((((var1 >> 2) * (var1 >> 2)) >> 13) * p3x32) >> 3) + ((p2 * var1) >> 1)) >> 18)) * p1) >> 15
+        pressure = ((1048576 - adc_pres) - (var2 >> 12)) * 3125
+        pressure = (pressure // var1) << 1 if pressure >= 2147483648 else (pressure << 1) // var1
+        pressure += (
+            ((p9 * (((pressure >> 3) * (pressure >> 3)) >> 13)) >> 12)
+            + (((pressure >> 2) * p8) >> 13)
+            + (((pressure >> 8) * (pressure >> 8) * (pressure >> 8) * p10) >> 17)
+            + p7x128
+        ) >> 4
+
+        var1 = (adc_hum - h1x16) - (((temp * h3) // 100) >> 1)
+        var2 = (h2 * (((temp * h4) // 100) + (((temp * ((temp * h5) // 100)) >> 6) // 100) + 16384)) >> 10
+        var3 = var1 * var2
+        var4 = (h6x128 + ((temp * h7) // 100)) >> 4
+        var5 = ((var3 >> 14) * (var3 >> 14)) >> 10
+        humidity = min(max((((var3 + ((var4 * var5) >> 1)) >> 10) * 1000) >> 12, 0), 100000)
+
+        if high:
+            gas = gas_first[gas_range] / (4096 + 3 * (adc_gas - 512))
+        else:
+            var2 = ((adc_gas << 15) - 16777216) + gas_first[gas_range]
+            gas = (gas_second[gas_range] + (var2 >> 1)) / var2
+            if gas < 0:
+                gas += 4294967296
+
+        temperature = temp / 100
+        humidity = humidity / 1000
+        x = log(humidity / 100) + (17.625 * temperature) / (243.04 + temperature)
+        temperatures.append(temperature)
+        pressures.append(pressure / 100)
+        humidities.append(humidity)
+        gases.append(gas)
+        dew_points.append((243.04 * x) / (17.625 - x))
+
+    return {
+        "temperature": temperatures,
+        "pressure": pressures,
+        "humidity": humidities,
+        "gas": gases,
+        "dew_pt": dew_points,
+    }
+
+
+class BME68xChip:
+    """
+    Everything the engine needs to measure one configured chip, cached at init.
+
+    The forced-mode trigger is written as one byte carrying the oversampling
+    settings, instead of a read-modify-write of `ctrl_meas`.
+    """
+
+    def __init__(self, sensor: "bme680.BME680", bus: EasyMCP2221.SMBus, address: int):
+        self.sensor = sensor
+        self.bus = bus
+        self.address = address
+        self.calibration = BME68xCalibration(sensor)
+        tph, gas = sensor.tph_settings, sensor.gas_settings
+        self.trigger = (tph.os_temp << 5) | (tph.os_pres << 2) | FORCED_MODE
+        self.duration = measurement_duration(
+            tph.os_temp, tph.os_pres, tph.os_hum, gas.heatr_dur if gas.run_gas else 0
+        )
+        self.ready_at = 0.0
+
+
+class BME68xRequest:
+    def __init__(self, io: BusIO, chip: BME68xChip):
+        self.io = io
+        self.chip = chip
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class BME68xEngine:
+    """
+    Takes forced-mode measurements of every BME68x that asks for a reading at roughly the same time.
+
+    Requests arriving within `window` seconds are grouped: every chip is
+    triggered, the engine waits once until the slowest chip's measurement,
+    heater included, is due, then reads each chip's whole field 0 in one burst.
+    A chip whose new-data flag is still clear is re-read a few times at a short
+    interval. The raw samples of the batch are then compensated together in one
+    pass, each with its own chip's calibration; if one of them cannot be
+    compensated, the others are retried one by one so only it fails.
+    """
+
+    def __init__(self, window: float = 0.005, busy_retries: int = 5, busy_delay: float = 0.01):
+        self.window = window
+        self.busy_retries = busy_retries
+        self.busy_delay = busy_delay
+        self.busy_timeouts = 0
+        self._pending: List[BME68xRequest] = []
+        self._collecting: Optional[asyncio.Task] = None
+
+    async def measure(self, io: BusIO, chip: BME68xChip) -> Optional[Dict[str, float]]:
+        """
+        Queues a measurement and waits for the batch it joins to complete.
+
+        Args:
+            io (BusIO): The I/O worker of the adapter owning the chip.
+            chip (BME68xChip): The chip to measure.
+
+        Returns:
+            Optional[Dict[str, float]]: The compensated metrics, or None if no new data arrived.
+        """
+        request = BME68xRequest(io, chip)
+        self._pending.append(request)
+        if self._collecting is None:
+            self._collecting = asyncio.create_task(self._run_batch())
+        return await request.future
+
+    async def stop(self):
+        """Cancels the batch being collected and every measurement still waiting to join one."""
+        task, self._collecting = self._collecting, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        pending, self._pending = self._pending, []
+        for request in pending:
+            request.future.cancel()
+
+    async def _trigger(self, request: BME68xRequest):
+        chip = request.chip
+        delay = chip.ready_at - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await request.io.run(chip.bus.write_byte_data, chip.address, CTRL_MEAS, chip.trigger)
+        chip.ready_at = asyncio.get_running_loop().time() + chip.duration
+
+    async def _collect(self, request: BME68xRequest) -> Optional[RawSample]:
+        chip = request.chip
+        for attempt in range(self.busy_retries + 1):
+            regs = await request.io.read_i2c_block_data(chip.bus, chip.address, FIELD0, FIELD_LENGTH)
+            raw = parse_field(regs, chip.calibration.variant)
+            if raw is not None:
+                return raw
+            await asyncio.sleep(self.busy_delay)
+        self.busy_timeouts += 1
+        return None
+
+    @staticmethod
+    def _settle(request: BME68xRequest, outcome):
+        if request.future.done():
+            return
+        if isinstance(outcome, BaseException):
+            request.future.set_exception(outcome)
+        else:
+            request.future.set_result(outcome)
+
+    def _compensate(self, collected: List[Tuple[BME68xRequest, RawSample]]):
+        try:
+            columns = compensate([(request.chip.calibration, raw) for request, raw in collected])
+        except (ArithmeticError, ValueError):
+            for request, raw in collected:
+                try:
+                    columns = compensate([(request.chip.calibration, raw)])
+                except (ArithmeticError, ValueError) as error:
+                    self._settle(request, error)
+                    continue
+                self._settle(request, {metric: values[0] for metric, values in columns.items()})
+            return
+        for index, (request, _) in enumerate(collected):
+            self._settle(request, {metric: values[index] for metric, values in columns.items()})
+
+    async def _run_batch(self):
+        await asyncio.sleep(self.window)
+        batch, self._pending = self._pending, []
+        self._collecting = None
+        try:
+            triggered = await asyncio.gather(*(self._trigger(request) for request in batch), return_exceptions=True)
+            ready: List[BME68xRequest] = []
+            for request, outcome in zip(batch, triggered):
+                if isinstance(outcome, BaseException):
+                    self._settle(request, outcome)
+                else:
+                    ready.append(request)
+            if not ready:
+                return
+            due = max(request.chip.ready_at for request in ready)
+            await asyncio.sleep(max(due - asyncio.get_running_loop().time(), 0))
+            raws = await asyncio.gather(*(self._collect(request) for request in ready), return_exceptions=True)
+            collected = []
+            for request, outcome in zip(ready, raws):
+                if outcome is None or isinstance(outcome, BaseException):
+                    self._settle(request, outcome)
+                else:
+                    collected.append((request, outcome))
+            self._compensate(collected)
+        finally:
+            for request in batch:
+                if not request.future.done():
+                    request.future.cancel()
+
+
+bme68x_engine = BME68xEngine()
+
+registry.sampled(
+    "piphi_bme68x_busy_timeouts_total",
+    "BME68x readings abandoned because no new data arrived.",
+    lambda: bme68x_engine.busy_timeouts,
+    "counter",
+)
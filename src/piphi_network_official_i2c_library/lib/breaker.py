@@ -0,0 +1,136 @@
+import logging
+import os
+import random
+import time
+from typing import Dict, Optional
+
+from piphi_network_official_i2c_library.lib.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+
+OPEN = "open"
+
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Health of one adapter, shared by discovery and every poller on it.
+
+    After `failure_threshold` consecutive failed transactions the breaker opens and
+    the adapter is left alone for a backoff that doubles with every consecutive trip,
+    with jitter so adapters that failed together do not retry together. When the
+    backoff expires one caller is let through (half-open): success closes the
+    breaker, failure opens it again. Once it has tripped `reopen_after` times in a
+    row, `needs_reopen` asks the caller to reopen the adapter before the trial.
+    """
+
+    breakers: Dict[str, "CircuitBreaker"] = {}
+
+    total_trips = 0
+
+    failure_threshold = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", 5))
+
+    backoff_min = float(os.environ.get("BREAKER_BACKOFF_MIN", 2.0))
+
+    backoff_max = float(os.environ.get("BREAKER_BACKOFF_MAX", 300.0))
+
+    reopen_after = int(os.environ.get("BREAKER_REOPEN_AFTER", 2))
+
+    def __init__(self, usbpath: str):
+        self.usbpath = usbpath
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.consecutive_trips = 0
+        self.reopens = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+
+    @classmethod
+    def for_adapter(cls, usbpath: str) -> "CircuitBreaker":
+        breaker = cls.breakers.get(usbpath)
+        if breaker is None:
+            breaker = cls.breakers[usbpath] = cls(usbpath)
+        return breaker
+
+    @classmethod
+    def release(cls, usbpath: str):
+        cls.breakers.pop(usbpath, None)
+
+    @property
+    def needs_reopen(self) -> bool:
+        return self.state == HALF_OPEN and self.consecutive_trips >= self.reopen_after
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """
+        Decides whether the adapter may be used now.
+
+        Returns:
+            bool: True while closed, and for the single trial once an open breaker's backoff expires.
+        """
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and (now or time.monotonic()) >= self.retry_at:
+            self.state = HALF_OPEN
+            return True
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.consecutive_trips = 0
+
+    def record_failure(self, error: BaseException, now: Optional[float] = None) -> bool:
+        """
+        Counts a failed transaction.
+
+        Args:
+            error (BaseException): The error the adapter raised.
+            now (Optional[float]): The current monotonic time.
+
+        Returns:
+            bool: True if this failure opened the breaker.
+        """
+        self.failures += 1
+        self.last_error = repr(error)
+        if self.state == OPEN or (self.state == CLOSED and self.failures < self.failure_threshold):
+            return False
+        self.state = OPEN
+        self.trips += 1
+        self.consecutive_trips += 1
+        CircuitBreaker.total_trips += 1
+        delay = min(self.backoff_min * 2 ** (self.consecutive_trips - 1), self.backoff_max)
+        delay *= 1 + random.random()
+        self.retry_at = (now or time.monotonic()) + delay
+        logger.warning("adapter %s keeps failing (%s), leaving it alone for %.1fs", self.usbpath, self.last_error, delay)
+        return True
+
+    def describe(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "reopens": self.reopens,
+            "retry_in": round(max(self.retry_at - time.monotonic(), 0), 1) if self.state == OPEN else 0,
+            "last_error": self.last_error,
+        }
+
+    @classmethod
+    def report(cls) -> Dict[str, dict]:
+        return {usbpath: breaker.describe() for usbpath, breaker in cls.breakers.items()}
+
+
+registry.sampled(
+    "piphi_adapter_breakers_open",
+    "Adapters whose circuit breaker is open or half-open.",
+    lambda: sum(1 for breaker in CircuitBreaker.breakers.values() if breaker.state != CLOSED),
+)
+registry.sampled(
+    "piphi_adapter_breaker_trips_total",
+    "Times an adapter's circuit breaker opened.",
+    lambda: CircuitBreaker.total_trips,
+    "counter",
+)
@@ -1,188 +1,360 @@
-from typing import Optional
+import asyncio
+import logging
+import os
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
 import EasyMCP2221
 import serial.tools.list_ports
-import bme680
-import bme280
+
+from piphi_network_official_i2c_library.lib.adapter_io import AdapterIO
+from piphi_network_official_i2c_library.lib.breaker import CircuitBreaker
+from piphi_network_official_i2c_library.lib.drivers import probe_bus
+from piphi_network_official_i2c_library.lib.metrics import mux_switches
+from piphi_network_official_i2c_library.lib.topology import MUX_CHANNELS, AdapterTopology, detect_mux
+
+logger = logging.getLogger(__name__)
 
 class PiPhiMCP2221:
     
     all_mcp2221s_dict = []
     
-    mcp_mapping = {
-        
-        
-    }
+    mcp_mapping: Dict[str, AdapterTopology] = {}
+
+    probe_timings = {}
+
+    discovery_cache: Dict[str, dict] = {}
+
+    probed_adapters: Dict[str, Optional[str]] = {}
+
+    discovery_lock = asyncio.Lock()
+
+    discovery_state = "pending"
+
+    discovery_ready = asyncio.Event()
+
+    watch_interval = float(os.environ.get("DISCOVERY_WATCH_INTERVAL", 5.0))
+
+    discovery_deadline = float(os.environ.get("DISCOVERY_TIMEOUT", 10.0))
+
+    adapter_probe_timeout = float(os.environ.get("DISCOVERY_ADAPTER_TIMEOUT", 5.0))
+
+    list_ports = staticmethod(serial.tools.list_ports.comports)
+
+    device_factory = EasyMCP2221.Device
+
+    shard: Optional[Tuple[int, int]] = None
     
     def __init__(self):
         pass
     
     @staticmethod
-    async def get_aht200_sensor(device: EasyMCP2221.Device):
-        return device
+    def shard_for(usbpath: str, shard_count: int) -> int:
+        """Returns the worker that owns an adapter when adapters are sharded across `shard_count` processes."""
+        return zlib.crc32(usbpath.encode("utf-8")) % shard_count
+
+    async def identify_all_mcp2221(self):
+        ports = await asyncio.to_thread(PiPhiMCP2221.list_ports)
+        adapters = [item for item in ports if "04D8:00DD" in item.hwid]
+        PiPhiMCP2221.all_mcp2221s_dict = [{"name": item.description, "usbpath": item.device,"serial": item.serial_number, "devnum": devnum} for devnum, item in enumerate(adapters)]
+        if PiPhiMCP2221.shard is not None:
+            index, count = PiPhiMCP2221.shard
+            PiPhiMCP2221.all_mcp2221s_dict = [entry for entry in PiPhiMCP2221.all_mcp2221s_dict if PiPhiMCP2221.shard_for(entry["usbpath"], count) == index]
+        return PiPhiMCP2221.all_mcp2221s_dict
+
     @staticmethod
-    async def get_bme680_sensor(bus: EasyMCP2221.SMBus, port:str) -> Optional[bme680.BME680]:
+    def open_device(devnum: int, serial: Optional[str] = None) -> EasyMCP2221.Device:
+        """
+        Opens an adapter, by its USB serial when the port reports one.
+
+        `devnum` is the adapter's position among the attached MCP2221s, which shifts
+        whenever another adapter is plugged in or removed; it is only used for
+        adapters without a serial number.
+        """
+        if serial:
+            return PiPhiMCP2221.device_factory(usbserial=serial)
+        return PiPhiMCP2221.device_factory(devnum=devnum)
+
+    async def probe_adapter(self, index: int, value: dict) -> Optional[dict]:
         """
-        Returns the BME680 sensor object connected to the given bus.
+        Opens one adapter and maps every sensor on it.
+
+        The TCA9548A mux is looked for first, since detecting it also disconnects
+        whatever channel a previous run left selected. The probe plan then runs
+        against the adapter's own bus and, if a mux answered, again on each of its
+        channels; devices that already answered on the adapter's own bus are
+        visible on every channel and are not counted again.
 
         Args:
-            bus (EasyMCP2221.SMBus): The bus object to use for communication.
+            index (int): The position of the adapter in `all_mcp2221s_dict`.
+            value (dict): The adapter entry from `all_mcp2221s_dict`, updated in place.
 
         Returns:
-            Optional[bme680.BME680]: The BME680 sensor object, or None if the operation fails.
+            Optional[dict]: The adapter entry if a sensor was found, otherwise None. Adapter
+            errors are raised.
+        """
+        io = AdapterIO.for_adapter(value["usbpath"])
+        devnum = value.get("devnum", index)
+        mcp = await io.run(PiPhiMCP2221.open_device, devnum, value.get("serial"))
+        bus = EasyMCP2221.SMBus(mcp=mcp)
+        topology = AdapterTopology(value["usbpath"], mcp, bus, io, devnum, value.get("serial"))
+        topology.mux_address = await detect_mux(io, mcp)
+        root = set()
+        for driver, address, response in await probe_bus(io, bus):
+            topology.add(driver.name, address, None, response)
+            root.add(address)
+        if topology.mux_address is not None:
+            for channel in range(MUX_CHANNELS):
+                for driver, address, response in await probe_bus(topology.channel_io(channel), bus):
+                    if address not in root:
+                        topology.add(driver.name, address, channel, response)
+            await io.run(topology.deselect)
+        if topology.sensors:
+            value['sensor'] = topology.find().driver
+            value['sensors'] = topology.describe()
+            value['mux_address'] = topology.mux_address
+            value['mcp_usbserial'] = mcp.usbserial
+            PiPhiMCP2221.mcp_mapping[value["usbpath"]] = topology
+        return value if "sensor" in value else None
+
+    async def timed_probe(self, index: int, value: dict, timeout: float) -> Optional[dict]:
         """
+        Probes one adapter within `timeout`, recording the outcome in `probe_timings` and its breaker.
+
+        A probe cut off by the discovery deadline counts as a failure, so a half-open
+        breaker whose trial was cancelled opens again instead of staying half-open.
+        """
+        breaker = CircuitBreaker.for_adapter(value["usbpath"])
+        started = time.perf_counter()
+        status = "error"
+        error = None
         try:
-            primary_address = bme680.constants.I2C_ADDR_PRIMARY
-            PiPhiMCP2221.mcp_mapping[port]["active"] = True
-            return bme680.BME680(i2c_addr=primary_address, i2c_device=bus)
-        except (RuntimeError, IOError, EasyMCP2221.exceptions.NotAckError):
-            try:
-                secondary_address = bme680.constants.I2C_ADDR_SECONDARY
-                PiPhiMCP2221.mcp_mapping[port]["active"] = True
-                return bme680.BME680(i2c_addr=secondary_address, i2c_device=bus)
-            except (RuntimeError, IOError, EasyMCP2221.exceptions.NotAckError) as error:
-                raise error from None
-            
-    @staticmethod
-    async def get_bme280_sensor(bus: EasyMCP2221.SMBus, port: str) -> Optional[bme280.BME280]:
+            result = await asyncio.wait_for(self.probe_adapter(index, value), timeout)
+            status = "found" if result is not None else "empty"
+            breaker.record_success()
+            return result
+        except Exception as exception:
+            status = "timeout" if isinstance(exception, TimeoutError) else "error"
+            error = repr(exception)
+            breaker.record_failure(exception)
+            return None
+        except asyncio.CancelledError as cancelled:
+            status = "deadline"
+            breaker.record_failure(cancelled)
+            raise
+        finally:
+            PiPhiMCP2221.probe_timings[value["usbpath"]] = {
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+            if error is not None:
+                PiPhiMCP2221.probe_timings[value["usbpath"]]["error"] = error
+
+    async def build_discovery_results(
+        self,
+        deadline: Optional[float] = None,
+        adapter_timeout: Optional[float] = None,
+        indexes: Optional[List[int]] = None,
+    ):
         """
-        Returns the BME280 sensor object connected to the given bus.
+        Probes every known adapter, or only those at `indexes`, concurrently.
+
+        Each adapter gets `adapter_timeout` seconds and the whole pass is bounded by
+        `deadline`; adapters that miss either are reported in `probe_timings` and
+        left out of the results instead of holding up the rest. Probes cut off by
+        the deadline are cancelled and awaited before returning.
 
         Args:
-            bus (EasyMCP2221.SMBus): The bus object to use for communication.
+            deadline (Optional[float]): Seconds allowed for the whole discovery pass.
+            adapter_timeout (Optional[float]): Seconds allowed for a single adapter.
+            indexes (Optional[List[int]]): Positions in `all_mcp2221s_dict` to probe, defaults to all.
 
         Returns:
-            Optional[bme280.BME280]: The BME280 sensor object, or None if the operation fails.
+            list: The adapter entries on which a sensor was found.
         """
-        try:
-            address = bme280.I2C_ADDRESS_VCC
-            return bme280.BME280(i2c_addr=address, i2c_dev=bus)
-        except (RuntimeError, IOError, EasyMCP2221.exceptions.NotAckError):
-            try:
-                address = bme280.I2C_ADDRESS_GND
-                return bme280.BME280(i2c_addr=address, i2c_dev=bus)
-            except (RuntimeError, IOError, EasyMCP2221.exceptions.NotAckError) as error:
-                raise error from None
-    
-    async def identify_all_mcp2221(self):
-        PiPhiMCP2221.all_mcp2221s_dict = [{"name": item.description, "usbpath": item.device,"serial": item.serial_number} for item in serial.tools.list_ports.comports() if "04D8:00DD" in item.hwid]
-        return PiPhiMCP2221.all_mcp2221s_dict
-    async def fetch_bme(self, bus: EasyMCP2221.SMBus) -> Optional[int]:
+        deadline = deadline or PiPhiMCP2221.discovery_deadline
+        adapter_timeout = adapter_timeout or PiPhiMCP2221.adapter_probe_timeout
+        if indexes is None:
+            PiPhiMCP2221.probe_timings = {}
+            indexes = range(len(PiPhiMCP2221.all_mcp2221s_dict))
+        tasks = {
+            asyncio.create_task(
+                self.timed_probe(index, PiPhiMCP2221.all_mcp2221s_dict[index], adapter_timeout)
+            ): PiPhiMCP2221.all_mcp2221s_dict[index]
+            for index in indexes
+        }
+        if not tasks:
+            return []
+        started = time.perf_counter()
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+            PiPhiMCP2221.probe_timings[tasks[task]["usbpath"]] = {
+                "status": "deadline",
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+        await asyncio.gather(*pending, return_exceptions=True)
+        final_results = []
+        for task, value in tasks.items():
+            if task in done and not task.cancelled() and task.exception() is None and task.result() is not None:
+                final_results.append(value)
+        return final_results
+
+    @staticmethod
+    def forget_adapter(usbpath: str):
+        PiPhiMCP2221.discovery_cache.pop(usbpath, None)
+        PiPhiMCP2221.probed_adapters.pop(usbpath, None)
+        PiPhiMCP2221.probe_timings.pop(usbpath, None)
+        PiPhiMCP2221.mcp_mapping.pop(usbpath, None)
+        CircuitBreaker.release(usbpath)
+        mux_switches.remove(usbpath)
+        AdapterIO.release(usbpath)
+
+    @staticmethod
+    def reset():
         """
-        Fetches the chip ID of the BME sensor connected to the given bus.
+        Forgets every adapter and returns discovery to its initial state.
+
+        Called by the lifespan on shutdown. The lock and ready event are created
+        anew, since asyncio primitives stay bound to the loop that first awaited
+        them and the next lifespan may run on a different one.
+        """
+        for usbpath in set(PiPhiMCP2221.mcp_mapping) | set(PiPhiMCP2221.probed_adapters):
+            PiPhiMCP2221.forget_adapter(usbpath)
+        PiPhiMCP2221.all_mcp2221s_dict = []
+        PiPhiMCP2221.discovery_cache = {}
+        PiPhiMCP2221.probe_timings = {}
+        PiPhiMCP2221.discovery_state = "pending"
+        PiPhiMCP2221.discovery_lock = asyncio.Lock()
+        PiPhiMCP2221.discovery_ready = asyncio.Event()
+
+    @staticmethod
+    async def reopen_adapter(usbpath: str) -> Optional[AdapterTopology]:
+        """
+        Opens a fresh `EasyMCP2221.Device` for a known adapter on a fresh I/O thread.
+
+        The adapter is opened by serial number where it has one, since its position
+        in the enumeration may have changed while it was unplugged, and on the I/O
+        worker currently registered for its usbpath.
 
         Args:
-            bus (EasyMCP2221.SMBus): The bus object to use for communication.
+            usbpath (str): The adapter to reopen.
 
         Returns:
-            Optional[int]: The chip ID of the BME sensor, or None if the operation fails.
+            Optional[AdapterTopology]: The adapter's topology, rebound to the new handle, or None if unknown.
         """
-        try:
-            chip_id: int = bus.read_byte_data(0x77, 0xD0)
-            return chip_id
-        except EasyMCP2221.exceptions.NotAckError:
-            return None
-        except TimeoutError:
+        topology = PiPhiMCP2221.mcp_mapping.get(usbpath)
+        if topology is None:
             return None
-    async def fetch_aht(self, bus: EasyMCP2221.SMBus) -> Optional[int]:
+        io = AdapterIO.for_adapter(usbpath)
+        if io is topology.io:
+            io.reset()
+        topology.io = io
+        mcp = await io.run(PiPhiMCP2221.open_device, topology.devnum, topology.serial)
+        topology.rebind(mcp, EasyMCP2221.SMBus(mcp=mcp))
+        CircuitBreaker.for_adapter(usbpath).reopens += 1
+        logger.info("reopened adapter %s", usbpath)
+        return topology
+
+    async def refresh_discovery(self, full: bool = False) -> List[dict]:
         """
-        Fetches the status of the AHT20 sensor connected to the given bus.
+        Brings the discovery cache in line with the adapters currently attached.
+
+        Adapters that disappeared, or whose serial changed, are dropped from the cache
+        unless a sensor on them is still polled: their pollers keep the adapter's I/O
+        worker and breaker, and reopen it once it is back. Only newly attached
+        adapters are probed, unless `full` is set, in which case every adapter that
+        is not bound to an active poller is probed again. Adapters kept from the
+        previous pass take their position from the current enumeration.
 
         Args:
-            bus (EasyMCP2221.SMBus): The bus object to use for communication.
+            full (bool): Re-probe every idle adapter instead of only new ones.
 
         Returns:
-            Optional[int]: The status of the AHT20 sensor, or None if the operation fails.
+            List[dict]: The cached adapter entries on which a sensor was found.
         """
-        try:
-            status = bus.read_byte_data(0x38, 0x71)
-            return status
-        except EasyMCP2221.exceptions.NotAckError as error:
-            return None
-        except TimeoutError:
-            return None
-        
-    async def read_pm_sensor_data(self, bus: EasyMCP2221.SMBus) -> Optional[bytes]:
+        async with PiPhiMCP2221.discovery_lock:
+            previous: Dict[str, Tuple[Optional[str], dict]] = {
+                entry["usbpath"]: (entry["serial"], entry) for entry in PiPhiMCP2221.all_mcp2221s_dict
+            }
+            await self.identify_all_mcp2221()
+            attached = {entry["usbpath"]: entry["serial"] for entry in PiPhiMCP2221.all_mcp2221s_dict}
+            for usbpath, serial_number in list(PiPhiMCP2221.probed_adapters.items()):
+                if usbpath not in attached or attached[usbpath] != serial_number:
+                    topology = PiPhiMCP2221.mcp_mapping.get(usbpath)
+                    if topology is None or not topology.active:
+                        PiPhiMCP2221.forget_adapter(usbpath)
+            indexes = []
+            for index, entry in enumerate(PiPhiMCP2221.all_mcp2221s_dict):
+                usbpath = entry["usbpath"]
+                topology = PiPhiMCP2221.mcp_mapping.get(usbpath)
+                active = topology is not None and topology.active
+                if usbpath in PiPhiMCP2221.probed_adapters and (active or not full):
+                    if usbpath in previous:
+                        kept = previous[usbpath][1]
+                        kept["devnum"] = entry["devnum"]
+                        PiPhiMCP2221.all_mcp2221s_dict[index] = kept
+                    if topology is not None:
+                        topology.devnum = entry["devnum"]
+                    continue
+                if not CircuitBreaker.for_adapter(usbpath).allow():
+                    continue
+                PiPhiMCP2221.discovery_cache.pop(usbpath, None)
+                indexes.append(index)
+            if indexes:
+                found = await self.build_discovery_results(indexes=indexes)
+                for index in indexes:
+                    entry = PiPhiMCP2221.all_mcp2221s_dict[index]
+                    if PiPhiMCP2221.probe_timings.get(entry["usbpath"], {}).get("status") in ("found", "empty"):
+                        PiPhiMCP2221.probed_adapters[entry["usbpath"]] = entry["serial"]
+                for entry in found:
+                    PiPhiMCP2221.discovery_cache[entry["usbpath"]] = entry
+            PiPhiMCP2221.discovery_state = "ready"
+            PiPhiMCP2221.discovery_ready.set()
+            return list(PiPhiMCP2221.discovery_cache.values())
+
+    @staticmethod
+    async def wait_ready(timeout: Optional[float] = None) -> bool:
         """
-        Reads the data from the PM sensor connected to the given bus.
+        Waits for the first discovery pass to finish.
 
         Args:
-            bus (EasyMCP2221.SMBus): The bus object to use for communication.
+            timeout (Optional[float]): Seconds to wait, defaults to the discovery deadline.
 
         Returns:
-            Optional[bytes]: The data read from the PM sensor, or None if the operation fails.
+            bool: True if discovery has completed, False if the timeout expired first.
         """
         try:
-            register_address = 0x12
-            data_length = 32
-            pm_sensor_data = bus.read_i2c_block_data(register_address, 0x00, data_length)
-            return pm_sensor_data
-        except (EasyMCP2221.exceptions.NotAckError, TimeoutError):
-            return None
-    async def build_discovery_results(self):
-        final_results = []
-        for index,value in enumerate(PiPhiMCP2221.all_mcp2221s_dict):
+            await asyncio.wait_for(PiPhiMCP2221.discovery_ready.wait(), timeout or PiPhiMCP2221.discovery_deadline)
+        except TimeoutError:
+            return False
+        return True
+
+    async def discover_in_background(self):
+        """
+        Runs the first full discovery pass, then keeps watching for adapters.
+
+        Started by the lifespan as a task so the API serves requests, /health
+        included, while slow adapters are still being probed. `discovery_state`
+        moves from `pending` through `running` to `ready`, or to `failed`, in which
+        case the watcher's next successful pass makes it ready.
+        """
+        PiPhiMCP2221.discovery_state = "running"
+        started = time.perf_counter()
+        try:
+            devices = await self.refresh_discovery(full=True)
+            logger.info("discovered mcp2221 devices in %.2fs: %s", time.perf_counter() - started, devices)
+        except Exception:
+            PiPhiMCP2221.discovery_state = "failed"
+            logger.exception("initial discovery failed")
+        await self.watch_adapters()
+
+    async def watch_adapters(self, interval: Optional[float] = None):
+        """Polls the attached serial ports and incrementally rescans when adapters come or go."""
+        interval = interval or PiPhiMCP2221.watch_interval
+        while True:
+            await asyncio.sleep(interval)
             try:
-                mcp = EasyMCP2221.Device(devnum=index)
-                bus = EasyMCP2221.SMBus(mcp=mcp)
-                """Checking for BMEx"""
-                bme_chip_id = await self.fetch_bme(bus)
-                if bme_chip_id == 97:
-                    value['sensor'] = "BME68x"
-                    value['mcp_usbserial'] = mcp.usbserial
-                    PiPhiMCP2221.mcp_mapping[value["usbpath"]] = {
-                        "mcp":mcp,
-                        "bus":bus,
-                        "chip_id":bme_chip_id,
-                        "sensor":"BME68x",
-                        "mcp_usbserial":mcp.usbserial,
-                        "mcp_index":index,
-                        "usbpath":value['usbpath'],
-                        "active":False
-                    }
-                if bme_chip_id == 96:
-                    value['sensor'] = "BME280"
-                    value['mcp_usbserial'] = mcp.usbserial
-                    PiPhiMCP2221.mcp_mapping[value["usbpath"]] = {
-                        "mcp":mcp,
-                        "bus":bus,
-                        "chip_id":bme_chip_id,
-                        "sensor":"BME68x",
-                        "mcp_usbserial":mcp.usbserial,
-                        "mcp_index":index,
-                        "usbpath":value['usbpath'],
-                        "active":False
-                    }
-                aht20_status = await self.fetch_aht(bus)
-                if aht20_status is not None:
-                    value['sensor'] = "AHT20"
-                    value['mcp_usbserial'] = mcp.usbserial
-                    PiPhiMCP2221.mcp_mapping[value["usbpath"]] = {
-                        "mcp":mcp,
-                        "bus":bus,
-                        "status":aht20_status,
-                        "sensor":"AHT20",
-                        "mcp_usbserial":mcp.usbserial,
-                        "mcp_index":index,
-                        "usbpath":value['usbpath'],
-                        "active":False
-                    }
-                pmsa003i_data = await self.read_pm_sensor_data(bus)
-                if pmsa003i_data is not None:
-                    if len(pmsa003i_data) == 32 and pmsa003i_data[0] == 0x42 and pmsa003i_data[1] == 0x4D:
-                        
-                        value['sensor'] = "PMSA003I"
-                        value['mcp_usbserial'] = mcp.usbserial
-                        PiPhiMCP2221.mcp_mapping[value["usbpath"]] = {
-                            "mcp":mcp,
-                            "bus":bus,
-                            "data":pmsa003i_data,
-                            "sensor":"PMSA003I",
-                            "mcp_usbserial":mcp.usbserial,
-                            "mcp_index":index,
-                            "usbpath":value['usbpath'],
-                            "active":False
-                        }
-                        final_results.append(value)
-            except EasyMCP2221.exceptions.NotAckError as error:
-                pass
-        return final_results
\ No newline at end of file
+                await self.refresh_discovery()
+            except Exception:
+                logger.exception("adapter watcher failed")
@@ -0,0 +1,168 @@
+import math
+from typing import Dict, Optional
+
+
+class DeadbandRule:
+    """
+    Minimum change of a metric worth reporting, as an absolute amount or a percentage.
+
+    When both are set, a change exceeding either one counts. An unchanged value
+    never counts, even when the threshold works out to zero, as a percentage of
+    a zero baseline does.
+    """
+
+    def __init__(self, absolute: Optional[float] = None, percent: Optional[float] = None):
+        self.absolute = absolute
+        self.percent = percent
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["DeadbandRule"]:
+        absolute, percent = config.get("absolute"), config.get("percent")
+        if absolute is None and percent is None:
+            return None
+        return cls(
+            float(absolute) if absolute is not None else None,
+            float(percent) if percent is not None else None,
+        )
+
+    def exceeded(self, previous: float, value: float) -> bool:
+        change = abs(value - previous)
+        if change == 0:
+            return False
+        if self.absolute is not None and change >= self.absolute:
+            return True
+        if self.percent is not None and change >= abs(previous) * self.percent / 100:
+            return True
+        return False
+
+
+class Deadband:
+    """
+    Report-by-exception filter for one device.
+
+    A sample is published when a metric has moved past its rule since the last
+    published sample, or when nothing has been published for `heartbeat` seconds.
+    Comparing against the last published value rather than the previous sample
+    means a slow drift is still reported once it adds up to the deadband.
+
+    Args:
+        rules (Dict[str, DeadbandRule]): Per-metric rules.
+        default (Optional[DeadbandRule]): Rule for metrics without their own; metrics
+            with no rule at all never trigger a publish on their own.
+        heartbeat (float): Longest silence in seconds before a sample is published anyway.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[Dict[str, DeadbandRule]] = None,
+        default: Optional[DeadbandRule] = None,
+        heartbeat: float = 300.0,
+    ):
+        self.rules = rules or {}
+        self.default = default
+        self.heartbeat = heartbeat
+        self.published: Optional[Dict[str, float]] = None
+        self.published_at = 0.0
+        self.suppressed = 0
+
+    @classmethod
+    def from_config(cls, config: dict) -> "Deadband":
+        """
+        Builds a deadband from a device config's `deadband` object.
+
+        Example:
+            {"percent": 2, "heartbeat": 600, "metrics": {"pm25_standard": {"absolute": 5}}}
+        """
+        rules = {}
+        for metric, rule_config in (config.get("metrics") or {}).items():
+            rule = DeadbandRule.from_config(rule_config)
+            if rule is not None:
+                rules[metric] = rule
+        return cls(rules, DeadbandRule.from_config(config), float(config.get("heartbeat", 300.0)))
+
+    def changed(self, metrics: Dict[str, float]) -> bool:
+        """Returns True if any metric moved past its rule since the last published sample."""
+        if self.published is None:
+            return True
+        for metric, value in metrics.items():
+            previous = self.published.get(metric)
+            if previous is None:
+                return True
+            rule = self.rules.get(metric, self.default)
+            if rule is not None and rule.exceeded(previous, value):
+                return True
+        return False
+
+    def should_publish(self, metrics: Dict[str, float], now: float, changed: Optional[bool] = None) -> bool:
+        """
+        Decides whether a sample is published, recording it as the new reference if so.
+
+        Args:
+            metrics (Dict[str, float]): The sample's metrics.
+            now (float): The current monotonic time.
+            changed (Optional[bool]): The result of `changed` if the caller already has it.
+
+        Returns:
+            bool: True if the sample should be published.
+        """
+        if changed is None:
+            changed = self.changed(metrics)
+        if changed or now - self.published_at >= self.heartbeat:
+            self.published = dict(metrics)
+            self.published_at = now
+            return True
+        self.suppressed += 1
+        return False
+
+
+class AdaptiveInterval:
+    """
+    Poll interval that backs off while readings are stable and snaps back when they move.
+
+    Every `stable_samples` consecutive unchanged samples multiply the interval by
+    `factor`, up to `maximum`. A changed sample drops it straight to `minimum`, so
+    a spike is followed closely, and it then backs off again as readings settle.
+    """
+
+    def __init__(self, base: float, minimum: float, maximum: float, factor: float = 2.0, stable_samples: int = 3):
+        self.base = base
+        self.minimum = min(minimum, base)
+        self.maximum = max(maximum, base)
+        self.factor = factor
+        self.stable_samples = stable_samples
+        self.interval = base
+        self.stable = 0
+
+    @classmethod
+    def from_config(cls, config: dict, base: float) -> "AdaptiveInterval":
+        """
+        Builds an adaptive interval from a device config's `adaptive` object.
+
+        Example:
+            {"min_interval": 2, "max_interval": 120, "factor": 2, "stable_samples": 3}
+
+        Raises:
+            ValueError: If the settings would poll without pause or never back off.
+        """
+        adaptive = cls(
+            base,
+            float(config.get("min_interval", base)),
+            float(config.get("max_interval", base * 8)),
+            float(config.get("factor", 2.0)),
+            int(config.get("stable_samples", 3)),
+        )
+        if not 0 < adaptive.minimum < math.inf or adaptive.factor < 1 or adaptive.stable_samples < 1:
+            raise ValueError("min_interval must be positive, factor at least 1 and stable_samples at least 1")
+        return adaptive
+
+    def next(self, changed: bool) -> float:
+        """Returns the interval to use after a sample that did or did not change."""
+        if changed:
+            self.stable = 0
+            self.interval = self.minimum
+        else:
+            self.stable += 1
+            if self.stable >= self.stable_samples:
+                self.stable = 0
+                self.interval = min(self.interval * self.factor, self.maximum)
+        return self.interval
@@ -0,0 +1,312 @@
+import abc
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import EasyMCP2221
+
+from piphi_network_official_i2c_library.lib.adapter_io import BusIO
+from piphi_network_official_i2c_library.lib.aht20 import aht20_engine
+from piphi_network_official_i2c_library.lib.bme68x import BME68xChip, bme68x_engine
+from piphi_network_official_i2c_library.lib.metrics import pmsa003i_checksum_errors
+
+if TYPE_CHECKING:
+    import bme280
+    import bme680
+
+logger = logging.getLogger(__name__)
+
+I2C_ERRORS = (
+    EasyMCP2221.exceptions.NotAckError,
+    EasyMCP2221.exceptions.TimeoutError,
+    TimeoutError,
+    IOError,
+)
+
+ProbeKey = Tuple[int, int, int]
+
+
+class SensorDriver(abc.ABC):
+    """
+    Describes how to find, initialise and read one kind of I2C sensor.
+
+    Discovery reads `id_length` bytes from `id_register` at each of `addresses` and
+    hands the response to `matches`. Once a device is configured, `init` builds the
+    handle that `read` uses to fetch a raw sample, which `decode` turns into
+    full-precision metrics; `format` applies the driver's rounding for single samples.
+    Drivers that batch reads across adapters set `aligned` so their polls share due times.
+
+    Vendor libraries are imported in `init`, not at module level, so discovery and
+    startup do not pay for drivers of sensors that are never configured.
+    """
+
+    name: str = ""
+    addresses: Tuple[int, ...] = ()
+    id_register: int = 0x00
+    id_length: int = 1
+    interval: float = 10
+    aligned: bool = False
+    rounded: bool = False
+    units: Dict[str, str] = {}
+
+    def matches(self, response: bytes) -> bool:
+        return False
+
+    async def init(self, io: BusIO, mcp: EasyMCP2221.Device, bus: EasyMCP2221.SMBus, address: int) -> Any:
+        return bus
+
+    @abc.abstractmethod
+    async def read(self, io: BusIO, handle: Any) -> Any:
+        """Fetches one raw sample through the handle returned by `init`."""
+
+    @abc.abstractmethod
+    def decode(self, raw: Any) -> Optional[Dict[str, float]]:
+        """Turns a raw sample into full-precision metrics, or None if it was invalid."""
+
+    async def sample(self, io: BusIO, handle: Any) -> Optional[Dict[str, float]]:
+        return self.decode(await self.read(io, handle))
+
+    def format(self, metrics: Dict[str, float]) -> Dict[str, float]:
+        """Prepares full-precision metrics for a single-sample message."""
+        if self.rounded:
+            return {metric: round(value) for metric, value in metrics.items()}
+        return metrics
+
+
+class BME68xDriver(SensorDriver):
+    """
+    Bosch BME680/BME688 in forced mode.
+
+    The vendor library only sets the chip up; measurements go through the BME68x
+    engine, which compensates each batch of raw samples at once, so `read`
+    already returns full-precision metrics.
+    """
+
+    name = "BME68x"
+    addresses = (0x76, 0x77)
+    id_register = 0xD0
+    chip_id = 0x61
+    rounded = True
+    units = {
+        "temperature": "C",
+        "pressure": "hPa",
+        "humidity": "%",
+        "gas": "ohm",
+        "dew_pt": "C",
+    }
+
+    def matches(self, response: bytes) -> bool:
+        return response[0] == self.chip_id
+
+    @staticmethod
+    def configure(sensor: "bme680.BME680"):
+        import bme680
+
+        sensor.set_humidity_oversample(bme680.constants.OS_2X)
+        sensor.set_pressure_oversample(bme680.constants.OS_4X)
+        sensor.set_temperature_oversample(bme680.constants.OS_8X)
+        sensor.set_filter(bme680.constants.FILTER_SIZE_3)
+        sensor.set_gas_status(bme680.constants.ENABLE_GAS_MEAS)
+        sensor.set_gas_heater_temperature(320)
+        sensor.set_gas_heater_duration(150)
+        sensor.select_gas_heater_profile(0)
+
+    async def init(self, io, mcp, bus, address):
+        import bme680
+
+        sensor = await io.run(bme680.BME680, i2c_addr=address, i2c_device=bus)
+        await io.run(self.configure, sensor)
+        return BME68xChip(sensor, bus, address)
+
+    async def read(self, io, handle: BME68xChip):
+        return await bme68x_engine.measure(io, handle)
+
+    def decode(self, raw):
+        return raw
+
+
+class BME280Driver(SensorDriver):
+    name = "BME280"
+    addresses = (0x76, 0x77)
+    id_register = 0xD0
+    chip_id = 0x60
+    units = {"temperature": "C", "pressure": "hPa", "humidity": "%"}
+
+    def matches(self, response: bytes) -> bool:
+        return response[0] == self.chip_id
+
+    async def init(self, io, mcp, bus, address):
+        import bme280
+
+        sensor = bme280.BME280(i2c_addr=address, i2c_dev=bus)
+        await io.run(sensor.setup)
+        return sensor
+
+    @staticmethod
+    def measure(sensor: "bme280.BME280"):
+        return sensor.get_temperature(), sensor.get_pressure(), sensor.get_humidity()
+
+    async def read(self, io, handle: "bme280.BME280"):
+        return await io.run(self.measure, handle)
+
+    def decode(self, raw):
+        temperature, pressure, humidity = raw
+        return {"temperature": temperature, "pressure": pressure, "humidity": humidity}
+
+
+class AHT20Driver(SensorDriver):
+    name = "AHT20"
+    addresses = (0x38,)
+    id_register = 0x71
+    units = {"temperature": "C", "humidity": "%"}
+    aligned = True
+    rounded = True
+
+    def matches(self, response: bytes) -> bool:
+        return len(response) == 1
+
+    async def init(self, io, mcp, bus, address):
+        return mcp, address
+
+    async def read(self, io, handle):
+        mcp, address = handle
+        return await aht20_engine.measure(io, mcp, address)
+
+    def decode(self, raw):
+        if raw is None:
+            return None
+        humidity_raw = (raw[1] << 12) | (raw[2] << 4) | (raw[3] >> 4)
+        temp_raw = ((raw[3] & 0x0F) << 16) | (raw[4] << 8) | raw[5]
+        return {
+            "temperature": (temp_raw / 1048576.0) * 200 - 50,
+            "humidity": (humidity_raw / 1048576.0) * 100,
+        }
+
+
+class PMSA003IDriver(SensorDriver):
+    name = "PMSA003I"
+    addresses = (0x12,)
+    id_register = 0x00
+    id_length = 32
+    interval = 60
+    fields = (
+        "pm10_standard",
+        "pm25_standard",
+        "pm100_standard",
+        "pm10_env",
+        "pm25_env",
+        "pm100_env",
+        "particles_03um",
+        "particles_05um",
+        "particles_10um",
+        "particles_25um",
+        "particles_50um",
+        "particles_100um",
+    )
+    units = {
+        "pm10_standard": "ug/m3",
+        "pm25_standard": "ug/m3",
+        "pm100_standard": "ug/m3",
+        "pm10_env": "ug/m3",
+        "pm25_env": "ug/m3",
+        "pm100_env": "ug/m3",
+        "particles_03um": "#/0.1L air",
+        "particles_05um": "#/0.1L air",
+        "particles_10um": "#/0.1L air",
+        "particles_25um": "#/0.1L air",
+        "particles_50um": "#/0.1L air",
+        "particles_100um": "#/0.1L air",
+    }
+
+    def matches(self, response: bytes) -> bool:
+        return len(response) == 32 and response[0] == 0x42 and response[1] == 0x4D
+
+    async def read(self, io, handle):
+        bus, address = handle
+        return await io.read_i2c_block_data(bus, address, 0x00, 32)
+
+    async def init(self, io, mcp, bus, address):
+        return bus, address
+
+    def decode(self, raw):
+        if not self.matches(raw):
+            logger.warning("PMSA003I frame has an invalid header or length")
+            return None
+        checksum = sum(raw[:30]) & 0xFFFF
+        received_checksum = (raw[30] << 8) | raw[31]
+        if checksum != received_checksum:
+            pmsa003i_checksum_errors.inc()
+            logger.warning(
+                "PMSA003I checksum mismatch: calculated %04X, received %04X", checksum, received_checksum
+            )
+        aqdata = {
+            field: (raw[4 + 2 * offset] << 8) | raw[5 + 2 * offset]
+            for offset, field in enumerate(self.fields)
+        }
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "PMSA003I standard PM1.0 %s PM2.5 %s PM10 %s, environmental PM1.0 %s PM2.5 %s PM10 %s, "
+                "particles/0.1L >0.3um %s >0.5um %s >1.0um %s >2.5um %s >5.0um %s >10um %s",
+                *aqdata.values(),
+            )
+        return aqdata
+
+
+drivers: Dict[str, SensorDriver] = {}
+
+
+def register_driver(driver: SensorDriver) -> SensorDriver:
+    """
+    Adds a driver to the registry used by discovery and polling.
+
+    Args:
+        driver (SensorDriver): The driver instance to register.
+
+    Returns:
+        SensorDriver: The registered driver.
+    """
+    drivers[driver.name] = driver
+    return driver
+
+
+for _driver in (BME68xDriver(), BME280Driver(), AHT20Driver(), PMSA003IDriver()):
+    register_driver(_driver)
+
+
+def build_probe_plan() -> Dict[ProbeKey, List[SensorDriver]]:
+    """
+    Groups the registered drivers by the transaction that identifies them.
+
+    Drivers sharing an address, ID register and length (BME68x and BME280 both answer
+    at 0x76/0x77 register 0xD0) are served by a single read.
+
+    Returns:
+        Dict[ProbeKey, List[SensorDriver]]: Drivers keyed by (address, register, length).
+    """
+    plan: Dict[ProbeKey, List[SensorDriver]] = {}
+    for driver in drivers.values():
+        for address in driver.addresses:
+            plan.setdefault((address, driver.id_register, driver.id_length), []).append(driver)
+    return plan
+
+
+async def probe_bus(io: BusIO, bus: EasyMCP2221.SMBus) -> List[Tuple[SensorDriver, int, bytes]]:
+    """
+    Runs the probe plan once against a bus.
+
+    Args:
+        io (BusIO): The I/O worker of the adapter owning the bus.
+        bus (EasyMCP2221.SMBus): The bus to scan.
+
+    Returns:
+        List[Tuple[SensorDriver, int, bytes]]: Each matching driver with its address and ID response.
+    """
+    found = []
+    for (address, register, length), candidates in build_probe_plan().items():
+        try:
+            response = bytes(await io.read_i2c_block_data(bus, address, register, length))
+        except I2C_ERRORS:
+            continue
+        for driver in candidates:
+            if driver.matches(response):
+                found.append((driver, address, response))
+    return found
@@ -0,0 +1,118 @@
+import json
+import struct
+import zlib
+from typing import Dict, Optional, Tuple
+
+COMPACT_VERSION = 1
+
+COMPACT_HEADER = struct.Struct("<BId")
+
+COMPACT_TOPIC = "piphi/telemetry/compact"
+
+SCHEMA_TOPIC = "piphi/telemetry/schema"
+
+
+class CompactSchema:
+    """
+    Static description of a compact telemetry message.
+
+    Everything that does not change between samples of a device (identity headers,
+    metric names and their order, units) lives here and is published retained on
+    `piphi/telemetry/schema/<schema_id>`, once per broker connection. Each message
+    then only carries the schema id, a timestamp and the metric values as
+    little-endian float32.
+    """
+
+    def __init__(self, metrics: Tuple[str, ...], static: Dict[str, object]):
+        self.metrics = metrics
+        self.document = dict(static, version=COMPACT_VERSION, metrics=list(metrics))
+        canonical = json.dumps(self.document, separators=(",", ":"), sort_keys=True)
+        self.schema_id = zlib.crc32(canonical.encode("utf-8"))
+        self.document["schema_id"] = self.schema_id
+        self.values = struct.Struct(f"<{len(metrics)}f")
+        self.published_on: Optional[int] = None
+
+    @property
+    def topic(self) -> str:
+        return f"{SCHEMA_TOPIC}/{self.schema_id}"
+
+
+class CompactEncoder:
+    """
+    Per-device encoder that caches one schema per metric layout.
+
+    Args:
+        static (Dict[str, object]): Fields repeated in every JSON message, such as
+            `device_id`, `x-container-id`, `x-piphi-signature` and `units`.
+    """
+
+    def __init__(self, static: Dict[str, object]):
+        self.static = static
+        self.schemas: Dict[Tuple[str, ...], CompactSchema] = {}
+
+    def schema_for(self, metrics: Dict[str, float], connection: int = 0) -> Tuple[CompactSchema, bool]:
+        """
+        Returns the schema for the metric layout and whether it has to be published.
+
+        A schema is published again on every new broker connection, so a schema
+        message lost with a connection, or a broker that forgot its retained
+        messages, is made good by the next sample.
+
+        Args:
+            metrics (Dict[str, float]): The flat metrics about to be encoded.
+            connection (int): The publisher's connection count.
+
+        Returns:
+            Tuple[CompactSchema, bool]: The schema, and True if it has not been published on `connection` yet.
+        """
+        names = tuple(metrics)
+        schema = self.schemas.get(names)
+        if schema is None:
+            schema = self.schemas[names] = CompactSchema(names, self.static)
+        if schema.published_on == connection:
+            return schema, False
+        schema.published_on = connection
+        return schema, True
+
+    def encode(self, schema: CompactSchema, metrics: Dict[str, float], timestamp: float) -> bytes:
+        """
+        Packs a sample against its schema.
+
+        Args:
+            schema (CompactSchema): The schema returned by `schema_for` for these metrics.
+            metrics (Dict[str, float]): The metric values, in schema order.
+            timestamp (float): Sample time as seconds since the epoch.
+
+        Returns:
+            bytes: Header (version, schema id, timestamp) followed by the packed values.
+        """
+        return COMPACT_HEADER.pack(COMPACT_VERSION, schema.schema_id, timestamp) + schema.values.pack(
+            *metrics.values()
+        )
+
+
+def flatten_stats(stats: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    """Flattens high-rate window statistics to `metric.stat` keys for compact encoding."""
+    return {
+        f"{metric}.{name}": value
+        for metric, summary in stats.items()
+        for name, value in summary.items()
+    }
+
+
+def decode_compact(payload: bytes, schema: Dict[str, object]) -> Optional[Dict[str, object]]:
+    """
+    Decodes a compact message with its schema document, for consumers and tests.
+
+    Args:
+        payload (bytes): The compact message.
+        schema (Dict[str, object]): The retained schema document.
+
+    Returns:
+        Optional[Dict[str, object]]: Timestamp and metrics, or None if the schema id does not match.
+    """
+    version, schema_id, timestamp = COMPACT_HEADER.unpack_from(payload)
+    if version != COMPACT_VERSION or schema_id != schema["schema_id"]:
+        return None
+    values = struct.unpack_from(f"<{len(schema['metrics'])}f", payload, COMPACT_HEADER.size)
+    return {"timestamp": timestamp, "metrics": dict(zip(schema["metrics"], values))}
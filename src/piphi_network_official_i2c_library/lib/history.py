@@ -0,0 +1,375 @@
+import base64
+import itertools
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("<4sHHdI")
+
+HEADER_SIZE = 4096
+
+MAGIC = b"PHTS"
+
+VERSION = 1
+
+COLUMNS_PER_METRIC = 4
+
+Rows = Dict[str, List]
+
+
+def parse_resolution(value: str) -> int:
+    """
+    Converts a resolution such as `1m`, `15m`, `1h` or `1d` to seconds.
+
+    Raises:
+        ValueError: If the value is not a positive number followed by s, m, h or d.
+    """
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if len(value) < 2 or value[-1] not in units or not value[:-1].isdigit() or int(value[:-1]) == 0:
+        raise ValueError(f"Invalid resolution {value}")
+    return int(value[:-1]) * units[value[-1]]
+
+
+class RollupFile:
+    """
+    Fixed-size, memory-mapped rollup of one device's metrics at one resolution.
+
+    The file is a header followed by fixed-width float64 columns of `capacity` slots:
+    the bucket start time, then min, max, sum and count for every metric. A bucket
+    lives in slot `bucket % capacity`, so writes and lookups need no index, and a
+    bucket is overwritten by the one `capacity` buckets later, which is the
+    retention limit. A slot whose time does not match the bucket being read is stale
+    and skipped.
+
+    Samples are folded into the current bucket in place. Range queries slice the
+    columns as memoryviews and reduce them with C-level builtins, the same way the
+    sample window does, so a scan never builds a Python object per stored bucket
+    outside the requested range.
+    """
+
+    def __init__(self, path: str, resolution: int, capacity: int, metrics: Sequence[str], writable: bool = True):
+        self.path = path
+        self.resolution = resolution
+        self.capacity = capacity
+        self.metrics = list(metrics)
+        self.writable = writable
+        self.size = HEADER_SIZE + 8 * capacity * (1 + COLUMNS_PER_METRIC * len(self.metrics))
+        self._file = open(path, "r+b" if writable else "rb")
+        try:
+            self._map = mmap.mmap(
+                self._file.fileno(), self.size, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            )
+        finally:
+            self._file.close()
+        self._view = memoryview(self._map)
+        self._data = data = self._view[HEADER_SIZE:].cast("d")
+        self.times = data[:capacity]
+        self.columns: Dict[str, Tuple[memoryview, ...]] = {}
+        for index, metric in enumerate(self.metrics):
+            start = capacity * (1 + COLUMNS_PER_METRIC * index)
+            self.columns[metric] = tuple(
+                data[start + capacity * column : start + capacity * (column + 1)] for column in range(COLUMNS_PER_METRIC)
+            )
+
+    @staticmethod
+    def read_header(path: str) -> Optional[Tuple[int, int, List[str]]]:
+        try:
+            with open(path, "rb") as f:
+                header = f.read(HEADER_SIZE)
+            magic, version, length, resolution, capacity = HEADER.unpack_from(header)
+            if magic != MAGIC or version != VERSION:
+                return None
+            metrics = json.loads(header[HEADER.size : HEADER.size + length])
+        except (OSError, struct.error, ValueError):
+            return None
+        return int(resolution), capacity, metrics
+
+    @classmethod
+    def create(cls, path: str, resolution: int, capacity: int, metrics: Sequence[str]) -> "RollupFile":
+        names = json.dumps(list(metrics)).encode("utf-8")
+        if HEADER.size + len(names) > HEADER_SIZE:
+            raise ValueError("Too many metrics for one rollup file")
+        with open(path + ".tmp", "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(names), resolution, capacity) + names)
+            f.truncate(HEADER_SIZE + 8 * capacity * (1 + COLUMNS_PER_METRIC * len(metrics)))
+        os.replace(path + ".tmp", path)
+        return cls(path, resolution, capacity, metrics)
+
+    @classmethod
+    def open(cls, path: str, resolution: int, capacity: int, metrics: Sequence[str]) -> "RollupFile":
+        """
+        Opens a rollup for writing, creating it or migrating it to a new layout if needed.
+
+        When the retention or the metric set changed since the file was written, the
+        buckets that still fit are copied into a file with the new layout.
+        """
+        header = cls.read_header(path)
+        if header == (resolution, capacity, list(metrics)):
+            return cls(path, resolution, capacity, metrics)
+        old = cls(path, *header, writable=False) if header is not None and header[0] == resolution else None
+        rollup = cls.create(path + ".new", resolution, capacity, metrics)
+        if old is not None:
+            for slot in range(old.capacity):
+                if old.times[slot] > 0:
+                    rollup.merge_bucket(old, slot)
+            old.close()
+            logger.info("migrated rollup %s to %s buckets of %s", path, capacity, metrics)
+        rollup.close()
+        os.replace(path + ".new", path)
+        return cls(path, resolution, capacity, metrics)
+
+    def merge_bucket(self, other: "RollupFile", slot: int):
+        start = other.times[slot]
+        target = int(start // self.resolution) % self.capacity
+        if self.times[target] != start:
+            self._reset(target, start)
+        for metric in self.metrics:
+            if metric not in other.columns:
+                continue
+            low, high, total, count = other.columns[metric]
+            if not count[slot]:
+                continue
+            columns = self.columns[metric]
+            columns[0][target] = min(columns[0][target], low[slot])
+            columns[1][target] = max(columns[1][target], high[slot])
+            columns[2][target] += total[slot]
+            columns[3][target] += count[slot]
+
+    def _reset(self, slot: int, start: float):
+        self.times[slot] = start
+        for low, high, total, count in self.columns.values():
+            low[slot] = math.inf
+            high[slot] = -math.inf
+            total[slot] = 0.0
+            count[slot] = 0.0
+
+    def add(self, timestamp: float, metrics: Dict[str, float]):
+        bucket = int(timestamp // self.resolution)
+        slot = bucket % self.capacity
+        start = float(bucket * self.resolution)
+        if self.times[slot] != start:
+            if self.times[slot] > start:
+                return
+            self._reset(slot, start)
+        for metric, value in metrics.items():
+            columns = self.columns.get(metric)
+            if columns is None or value is None or math.isnan(value):
+                continue
+            low, high, total, count = columns
+            if value < low[slot]:
+                low[slot] = value
+            if value > high[slot]:
+                high[slot] = value
+            total[slot] += value
+            count[slot] += 1
+
+    def spans(self, start: float, end: float) -> List[Tuple[int, int]]:
+        """Slot ranges holding the buckets from `start` to `end`, at most two because of wrap-around."""
+        first = int(start // self.resolution)
+        last = int(end // self.resolution)
+        first = max(first, last - self.capacity + 1)
+        if last < first:
+            return []
+        slot = first % self.capacity
+        count = last - first + 1
+        head = min(count, self.capacity - slot)
+        spans = [(slot, slot + head)]
+        if count > head:
+            spans.append((0, count - head))
+        return spans
+
+    def query(self, start: float, end: float, metrics: Optional[Sequence[str]] = None) -> Rows:
+        """
+        Returns the buckets starting between `start` and `end`, oldest first.
+
+        Buckets older than the retention window ending at `end` are left out, so a
+        slot that has not been rewritten since the ring last wrapped is never
+        returned in place of the newer bucket it stands for.
+
+        Returns:
+            Rows: A `time` column and, per metric, `min`, `max`, `mean` and `count` columns.
+        """
+        oldest_kept = (int(end // self.resolution) - self.capacity + 1) * self.resolution
+        low_bound = max(math.floor(start / self.resolution) * self.resolution, oldest_kept)
+        wanted = [metric for metric in (metrics or self.metrics) if metric in self.columns]
+        rows: Rows = {"time": []}
+        for metric in wanted:
+            rows[metric] = {"min": [], "max": [], "mean": [], "count": []}
+        for first, last in self.spans(start, end):
+            times = self.times[first:last]
+            keep = [low_bound <= moment <= end for moment in times]
+            rows["time"].extend(itertools.compress(times, keep))
+            for metric in wanted:
+                low, high, total, count = (column[first:last] for column in self.columns[metric])
+                counts = list(itertools.compress(count, keep))
+                sums = itertools.compress(total, keep)
+                result = rows[metric]
+                result["min"].extend(value if n else None for value, n in zip(itertools.compress(low, keep), counts))
+                result["max"].extend(value if n else None for value, n in zip(itertools.compress(high, keep), counts))
+                result["mean"].extend(value / n if n else None for value, n in zip(sums, counts))
+                result["count"].extend(int(n) for n in counts)
+        return rows
+
+    def flush(self):
+        if self.writable:
+            self._map.flush()
+
+    def close(self):
+        self.times.release()
+        for columns in self.columns.values():
+            for column in columns:
+                column.release()
+        self.columns = {}
+        self._data.release()
+        self._view.release()
+        self._map.close()
+
+
+def downsample(rows: Rows, resolution: int) -> Rows:
+    """Merges consecutive buckets of a query result into buckets of `resolution` seconds."""
+    result: Rows = {"time": []}
+    metrics = [metric for metric in rows if metric != "time"]
+    for metric in metrics:
+        result[metric] = {"min": [], "max": [], "mean": [], "count": []}
+    groups = itertools.groupby(range(len(rows["time"])), key=lambda index: rows["time"][index] // resolution)
+    for bucket, indexes in groups:
+        indexes = list(indexes)
+        result["time"].append(float(bucket * resolution))
+        for metric in metrics:
+            source = rows[metric]
+            counts = [source["count"][index] for index in indexes]
+            total = sum(counts)
+            lows = [source["min"][index] for index in indexes if source["count"][index]]
+            highs = [source["max"][index] for index in indexes if source["count"][index]]
+            weighted = math.fsum(source["mean"][index] * source["count"][index] for index in indexes if source["count"][index])
+            target = result[metric]
+            target["min"].append(min(lows) if lows else None)
+            target["max"].append(max(highs) if highs else None)
+            target["mean"].append(weighted / total if total else None)
+            target["count"].append(total)
+    return result
+
+
+class HistoryStore:
+    """
+    Embedded per-device history kept as 1-minute and 1-hour rollups under DATA_DIR.
+
+    Each device has one `RollupFile` per resolution holding min, max, mean and count
+    per metric, sized by HISTORY_RETENTION_1M_DAYS and HISTORY_RETENTION_1H_DAYS.
+    Pollers call `record` with every sample. Only the process polling a device
+    writes its files, so in sharded mode the API process answers queries by mapping
+    the files the workers write.
+    """
+
+    tiers = (("1m", 60), ("1h", 3600))
+
+    def __init__(self, directory: Optional[str] = None, retention_days: Optional[Dict[str, float]] = None):
+        self.enabled = os.environ.get("HISTORY_ENABLED", "1") != "0"
+        self.directory = directory or os.environ.get("HISTORY_DIR") or os.path.join(
+            os.environ.get("DATA_DIR", "/app/data"), "history"
+        )
+        self.retention_days = retention_days or {
+            "1m": float(os.environ.get("HISTORY_RETENTION_1M_DAYS", 7)),
+            "1h": float(os.environ.get("HISTORY_RETENTION_1H_DAYS", 365)),
+        }
+        self.writers: Dict[str, List[RollupFile]] = {}
+        self.failed: Dict[str, str] = {}
+
+    def capacity(self, tier: str, resolution: int) -> int:
+        return max(int(self.retention_days[tier] * 86400 // resolution), 1)
+
+    def device_directory(self, device_id: str) -> str:
+        name = base64.urlsafe_b64encode(device_id.encode("utf-8")).decode("ascii").rstrip("=")
+        return os.path.join(self.directory, name)
+
+    def open(self, device_id: str, metrics: Sequence[str]):
+        """Opens, or creates, the rollups a poller writes for a device."""
+        if not self.enabled:
+            return
+        self.close(device_id)
+        directory = self.device_directory(device_id)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.writers[device_id] = [
+                RollupFile.open(
+                    os.path.join(directory, f"{tier}.col"), resolution, self.capacity(tier, resolution), metrics
+                )
+                for tier, resolution in self.tiers
+            ]
+        except OSError as error:
+            self.failed[device_id] = str(error)
+            logger.warning("history for %s disabled: %s", device_id, error)
+
+    def close(self, device_id: str):
+        for rollup in self.writers.pop(device_id, []):
+            rollup.flush()
+            rollup.close()
+
+    def close_all(self):
+        for device_id in list(self.writers):
+            self.close(device_id)
+
+    def record(self, device_id: str, metrics: Dict[str, float], timestamp: float):
+        for rollup in self.writers.get(device_id, ()):
+            rollup.add(timestamp, metrics)
+
+    def choose_tier(self, start: float, end: float, resolution: Optional[int], now: float) -> Tuple[str, int]:
+        """
+        Picks the rollup a query reads from.
+
+        An explicit resolution uses the coarsest tier it is a multiple of. Without one,
+        the 1-minute tier is used while the range is within its retention and spans
+        at most a day, the 1-hour tier otherwise.
+        """
+        if resolution is not None:
+            candidates = [(tier, seconds) for tier, seconds in self.tiers if resolution % seconds == 0]
+            if not candidates:
+                raise ValueError("Resolution must be a multiple of 1m")
+            return candidates[-1]
+        fine, fine_seconds = self.tiers[0]
+        if end - start <= 86400 and start >= now - self.retention_days[fine] * 86400:
+            return fine, fine_seconds
+        return self.tiers[-1]
+
+    def query(
+        self,
+        device_id: str,
+        start: float,
+        end: float,
+        resolution: Optional[int],
+        metrics: Optional[Sequence[str]],
+        now: float,
+    ) -> Optional[dict]:
+        """
+        Answers a range query from the device's rollups.
+
+        Returns:
+            Optional[dict]: The resolution used and the bucket columns, or None if the device has no history.
+        """
+        tier, tier_seconds = self.choose_tier(start, end, resolution, now)
+        index = [name for name, _ in self.tiers].index(tier)
+        rollup = self.writers.get(device_id, [None] * len(self.tiers))[index]
+        opened = None
+        if rollup is None:
+            path = os.path.join(self.device_directory(device_id), f"{tier}.col")
+            header = RollupFile.read_header(path)
+            if header is None:
+                return None
+            rollup = opened = RollupFile(path, *header, writable=False)
+        try:
+            rows = rollup.query(start, end, metrics)
+        finally:
+            if opened is not None:
+                opened.close()
+        if resolution is not None and resolution != tier_seconds:
+            rows = downsample(rows, resolution)
+        return {"resolution": resolution or tier_seconds, "tier": tier, "buckets": rows}
+
+
+history = HistoryStore()
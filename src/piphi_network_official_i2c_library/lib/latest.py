@@ -0,0 +1,113 @@
+import asyncio
+import collections
+import json
+import os
+from typing import Callable, Deque, Dict, Iterable, Optional, Set
+
+from piphi_network_official_i2c_library.lib.metrics import registry
+
+
+class Subscription:
+    """
+    One live-stream client's view of the latest-value cache.
+
+    Readings are buffered up to `capacity`; when the client falls behind, the
+    oldest buffered reading is discarded so a slow browser tab only ever sees
+    gaps, never unbounded memory growth or back-pressure on the pollers.
+    """
+
+    def __init__(self, device_ids: Optional[Set[str]], capacity: int):
+        self.device_ids = device_ids
+        self.buffer: Deque[str] = collections.deque(maxlen=capacity)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def accepts(self, device_id: str) -> bool:
+        return self.device_ids is None or device_id in self.device_ids
+
+    def offer(self, message: str):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(message)
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Waits for the next reading.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait before giving up.
+
+        Returns:
+            Optional[str]: The reading as JSON, or None if the timeout expired first.
+        """
+        while not self.buffer:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except TimeoutError:
+                return None
+        return self.buffer.popleft()
+
+
+class LatestCache:
+    """
+    Latest reading of every polled device, with fan-out to live-stream subscribers.
+
+    Pollers call `update` once per sample. The reading is serialised once and the
+    same string is handed to every interested subscriber, so the cost of a read on
+    the bus does not grow with the number of dashboards watching it. In a shard
+    worker, `forward` relays every update to the API process's cache, and every
+    `forget` as a None reading.
+    """
+
+    def __init__(self, buffer_size: Optional[int] = None):
+        self.buffer_size = buffer_size or int(os.environ.get("LIVE_BUFFER_SIZE", 100))
+        self.readings: Dict[str, dict] = {}
+        self.subscribers: Set[Subscription] = set()
+        self.forward: Optional[Callable[[str, Optional[dict]], None]] = None
+
+    def update(self, device_id: str, reading: dict):
+        self.readings[device_id] = reading
+        if self.forward is not None:
+            self.forward(device_id, reading)
+        if not self.subscribers:
+            return
+        message = json.dumps(reading)
+        for subscription in self.subscribers:
+            if subscription.accepts(device_id):
+                subscription.offer(message)
+
+    def get(self, device_id: str) -> Optional[dict]:
+        return self.readings.get(device_id)
+
+    def forget(self, device_id: str):
+        self.readings.pop(device_id, None)
+        if self.forward is not None:
+            self.forward(device_id, None)
+
+    def subscribe(self, device_ids: Optional[Iterable[str]] = None) -> Subscription:
+        """
+        Registers a live-stream client, primed with the current readings it asked for.
+
+        Args:
+            device_ids (Optional[Iterable[str]]): Devices to follow, defaults to all.
+
+        Returns:
+            Subscription: The client's buffer.
+        """
+        wanted = set(device_ids) if device_ids else None
+        subscription = Subscription(wanted, self.buffer_size)
+        for device_id, reading in self.readings.items():
+            if subscription.accepts(device_id):
+                subscription.offer(json.dumps(reading))
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+
+latest = LatestCache()
+
+registry.sampled("piphi_live_subscribers", "Connected live-stream clients.", lambda: len(latest.subscribers))
@@ -1,14 +1,49 @@
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
+from piphi_network_official_i2c_library.lib import sharding
+from piphi_network_official_i2c_library.lib.adapter_io import AdapterIO
+from piphi_network_official_i2c_library.lib.aht20 import aht20_engine
+from piphi_network_official_i2c_library.lib.bme68x import bme68x_engine
 from piphi_network_official_i2c_library.lib.common import PiPhiMCP2221
+from piphi_network_official_i2c_library.lib.history import history
+from piphi_network_official_i2c_library.lib.publisher import publisher
+from piphi_network_official_i2c_library.lib.scheduler import scheduler
+from piphi_network_official_i2c_library.lib.simulator import install_from_env
 
 
+logger = logging.getLogger(__name__)
+
 mcp_service = PiPhiMCP2221()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await mcp_service.identify_all_mcp2221()
-    devices = await mcp_service.build_discovery_results()
-    print("discovered mcp2221 devices",devices)
-    yield
\ No newline at end of file
+    if sharding.supervisor is not None:
+        await sharding.supervisor.start()
+        logger.info("polling adapters in %s shard workers", sharding.supervisor.shard_count)
+        yield
+        await sharding.supervisor.stop()
+        return
+    from piphi_network_official_i2c_library.contract import config
+
+    install_from_env()
+    await publisher.start()
+    await scheduler.start()
+    discovery = asyncio.create_task(mcp_service.discover_in_background())
+    yield
+    discovery.cancel()
+    try:
+        await discovery
+    except asyncio.CancelledError:
+        pass
+    await scheduler.stop()
+    for device_id in list(config.polling):
+        config.stop_polling(device_id)
+    await aht20_engine.stop()
+    await bme68x_engine.stop()
+    await publisher.stop()
+    history.close_all()
+    PiPhiMCP2221.reset()
+    AdapterIO.shutdown_all()
@@ -0,0 +1,209 @@
+import abc
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = array("Q", bytes(8 * (len(bounds) + 1)))
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Metric(abc.ABC):
+    """
+    Base for a metric family with a fixed set of label names.
+
+    Children are created once per label combination and cached, so hot paths keep a
+    reference to their child and update it without allocating.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.children: Dict[Tuple[str, ...], object] = {}
+        if not labelnames and self.kind != "untyped":
+            self.labels()
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Creates the value holder for one label combination."""
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self._new_child()
+        return child
+
+    def remove(self, *values: str):
+        self.children.pop(values, None)
+
+    @abc.abstractmethod
+    def render(self) -> List[str]:
+        """Returns the metric's sample lines in the Prometheus text format."""
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_label_text(self.labelnames, values)} {child.value}"
+            for values, child in self.children.items()
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.buckets = buckets
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = []
+        for values, child in self.children.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), child.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _label_text(self.labelnames, values, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, values)} {child.sum}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class Sampled(Metric):
+    """Gauge or counter whose value is read from a callback at scrape time, costing nothing on the hot path."""
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float], kind: str = "gauge"):
+        super().__init__(name, documentation)
+        self.kind = kind
+        self.callback = callback
+
+    def _new_child(self):
+        raise TypeError(f"{self.name} is read from its callback and has no labelled children")
+
+    def render(self) -> List[str]:
+        return [f"{self.name} {float(self.callback())}"]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Optional[Tuple[float, ...]] = None
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets or LATENCY_BUCKETS))
+
+    def sampled(self, name: str, documentation: str, callback: Callable[[], float], kind: str = "gauge") -> Sampled:
+        return self.register(Sampled(name, documentation, callback, kind))
+
+    def render(self) -> str:
+        """
+        Renders every registered metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition document.
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+i2c_latency = registry.histogram(
+    "piphi_i2c_transaction_seconds", "Duration of I2C transactions per adapter.", ("adapter",)
+)
+
+i2c_not_ack = registry.counter(
+    "piphi_i2c_not_ack_total", "I2C transactions not acknowledged by the slave.", ("adapter",)
+)
+
+i2c_timeouts = registry.counter(
+    "piphi_i2c_timeouts_total", "I2C transactions that timed out.", ("adapter",)
+)
+
+mux_switches = registry.counter(
+    "piphi_mux_channel_switches_total", "TCA9548A channel selections written per adapter.", ("adapter",)
+)
+
+pmsa003i_checksum_errors = registry.counter(
+    "piphi_pmsa003i_checksum_mismatch_total", "PMSA003I frames whose checksum did not match."
+)
+
+publish_latency = registry.histogram(
+    "piphi_mqtt_publish_seconds", "Time from handing a message to the publisher until the broker acknowledged it."
+)
+
+deadband_suppressed = registry.counter(
+    "piphi_deadband_suppressed_total", "Samples not published because no metric left its deadband."
+)
+
+poll_lag = registry.histogram(
+    "piphi_poll_lag_seconds", "Delay between a poll's due time and when it started."
+)
@@ -0,0 +1,216 @@
+import asyncio
+import importlib
+import logging
+import os
+import random
+import time
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Tuple, Union
+
+from piphi_network_official_i2c_library.lib.metrics import publish_latency, registry
+from piphi_network_official_i2c_library.lib.spool import SegmentLog, open_spool
+
+if TYPE_CHECKING:
+    import aiomqtt
+
+logger = logging.getLogger(__name__)
+
+Message = Tuple[str, Union[str, bytes], bool]
+
+Queued = Tuple[str, Union[str, bytes], bool, float]
+
+
+class MQTTPublisher:
+    """
+    Long-lived MQTT publisher shared by every poller.
+
+    Pollers hand messages to a bounded in-memory queue with `publish`, which never
+    waits on the network. A single background task owns the broker connection,
+    drains the queue in batches and reconnects with exponential backoff when the
+    broker goes away. When the queue is full the oldest message is dropped. Any
+    other error in the task is logged, the batch being sent is dropped and the
+    task reconnects, so one bad message or a failing disk cannot stop publishing.
+
+    While the broker is unreachable, messages are written to the on-disk spool
+    instead, and the spool is replayed in batches once the connection is back.
+    `connections` counts successful connects, so callers that rely on retained
+    messages can publish them again on a new connection.
+
+    aiomqtt, and the paho client under it, is imported on a worker thread when the
+    publisher task starts, keeping the slowest import of the service off startup.
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        qos: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ):
+        self.host = host or os.environ.get("MQTT_HOST", "localhost")
+        self.port = port or int(os.environ.get("MQTT_PORT", 1883))
+        self.qos = qos if qos is not None else int(os.environ.get("MQTT_QOS", 1))
+        self.max_queue = max_queue or int(os.environ.get("MQTT_MAX_QUEUE", 10000))
+        self.batch_size = batch_size or int(os.environ.get("MQTT_BATCH_SIZE", 100))
+        self.backoff_min = 0.5
+        self.backoff_max = 30.0
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        self.connected = False
+        self.connections = 0
+        self.dropped = 0
+        self.published = 0
+        self.spool: Optional[SegmentLog] = None
+        self.client_factory: Optional[Callable[..., Any]] = None
+        self.spooled = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def publish(self, topic: str, payload: Union[str, bytes], retain: bool = False) -> bool:
+        """
+        Queues a message for publishing without blocking.
+
+        Args:
+            topic (str): The MQTT topic.
+            payload (Union[str, bytes]): The encoded message body.
+            retain (bool): Whether the broker should retain the message.
+
+        Returns:
+            bool: False if a message had to be dropped for lack of room.
+        """
+        if self.spool is not None and not self.connected:
+            return self._to_spool(topic, payload, retain)
+        dropped = False
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            dropped = True
+        self.queue.put_nowait((topic, payload, retain, time.monotonic()))
+        return not dropped
+
+    async def start(self):
+        if self.spool is None:
+            self.spool = await asyncio.to_thread(open_spool)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self.connected = False
+        if self.spool is not None:
+            self._spill([])
+            self.spool.close()
+            self.spool = None
+        queue, self.queue = self.queue, asyncio.Queue(maxsize=self.max_queue)
+        while not queue.empty():
+            self.queue.put_nowait(queue.get_nowait())
+
+    def _to_spool(self, topic: str, payload: Union[str, bytes], retain: bool) -> bool:
+        if self.spool.append(topic, payload, retain):
+            self.spooled += 1
+            return True
+        self.dropped += 1
+        return False
+
+    def _spill(self, pending: List[Queued]):
+        """Moves undelivered messages from memory to the spool."""
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for topic, payload, retain, _ in pending:
+            self._to_spool(topic, payload, retain)
+
+    async def _send(self, client: "aiomqtt.Client", batch: List[Message]):
+        await asyncio.gather(
+            *(client.publish(topic, payload, qos=self.qos, retain=retain) for topic, payload, retain in batch)
+        )
+        self.published += len(batch)
+
+    async def _send_queued(self, client: "aiomqtt.Client", batch: List[Queued]):
+        """Sends messages taken from the queue, recording how long each waited since `publish`."""
+        await self._send(client, [(topic, payload, retain) for topic, payload, retain, _ in batch])
+        now = time.monotonic()
+        for *_, enqueued in batch:
+            publish_latency.observe(now - enqueued)
+
+    async def _replay(self, client: "aiomqtt.Client"):
+        while self.spool.pending():
+            batch, position = await asyncio.to_thread(self.spool.read_batch, self.batch_size)
+            if batch:
+                await self._send(client, batch)
+            await asyncio.to_thread(self.spool.commit, position)
+            if not batch:
+                break
+
+    async def _next_batch(self) -> List[Queued]:
+        batch = [await self.queue.get()]
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        aiomqtt = await asyncio.to_thread(importlib.import_module, "aiomqtt")
+        client_factory = self.client_factory or aiomqtt.Client
+        backoff = self.backoff_min
+        pending: List[Queued] = []
+        while True:
+            try:
+                async with client_factory(self.host, port=self.port) as client:
+                    self.connected = True
+                    self.connections += 1
+                    backoff = self.backoff_min
+                    logger.info("connected to mqtt broker %s:%s", self.host, self.port)
+                    if self.spool is not None:
+                        await self._replay(client)
+                    while True:
+                        if not pending:
+                            pending = await self._next_batch()
+                        await self._send_queued(client, pending)
+                        pending = []
+            except Exception as error:
+                self.connected = False
+                delay = backoff * (1 + random.random())
+                if isinstance(error, aiomqtt.MqttError):
+                    logger.warning(
+                        "mqtt broker %s:%s unavailable (%s), retrying in %.1fs",
+                        self.host,
+                        self.port,
+                        error,
+                        delay,
+                    )
+                else:
+                    logger.exception(
+                        "mqtt publisher failed, dropping %d in-flight messages and restarting in %.1fs",
+                        len(pending),
+                        delay,
+                    )
+                    self.dropped += len(pending)
+                    pending = []
+                if self.spool is not None:
+                    try:
+                        self._spill(pending)
+                        pending = []
+                    except OSError:
+                        logger.exception("spooling undelivered messages failed")
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, self.backoff_max)
+
+publisher = MQTTPublisher()
+
+registry.sampled("piphi_mqtt_queue_depth", "Messages waiting in the in-memory publish queue.", lambda: publisher.queue.qsize())
+registry.sampled("piphi_mqtt_connected", "1 while the broker connection is up.", lambda: publisher.connected)
+registry.sampled(
+    "piphi_mqtt_published_total", "Messages acknowledged by the broker.", lambda: publisher.published, "counter"
+)
+registry.sampled(
+    "piphi_mqtt_dropped_total",
+    "Messages dropped because the queue or the spool was full, or could not be sent.",
+    lambda: publisher.dropped,
+    "counter",
+)
+registry.sampled(
+    "piphi_mqtt_spooled_total", "Messages written to the on-disk spool.", lambda: publisher.spooled, "counter"
+)
@@ -0,0 +1,85 @@
+import math
+import operator
+from array import array
+from typing import Dict, Iterable
+
+
+class MetricRing:
+    """Fixed-capacity ring of float samples backed by a preallocated `array('d')`."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.values = array("d", bytes(8 * capacity))
+        self.count = 0
+        self.head = 0
+        self.last = math.nan
+
+    def append(self, value: float):
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.last = value
+
+    def window(self) -> memoryview:
+        """Returns the stored samples without copying; their order is irrelevant to the summary."""
+        return memoryview(self.values)[: self.count]
+
+    def clear(self):
+        self.count = 0
+        self.head = 0
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Summarises the stored samples.
+
+        The reductions run over the raw buffer with C-level builtins, so no per-sample
+        Python objects are kept between calls.
+
+        Returns:
+            Dict[str, float]: min, max, mean, stddev, last and count of the window.
+        """
+        window = self.window()
+        count = len(window)
+        mean = math.fsum(window) / count
+        variance = max(math.fsum(map(operator.mul, window, window)) / count - mean * mean, 0.0)
+        return {
+            "min": min(window),
+            "max": max(window),
+            "mean": mean,
+            "stddev": math.sqrt(variance),
+            "last": self.last,
+            "count": count,
+        }
+
+
+class SampleWindow:
+    """
+    Per-device set of metric rings filled at the sampling rate and drained at publish time.
+
+    Capacity is fixed when the window is created, so memory use per device does not
+    grow however long the service runs; if publishing stalls, the oldest samples are
+    overwritten.
+    """
+
+    def __init__(self, metrics: Iterable[str], capacity: int):
+        self.rings = {metric: MetricRing(capacity) for metric in metrics}
+
+    def add(self, metrics: Dict[str, float]):
+        for metric, value in metrics.items():
+            ring = self.rings.get(metric)
+            if ring is not None and value is not None:
+                ring.append(value)
+
+    def drain(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarises every metric that received samples and empties the window.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Summary statistics keyed by metric name.
+        """
+        stats = {}
+        for metric, ring in self.rings.items():
+            if ring.count:
+                stats[metric] = ring.summary()
+                ring.clear()
+        return stats
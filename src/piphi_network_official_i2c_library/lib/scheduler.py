@@ -0,0 +1,294 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from piphi_network_official_i2c_library.lib.metrics import poll_lag, registry
+
+logger = logging.getLogger(__name__)
+
+
+class PollJob:
+    def __init__(self, job_id: str, adapter: str, interval: float, run: Callable[[], Awaitable[None]]):
+        self.job_id = job_id
+        self.adapter = adapter
+        self.interval = interval
+        self.run = run
+        self.aligned = False
+        self.channel: Optional[int] = None
+        self.running = False
+        self.due = 0.0
+        self.version = 0
+        self.runs = 0
+        self.failures = 0
+        self.overruns = 0
+        self.last_lag = 0.0
+
+
+class PollScheduler:
+    """
+    Single timer heap that owns every sensor poll.
+
+    Jobs run at a fixed rate from their first due time, so they do not drift. The
+    random phase that spreads bus load is chosen once per adapter and interval, so
+    every job with the same period on an adapter shares one grid. Jobs that fall due together on
+    the same adapter are run back to back in one slot, grouped by mux channel so
+    the adapter's mux is switched at most once per channel per slot. A slot that
+    falls due while the adapter's previous one is still running queues behind it,
+    but a job whose own previous run has not finished yet is counted as an overrun
+    and skipped to its next period instead of queueing up twice.
+    """
+
+    def __init__(self, jitter: Optional[float] = None):
+        self.jitter = jitter if jitter is not None else float(os.environ.get("SCHEDULER_JITTER", 0.1))
+        self.jobs: Dict[str, PollJob] = {}
+        self.max_lag = 0.0
+        self.overruns = 0
+        self._heap: List[Tuple[float, int, int, str]] = []
+        self._phases: Dict[Tuple[str, float], float] = {}
+        self._sequence = itertools.count()
+        self._slots: Dict[str, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(
+        self,
+        job_id: str,
+        adapter: str,
+        interval: float,
+        run: Callable[[], Awaitable[None]],
+        aligned: bool = False,
+        channel: Optional[int] = None,
+    ) -> PollJob:
+        """
+        Schedules `run` every `interval` seconds, replacing any job with the same id.
+
+        Other jobs join the phase grid of their adapter and interval, so jobs added to
+        the same adapter with the same interval fall due in the same slot. Aligned jobs
+        skip the random phase and fall due on multiples of their interval, so every
+        aligned job with the same interval runs in the same tick.
+
+        Args:
+            job_id (str): Unique job identifier, usually the device id.
+            adapter (str): The usbpath of the adapter the job reads from.
+            interval (float): Seconds between runs.
+            run (Callable): Coroutine function taking one sample.
+            aligned (bool): Snap the due time to the interval grid instead of jittering it.
+            channel (Optional[int]): The mux channel the sensor sits behind, if any.
+
+        Returns:
+            PollJob: The scheduled job.
+
+        Raises:
+            ValueError: If the interval is not positive.
+        """
+        if not interval > 0:
+            raise ValueError(f"Poll interval must be positive, not {interval}")
+        previous = self.jobs.get(job_id)
+        job = PollJob(job_id, adapter, interval, run)
+        job.aligned = aligned
+        job.channel = channel
+        job.version = previous.version + 1 if previous else 0
+        job.due = self._next_due(job, time.monotonic())
+        self.jobs[job_id] = job
+        if previous is not None:
+            self._release_phase(previous)
+        self._push(job)
+        return job
+
+    def set_interval(self, job_id: str, interval: float) -> Optional[PollJob]:
+        """
+        Changes the period of a scheduled job.
+
+        The next run moves to the next slot on the adapter's grid for the new interval,
+        or to the next multiple of the new interval for aligned jobs.
+
+        Args:
+            job_id (str): The job to change.
+            interval (float): The new number of seconds between runs.
+
+        Returns:
+            Optional[PollJob]: The job, or None if it is not scheduled.
+        """
+        if not interval > 0:
+            raise ValueError(f"Poll interval must be positive, not {interval}")
+        job = self.jobs.get(job_id)
+        if job is None or interval == job.interval:
+            return job
+        previous = (job.adapter, job.interval)
+        job.interval = interval
+        job.due = self._next_due(job, time.monotonic())
+        job.version += 1
+        self._release_phase(job, previous)
+        self._push(job)
+        return job
+
+    def update(self, job_id: str, interval: float, run: Callable[[], Awaitable[None]]) -> Optional[PollJob]:
+        """
+        Swaps the coroutine and period of a scheduled job without restarting it.
+
+        A run already in progress finishes with the old coroutine; the job keeps its
+        phase, so reconfiguring a device does not reset or skip its next poll.
+
+        Returns:
+            Optional[PollJob]: The job, or None if it is not scheduled.
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        job.run = run
+        self.set_interval(job_id, interval)
+        return job
+
+    def remove(self, job_id: str) -> Optional[PollJob]:
+        job = self.jobs.pop(job_id, None)
+        if job is not None:
+            self._release_phase(job)
+        return job
+
+    def _next_due(self, job: PollJob, now: float) -> float:
+        if job.aligned:
+            return math.ceil(now / job.interval) * job.interval
+        key = (job.adapter, job.interval)
+        anchor = self._phases.get(key)
+        if anchor is None:
+            anchor = self._phases[key] = now + random.uniform(0, job.interval * self.jitter)
+            return anchor
+        return anchor + math.ceil(max(now - anchor, 0) / job.interval) * job.interval
+
+    def _release_phase(self, job: PollJob, key: Optional[Tuple[str, float]] = None):
+        key = key or (job.adapter, job.interval)
+        if not any(
+            (other.adapter, other.interval) == key and not other.aligned for other in self.jobs.values()
+        ):
+            self._phases.pop(key, None)
+
+    def _push(self, job: PollJob):
+        heapq.heappush(self._heap, (job.due, next(self._sequence), job.version, job.job_id))
+        self._wakeup.set()
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = [task for task in (self._task, *self._slots.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._slots.clear()
+        self._wakeup = asyncio.Event()
+
+    def _pop_due(self, now: float) -> Dict[str, List[PollJob]]:
+        due: Dict[str, List[PollJob]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            _, _, version, job_id = heapq.heappop(self._heap)
+            job = self.jobs.get(job_id)
+            if job is None or job.version != version:
+                continue
+            due.setdefault(job.adapter, []).append(job)
+        for jobs in due.values():
+            jobs.sort(key=lambda job: -1 if job.channel is None else job.channel)
+        return due
+
+    def _reschedule(self, job: PollJob, now: float):
+        job.due += job.interval
+        if job.due <= now:
+            missed = int((now - job.due) // job.interval) + 1
+            job.due += missed * job.interval
+        self._push(job)
+
+    async def _run_slot(self, jobs: List[Tuple[PollJob, float]], previous: Optional[asyncio.Task] = None):
+        try:
+            if previous is not None:
+                await previous
+            for job, due in jobs:
+                job.last_lag = time.monotonic() - due
+                self.max_lag = max(self.max_lag, job.last_lag)
+                poll_lag.observe(job.last_lag)
+                try:
+                    await job.run()
+                    job.runs += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    job.failures += 1
+                    logger.exception("poll job %s failed", job.job_id)
+                finally:
+                    job.running = False
+        finally:
+            for job, _ in jobs:
+                job.running = False
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = max(self._heap[0][0] - time.monotonic(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+                continue
+            except TimeoutError:
+                pass
+            now = time.monotonic()
+            for adapter, jobs in self._pop_due(now).items():
+                ready = []
+                for job in jobs:
+                    if job.running:
+                        job.overruns += 1
+                        self.overruns += 1
+                    else:
+                        job.running = True
+                        ready.append((job, job.due))
+                    self._reschedule(job, now)
+                if ready:
+                    slot = self._slots.get(adapter)
+                    self._slots[adapter] = asyncio.create_task(
+                        self._run_slot(
+                            ready,
+                            slot if slot is not None and not slot.done() else None,
+                        )
+                    )
+
+    def stats(self) -> dict:
+        """
+        Returns scheduling lag and overrun counters for the scheduler and each job.
+
+        Returns:
+            dict: Aggregate and per-job metrics, lags in seconds.
+        """
+        return {
+            "jobs": len(self.jobs),
+            "max_lag": round(self.max_lag, 4),
+            "overruns": self.overruns,
+            "per_job": {
+                job.job_id: {
+                    "adapter": job.adapter,
+                    "channel": job.channel,
+                    "interval": job.interval,
+                    "runs": job.runs,
+                    "failures": job.failures,
+                    "overruns": job.overruns,
+                    "last_lag": round(job.last_lag, 4),
+                }
+                for job in self.jobs.values()
+            },
+        }
+
+
+scheduler = PollScheduler()
+
+registry.sampled("piphi_poll_jobs", "Poll jobs currently scheduled.", lambda: len(scheduler.jobs))
+registry.sampled(
+    "piphi_poll_overruns_total",
+    "Polls skipped because their previous run had not finished.",
+    lambda: scheduler.overruns,
+    "counter",
+)
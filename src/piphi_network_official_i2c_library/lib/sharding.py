@@ -0,0 +1,345 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from piphi_network_official_i2c_library.lib.breaker import CircuitBreaker
+from piphi_network_official_i2c_library.lib.common import PiPhiMCP2221
+from piphi_network_official_i2c_library.lib.latest import latest
+from piphi_network_official_i2c_library.lib.simulator import install_from_env
+
+logger = logging.getLogger(__name__)
+
+
+class Shard:
+    """Bookkeeping for one worker process and the device configs it owns."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[multiprocessing.Process] = None
+        self.commands: Optional[multiprocessing.Queue] = None
+        self.pid: Optional[int] = None
+        self.ready = False
+        self.started_at = 0.0
+        self.restart_at = 0.0
+        self.restarts = 0
+        self.failures = 0
+        self.configs: Dict[str, dict] = {}
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.exitcode is None
+
+
+class ShardSupervisor:
+    """
+    Partitions adapters across worker processes and supervises them.
+
+    Adapters are assigned to workers by a stable hash of their usbpath. Each worker
+    runs discovery, the scheduler and a publisher for its own adapters, so bus I/O,
+    encoding, signing and MQTT publishing scale across cores. Workers send readings
+    back over a queue into the latest-value cache, and answer discovery and config
+    requests forwarded by the API.
+
+    A worker that exits is restarted with exponential backoff, and the device
+    configs it owned are replayed so polling resumes without a new POST /config.
+    """
+
+    def __init__(self, shard_count: int, request_timeout: Optional[float] = None):
+        self.shard_count = shard_count
+        self.request_timeout = request_timeout or float(os.environ.get("SHARD_REQUEST_TIMEOUT", 30.0))
+        self.backoff_min = 1.0
+        self.backoff_max = 30.0
+        self.stable_after = 60.0
+        self.shards = [Shard(index) for index in range(shard_count)]
+        self.context = multiprocessing.get_context("spawn")
+        self.events: Optional[multiprocessing.Queue] = None
+        self.pending: Dict[int, Tuple[int, asyncio.Future]] = {}
+        self._ids = itertools.count()
+        self._receiver: Optional[asyncio.Task] = None
+        self._supervisor: Optional[asyncio.Task] = None
+
+    def shard_for(self, usbpath: str) -> Shard:
+        return self.shards[PiPhiMCP2221.shard_for(usbpath, self.shard_count)]
+
+    async def start(self):
+        self.events = self.context.Queue()
+        for shard in self.shards:
+            self._spawn(shard)
+        self._receiver = asyncio.create_task(self._receive())
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    async def stop(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+        for shard in self.shards:
+            if shard.alive:
+                shard.commands.put(("stop",))
+        await asyncio.to_thread(self._join)
+        if self.events is not None:
+            self.events.put(None)
+        if self._receiver is not None:
+            await self._receiver
+        self._receiver = self._supervisor = None
+
+    def _join(self, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        for shard in self.shards:
+            if shard.process is None:
+                continue
+            shard.process.join(max(deadline - time.monotonic(), 0))
+            if shard.process.is_alive():
+                logger.warning("shard %s did not stop, terminating", shard.index)
+                shard.process.terminate()
+                shard.process.join()
+
+    def _spawn(self, shard: Shard):
+        shard.commands = self.context.Queue()
+        shard.process = self.context.Process(
+            target=run_shard,
+            args=(shard.index, self.shard_count, shard.commands, self.events),
+            name=f"piphi-shard-{shard.index}",
+            daemon=True,
+        )
+        shard.process.start()
+        shard.ready = False
+        shard.started_at = time.monotonic()
+        for payload in shard.configs.values():
+            shard.commands.put(("config", None, payload))
+
+    def _next_events(self, limit: int = 256) -> List[tuple]:
+        events = [self.events.get()]
+        try:
+            while len(events) < limit:
+                events.append(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        return events
+
+    async def _receive(self):
+        while True:
+            for event in await asyncio.to_thread(self._next_events):
+                if event is None:
+                    return
+                kind = event[0]
+                if kind == "reading":
+                    if event[2] is None:
+                        latest.forget(event[1])
+                    else:
+                        latest.update(event[1], event[2])
+                elif kind == "result":
+                    _, request_id, result, error = event
+                    entry = self.pending.pop(request_id, None)
+                    if entry is None or entry[1].done():
+                        continue
+                    if error is not None:
+                        entry[1].set_exception(HTTPException(status_code=error[0], detail=error[1]))
+                    else:
+                        entry[1].set_result(result)
+                elif kind == "ready":
+                    shard = self.shards[event[1]]
+                    shard.ready = True
+                    shard.pid = event[2]
+                    logger.info("shard %s ready (pid %s)", shard.index, shard.pid)
+
+    def _fail_pending(self, shard: Shard):
+        for request_id, (index, future) in list(self.pending.items()):
+            if index == shard.index:
+                del self.pending[request_id]
+                if not future.done():
+                    future.set_exception(HTTPException(status_code=503, detail=f"Shard {index} exited"))
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(1.0)
+            now = time.monotonic()
+            for shard in self.shards:
+                if shard.alive:
+                    continue
+                if not shard.restart_at:
+                    shard.ready = False
+                    self._fail_pending(shard)
+                    if now - shard.started_at > self.stable_after:
+                        shard.failures = 0
+                    delay = min(self.backoff_min * 2 ** shard.failures, self.backoff_max)
+                    shard.failures += 1
+                    shard.restart_at = now + delay
+                    logger.warning(
+                        "shard %s exited with code %s, restarting in %.0fs",
+                        shard.index,
+                        shard.process.exitcode,
+                        delay,
+                    )
+                elif now >= shard.restart_at:
+                    shard.restart_at = 0.0
+                    shard.restarts += 1
+                    self._spawn(shard)
+
+    async def request(self, shard: Shard, kind: str, *args) -> Any:
+        """
+        Sends a command to a worker and waits for its answer.
+
+        Args:
+            shard (Shard): The worker to ask.
+            kind (str): The command, `config`, `remove`, `discover` or `breakers`.
+
+        Returns:
+            Any: The worker's result. Errors are raised as HTTPException.
+        """
+        if not shard.alive:
+            raise HTTPException(status_code=503, detail=f"Shard {shard.index} is restarting")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = (shard.index, future)
+        shard.commands.put((kind, request_id, *args))
+        try:
+            return await asyncio.wait_for(future, self.request_timeout)
+        except TimeoutError:
+            raise HTTPException(status_code=504, detail=f"Shard {shard.index} did not answer")
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def configure(self, payload: dict) -> Any:
+        """Forwards a device config to the worker owning its adapter and remembers it for restarts."""
+        shard = self.shard_for(payload["usbpath"])
+        for other in self.shards:
+            if other is not shard and other.configs.pop(payload["id"], None) is not None and other.alive:
+                other.commands.put(("remove", None, payload["id"]))
+        try:
+            result = await self.request(shard, "config", payload)
+        except HTTPException:
+            shard.configs.pop(payload["id"], None)
+            raise
+        shard.configs[payload["id"]] = payload
+        return result
+
+    async def discover(self, refresh: bool = False) -> dict:
+        """Merges the discovery results of every worker that answers."""
+        shards = [shard for shard in self.shards if shard.alive]
+        results = await asyncio.gather(*(self.request(shard, "discover", refresh) for shard in shards), return_exceptions=True)
+        devices: List[dict] = []
+        timings: Dict[str, dict] = {}
+        for shard, result in zip(shards, results):
+            if isinstance(result, BaseException):
+                logger.warning("shard %s discovery failed: %s", shard.index, result)
+                continue
+            devices.extend(result["devices"])
+            timings.update(result["timings"])
+        return {"devices": devices, "timings": timings}
+
+    async def breakers(self) -> Dict[str, dict]:
+        """Merges the adapter circuit breaker states of every worker that answers."""
+        shards = [shard for shard in self.shards if shard.alive]
+        results = await asyncio.gather(*(self.request(shard, "breakers") for shard in shards), return_exceptions=True)
+        merged: Dict[str, dict] = {}
+        for result in results:
+            if not isinstance(result, BaseException):
+                merged.update(result)
+        return merged
+
+    @property
+    def ready(self) -> bool:
+        """True once every worker has finished its first discovery pass."""
+        return all(shard.ready for shard in self.shards)
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "workers": [
+                {
+                    "index": shard.index,
+                    "pid": shard.pid,
+                    "alive": shard.alive,
+                    "ready": shard.ready,
+                    "restarts": shard.restarts,
+                    "devices": len(shard.configs),
+                }
+                for shard in self.shards
+            ]
+        }
+
+
+def run_shard(index: int, shard_count: int, commands: multiprocessing.Queue, events: multiprocessing.Queue):
+    """Entry point of a worker process."""
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "info").upper())
+    try:
+        asyncio.run(serve_shard(index, shard_count, commands, events))
+    except KeyboardInterrupt:
+        pass
+
+
+async def serve_shard(index: int, shard_count: int, commands: multiprocessing.Queue, events: multiprocessing.Queue):
+    from piphi_network_official_i2c_library.contract import config
+    from piphi_network_official_i2c_library.contract.schema import I2cSensorsSchema
+    from piphi_network_official_i2c_library.lib.adapter_io import AdapterIO
+    from piphi_network_official_i2c_library.lib.history import history
+    from piphi_network_official_i2c_library.lib.publisher import publisher
+    from piphi_network_official_i2c_library.lib.scheduler import scheduler
+
+    global supervisor
+    supervisor = None
+    PiPhiMCP2221.shard = (index, shard_count)
+    os.environ["SPOOL_DIR"] = os.path.join(os.environ.get("DATA_DIR", "/app/data"), f"spool-shard-{index}")
+    latest.forward = lambda device_id, reading: events.put(("reading", device_id, reading))
+
+    install_from_env()
+    service = PiPhiMCP2221()
+    await publisher.start()
+    await scheduler.start()
+    await service.refresh_discovery(full=True)
+    watcher = asyncio.create_task(service.watch_adapters())
+    events.put(("ready", index, os.getpid()))
+    parent = multiprocessing.parent_process()
+    try:
+        while True:
+            try:
+                command = await asyncio.to_thread(commands.get, True, 1.0)
+            except queue.Empty:
+                if parent is not None and not parent.is_alive():
+                    break
+                continue
+            if command[0] == "stop":
+                break
+            kind, request_id, *args = command
+            result, error = None, None
+            try:
+                if kind == "config":
+                    result = await config.set_config(I2cSensorsSchema(**args[0]))
+                elif kind == "remove":
+                    config.stop_polling(args[0])
+                elif kind == "discover":
+                    if args[0]:
+                        devices = await service.refresh_discovery(full=True)
+                    else:
+                        devices = list(PiPhiMCP2221.discovery_cache.values())
+                    result = {"devices": devices, "timings": PiPhiMCP2221.probe_timings}
+                elif kind == "breakers":
+                    result = CircuitBreaker.report()
+            except HTTPException as exception:
+                error = (exception.status_code, exception.detail)
+            except Exception as exception:
+                logger.exception("shard %s failed to handle %s", index, kind)
+                error = (500, str(exception))
+            if request_id is not None:
+                events.put(("result", request_id, result, error))
+    finally:
+        watcher.cancel()
+        try:
+            await watcher
+        except asyncio.CancelledError:
+            pass
+        await scheduler.stop()
+        await publisher.stop()
+        history.close_all()
+        AdapterIO.shutdown_all()
+
+
+worker_count = int(os.environ.get("SHARD_WORKERS", 0))
+
+supervisor: Optional[ShardSupervisor] = ShardSupervisor(worker_count) if worker_count > 0 else None
@@ -0,0 +1,502 @@
+import asyncio
+import collections
+import os
+import random
+import struct
+import threading
+import time
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import EasyMCP2221
+
+from piphi_network_official_i2c_library.lib.aht20 import crc8
+
+MCP2221_HWID = "USB VID:PID=04D8:00DD"
+
+BME680_CALIBRATION = {
+    "t1": 26276, "t2": 26310, "t3": 3,
+    "p1": 36427, "p2": -10316, "p3": 88, "p4": 7013, "p5": -138, "p6": 30, "p7": 43,
+    "p8": -2668, "p9": -2508, "p10": 30,
+    "h1": 770, "h2": 1010, "h3": 0, "h4": 45, "h5": 20, "h6": 120, "h7": -100,
+    "gh1": -30, "gh2": -13021, "gh3": 18,
+}
+
+BME280_CALIBRATION = {
+    "t1": 27504, "t2": 26435, "t3": -1000,
+    "p1": 36477, "p2": -10685, "p3": 3024, "p4": 2855, "p5": 140, "p6": -7, "p7": 15500,
+    "p8": -14600, "p9": 6000,
+    "h1": 75, "h2": 362, "h3": 0, "h4": 324, "h5": 0, "h6": 30,
+}
+
+
+class SimulatedSensor:
+    """
+    Register-level model of an I2C sensor behind a simulated adapter.
+
+    A write sets the register pointer from its first byte and stores the rest at
+    consecutive registers, a read returns bytes from the pointer onwards. This is
+    what `EasyMCP2221.SMBus` does on the wire, so the real SMBus class and the
+    vendor libraries run unchanged on top of it.
+    """
+
+    name = ""
+    address = 0x00
+
+    def __init__(self, address: Optional[int] = None, rng: Optional[random.Random] = None):
+        self.address = address if address is not None else self.address
+        self.rng = rng or random.Random()
+        self.registers = bytearray(256)
+        self.pointer = 0
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        self.pointer = data[0]
+        for offset, value in enumerate(data[1:]):
+            self.on_write((self.pointer + offset) & 0xFF, value)
+
+    def on_write(self, register: int, value: int):
+        self.registers[register] = value
+
+    def read(self, size: int) -> bytes:
+        end = self.pointer + size
+        data = bytes(self.registers[self.pointer:end])
+        self.pointer = end & 0xFF
+        return data.ljust(size, b"\x00")
+
+    def reading(self, base: float, spread: float) -> float:
+        return self.rng.gauss(base, spread)
+
+
+class BME680Model(SimulatedSensor):
+    """
+    BME680 in forced mode: writing mode 1 to `ctrl_meas` fills field 0 with fresh ADC values.
+
+    Field 0 reports measuring, without the new-data flag, until the measurement is
+    done: `tph_time` seconds, plus the heater duration set in `gas_wait_0` when
+    gas measurements are enabled.
+    """
+
+    name = "BME68x"
+    address = 0x76
+
+    def __init__(
+        self, address: Optional[int] = None, rng: Optional[random.Random] = None, tph_time: float = 0.034
+    ):
+        super().__init__(address, rng)
+        self.tph_time = tph_time
+        self.ready_at: Optional[float] = None
+        c = BME680_CALIBRATION
+        block1 = struct.pack(
+            "<BhbBHhbBhhbbHhhBB",
+            0, c["t2"], c["t3"], 0, c["p1"], c["p2"], c["p3"], 0, c["p4"], c["p5"], c["p7"], c["p6"],
+            0, c["p8"], c["p9"], c["p10"], 0,
+        )
+        h1, h2 = c["h1"], c["h2"]
+        block2 = bytes([h2 >> 4, ((h2 & 0x0F) << 4) | (h1 & 0x0F), h1 >> 4]) + struct.pack(
+            "<bbbBbHhbb", c["h3"], c["h4"], c["h5"], c["h6"], c["h7"], c["t1"], c["gh2"], c["gh1"], c["gh3"]
+        )
+        self.registers[0x89:0x89 + len(block1)] = block1
+        self.registers[0xE1:0xE1 + len(block2)] = block2
+        self.registers[0x00] = 44
+        self.registers[0x02] = 0x10
+        self.registers[0xD0] = 0x61
+
+    def on_write(self, register: int, value: int):
+        self.registers[register] = value
+        if register == 0x74 and value & 0x03 == 0x01:
+            self.ready_at = time.monotonic() + self.measurement_time()
+            self.registers[0x1D] = 0x20
+            self.registers[0x74] = value & ~0x03
+
+    def measurement_time(self) -> float:
+        duration = self.tph_time
+        if self.registers[0x71] & 0x10:
+            gas_wait = self.registers[0x64]
+            duration += (gas_wait & 0x3F) * 4 ** (gas_wait >> 6) / 1000
+        return duration
+
+    def read(self, size: int) -> bytes:
+        if self.ready_at is not None and time.monotonic() >= self.ready_at:
+            self.ready_at = None
+            self.measure()
+        return super().read(size)
+
+    def measure(self):
+        pressure = int(self.reading(370000, 400)) & 0xFFFFF
+        temperature = int(self.reading(500000, 400)) & 0xFFFFF
+        humidity = int(self.reading(21000, 150)) & 0xFFFF
+        gas = int(self.reading(600, 20)) & 0x3FF
+        self.registers[0x1D:0x2E] = bytes(
+            [
+                0x80,
+                (self.registers[0x1E] + 1) & 0xFF,
+                pressure >> 12, (pressure >> 4) & 0xFF, (pressure & 0x0F) << 4,
+                temperature >> 12, (temperature >> 4) & 0xFF, (temperature & 0x0F) << 4,
+                humidity >> 8, humidity & 0xFF,
+                0, 0, 0,
+                gas >> 2, ((gas & 0x03) << 6) | 0x30 | 0x04,
+                0, 0,
+            ]
+        )
+
+
+class BME280Model(SimulatedSensor):
+    """BME280 in normal mode: the data registers hold a fresh conversion on every read."""
+
+    name = "BME280"
+    address = 0x76
+
+    def __init__(self, address: Optional[int] = None, rng: Optional[random.Random] = None):
+        super().__init__(address, rng)
+        c = BME280_CALIBRATION
+        self.registers[0x88:0xA2] = struct.pack(
+            "<HhhHhhhhhhhhBB",
+            c["t1"], c["t2"], c["t3"], c["p1"], c["p2"], c["p3"], c["p4"], c["p5"], c["p6"],
+            c["p7"], c["p8"], c["p9"], 0, c["h1"],
+        )
+        self.registers[0xE1:0xE8] = struct.pack("<hB", c["h2"], c["h3"]) + bytes(
+            [c["h4"] >> 4, ((c["h5"] & 0x0F) << 4) | (c["h4"] & 0x0F), c["h5"] >> 4, c["h6"] & 0xFF]
+        )
+        self.registers[0xD0] = 0x60
+
+    def read(self, size: int) -> bytes:
+        if self.pointer == 0xF7:
+            pressure = int(self.reading(415148, 300)) & 0xFFFFF
+            temperature = int(self.reading(519888, 300)) & 0xFFFFF
+            humidity = int(self.reading(27000, 150)) & 0xFFFF
+            self.registers[0xF7:0xFF] = bytes(
+                [
+                    pressure >> 12, (pressure >> 4) & 0xFF, (pressure & 0x0F) << 4,
+                    temperature >> 12, (temperature >> 4) & 0xFF, (temperature & 0x0F) << 4,
+                    humidity >> 8, humidity & 0xFF,
+                ]
+            )
+        return super().read(size)
+
+
+class AHT20Model(SimulatedSensor):
+    """AHT20 that reports busy for `conversion_time` seconds after a trigger command."""
+
+    name = "AHT20"
+    address = 0x38
+
+    def __init__(
+        self, address: Optional[int] = None, rng: Optional[random.Random] = None, conversion_time: float = 0.075
+    ):
+        super().__init__(address, rng)
+        self.conversion_time = conversion_time
+        self.ready_at = 0.0
+        self.frame = bytes([0x18, 0, 0, 0, 0, 0, 0])
+
+    def write(self, data: bytes):
+        if bytes(data[:1]) == b"\xAC":
+            self.ready_at = time.monotonic() + self.conversion_time
+            humidity = int(self.reading(41.0, 0.5) / 100 * 0x100000) & 0xFFFFF
+            temperature = int((self.reading(21.5, 0.1) + 50) / 200 * 0x100000) & 0xFFFFF
+            body = bytes(
+                [
+                    0x18,
+                    humidity >> 12, (humidity >> 4) & 0xFF, ((humidity & 0x0F) << 4) | (temperature >> 16),
+                    (temperature >> 8) & 0xFF, temperature & 0xFF,
+                ]
+            )
+            self.frame = body + bytes([crc8(body)])
+
+    def read(self, size: int) -> bytes:
+        if time.monotonic() < self.ready_at:
+            return bytes([self.frame[0] | 0x80]) + self.frame[1:size]
+        return self.frame[:size]
+
+
+class PMSA003IModel(SimulatedSensor):
+    """PMSA003I that answers every read with a fresh, correctly checksummed 32-byte frame."""
+
+    name = "PMSA003I"
+    address = 0x12
+
+    def read(self, size: int) -> bytes:
+        values = [max(int(self.reading(base, base * 0.1)), 0) for base in (8, 12, 15, 8, 12, 15, 1500, 450, 90, 8, 2, 1)]
+        body = struct.pack(">BBH13H", 0x42, 0x4D, 28, *values, 0)
+        frame = body + struct.pack(">H", sum(body) & 0xFFFF)
+        return frame[:size]
+
+
+class TCA9548AModel(SimulatedSensor):
+    """
+    TCA9548A I2C mux: a single control register whose bits connect channels 0-7 to the bus.
+
+    Sensors behind the mux only answer while their channel is connected.
+    """
+
+    name = "TCA9548A"
+    address = 0x70
+
+    def __init__(
+        self,
+        channels: Optional[Dict[int, Sequence[SimulatedSensor]]] = None,
+        address: Optional[int] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        super().__init__(address, rng)
+        self.channels = {channel: list(sensors) for channel, sensors in (channels or {}).items()}
+        self.mask = 0x00
+
+    def write(self, data: bytes):
+        if data:
+            self.mask = data[-1]
+
+    def read(self, size: int) -> bytes:
+        return bytes([self.mask]) * size
+
+    def lookup(self, addr: int) -> Optional[SimulatedSensor]:
+        for channel, sensors in self.channels.items():
+            if self.mask & (1 << channel):
+                for sensor in sensors:
+                    if sensor.address == addr:
+                        return sensor
+        return None
+
+
+SENSOR_MODELS: Dict[str, Callable[..., SimulatedSensor]] = {
+    "BME68x": BME680Model,
+    "BME280": BME280Model,
+    "AHT20": AHT20Model,
+    "PMSA003I": PMSA003IModel,
+}
+
+
+class SimulatedDevice:
+    """
+    Stand-in for `EasyMCP2221.Device` answering I2C transactions from sensor models.
+
+    Every transaction sleeps for `latency` seconds, like a USB-HID round trip, and
+    may fail with the adapter's NotAck or timeout errors at the configured rates.
+    A stalled transaction blocks for `stall_time`, as a wedged adapter would, and
+    a detached adapter fails every transaction with an OSError. Addresses without
+    a sensor are not acknowledged. Sensors behind `mux` answer while their channel
+    is selected.
+    """
+
+    def __init__(
+        self,
+        sensors: Sequence[SimulatedSensor] = (),
+        usbserial: str = "SIM0000",
+        latency: float = 0.002,
+        failure_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        stall_rate: float = 0.0,
+        stall_time: float = 5.0,
+        rng: Optional[random.Random] = None,
+        mux: Optional[TCA9548AModel] = None,
+    ):
+        self.sensors = {sensor.address: sensor for sensor in sensors}
+        self.mux = mux
+        if mux is not None:
+            self.sensors[mux.address] = mux
+        self.usbserial = usbserial
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.stall_rate = stall_rate
+        self.stall_time = stall_time
+        self.detached = False
+        self.rng = rng or random.Random()
+        self.transactions = 0
+        self._lock = threading.Lock()
+
+    def _transaction(self, addr: int) -> SimulatedSensor:
+        with self._lock:
+            self.transactions += 1
+            roll = self.rng.random()
+        if self.detached:
+            raise OSError("simulated adapter detached")
+        if roll < self.stall_rate:
+            time.sleep(self.stall_time)
+        elif self.latency:
+            time.sleep(self.latency)
+        if roll < self.stall_rate + self.timeout_rate:
+            raise EasyMCP2221.exceptions.TimeoutError("simulated I2C timeout")
+        sensor = self.sensors.get(addr)
+        if sensor is None and self.mux is not None:
+            sensor = self.mux.lookup(addr)
+        if sensor is None or roll < self.stall_rate + self.timeout_rate + self.failure_rate:
+            raise EasyMCP2221.exceptions.NotAckError("simulated I2C NotAck")
+        return sensor
+
+    def I2C_write(self, addr: int, data: Union[bytes, List[int]], kind: str = "regular", timeout_ms: int = 20):
+        self._transaction(addr).write(bytes(data))
+
+    def I2C_read(self, addr: int, size: int = 1, kind: str = "regular", timeout_ms: int = 20) -> bytes:
+        return self._transaction(addr).read(size)
+
+    def I2C_speed(self, speed: int = 100000):
+        pass
+
+
+class SimulatedPort:
+    """Entry returned by the simulated `comports`, with the fields discovery reads."""
+
+    def __init__(self, device: str, serial_number: str):
+        self.device = device
+        self.serial_number = serial_number
+        self.description = "MCP2221 USB-I2C/UART Combo (simulated)"
+        self.hwid = f"{MCP2221_HWID} SER={serial_number}"
+
+
+class SimulatedFleet:
+    """
+    A set of simulated adapters with one sensor each, cycling through `sensors`.
+
+    With `mux_channels` set, each adapter instead carries a TCA9548A with one
+    sensor on each of its first `mux_channels` channels.
+
+    `install` points discovery at the fleet's `comports` and `device` instead of
+    the serial port enumeration and `EasyMCP2221.Device`. `unplug` and `plug`
+    take an adapter off the bus and put it back; like USB, `devnum` counts only
+    the adapters currently plugged in.
+
+    Args:
+        count (int): Number of adapters.
+        sensors (Sequence[str]): Driver names assigned to adapters in turn.
+        open_latency (float): Seconds taken to open an adapter.
+        seed (int): Seed for readings and failure injection, for repeatable runs.
+        mux_channels (int): Sensors per adapter behind a TCA9548A, 0 for no mux.
+        **device_options: Latency and failure injection settings for every `SimulatedDevice`.
+    """
+
+    def __init__(
+        self,
+        count: int,
+        sensors: Sequence[str] = ("BME68x", "BME280", "AHT20", "PMSA003I"),
+        open_latency: float = 0.01,
+        seed: int = 0,
+        mux_channels: int = 0,
+        **device_options,
+    ):
+        self.open_latency = open_latency
+        self.unplugged: Set[int] = set()
+        self.ports: List[SimulatedPort] = []
+        self.devices: List[SimulatedDevice] = []
+        for index in range(count):
+            rng = random.Random(seed * 100003 + index)
+            serial_number = f"SIM{index:04d}"
+            self.ports.append(SimulatedPort(f"/dev/ttySIM{index}", serial_number))
+            if mux_channels:
+                mux = TCA9548AModel(
+                    {
+                        channel: [SENSOR_MODELS[sensors[(index * mux_channels + channel) % len(sensors)]](rng=rng)]
+                        for channel in range(mux_channels)
+                    }
+                )
+                self.devices.append(SimulatedDevice(usbserial=serial_number, rng=rng, mux=mux, **device_options))
+            else:
+                sensor = SENSOR_MODELS[sensors[index % len(sensors)]](rng=rng)
+                self.devices.append(SimulatedDevice([sensor], usbserial=serial_number, rng=rng, **device_options))
+
+    def comports(self) -> List[SimulatedPort]:
+        return [port for index, port in enumerate(self.ports) if index not in self.unplugged]
+
+    def unplug(self, index: int):
+        self.unplugged.add(index)
+        self.devices[index].detached = True
+
+    def plug(self, index: int):
+        self.unplugged.discard(index)
+        self.devices[index].detached = False
+
+    def device(
+        self, VID: int = 0x04D8, PID: int = 0x00DD, devnum: int = 0, usbserial: Optional[str] = None, **kwargs
+    ) -> SimulatedDevice:
+        if self.open_latency:
+            time.sleep(self.open_latency)
+        plugged = [device for index, device in enumerate(self.devices) if index not in self.unplugged]
+        if usbserial is not None:
+            plugged = [device for device in plugged if device.usbserial == usbserial]
+            devnum = 0
+        if devnum >= len(plugged):
+            raise RuntimeError("No device found with this VID/PID/serial")
+        device = plugged[devnum]
+        if device.detached:
+            raise OSError("simulated adapter detached")
+        return device
+
+    def install(self):
+        from piphi_network_official_i2c_library.lib.common import PiPhiMCP2221
+
+        PiPhiMCP2221.list_ports = self.comports
+        PiPhiMCP2221.device_factory = self.device
+
+
+def broker_unavailable() -> Exception:
+    import aiomqtt
+
+    return aiomqtt.MqttError("simulated broker unavailable")
+
+
+class SimulatedBroker:
+    """
+    In-process MQTT broker stand-in recording what the publisher delivers.
+
+    `client` has the signature of `aiomqtt.Client`, so it can be set as the
+    publisher's `client_factory`. While `available` is False, connecting and
+    publishing raise `aiomqtt.MqttError`.
+
+    Args:
+        latency (float): Seconds each publish takes to be acknowledged.
+        history (int): Number of delivered messages kept in `messages`.
+    """
+
+    def __init__(self, latency: float = 0.0, history: int = 100000):
+        self.latency = latency
+        self.available = True
+        self.delivered = 0
+        self.messages: Deque[Tuple[str, Union[str, bytes], bool, float]] = collections.deque(maxlen=history)
+        self.listeners: List[Callable[[str, Union[str, bytes], bool, float], None]] = []
+
+    def client(self, hostname: str = "localhost", port: int = 1883, **kwargs) -> "SimulatedClient":
+        return SimulatedClient(self)
+
+    def deliver(self, topic: str, payload: Union[str, bytes], retain: bool):
+        received = time.time()
+        self.delivered += 1
+        self.messages.append((topic, payload, retain, received))
+        for listener in self.listeners:
+            listener(topic, payload, retain, received)
+
+
+class SimulatedClient:
+    def __init__(self, broker: SimulatedBroker):
+        self.broker = broker
+
+    async def __aenter__(self) -> "SimulatedClient":
+        if not self.broker.available:
+            raise broker_unavailable()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def publish(self, topic: str, payload: Union[str, bytes] = None, qos: int = 0, retain: bool = False, **kwargs):
+        if self.broker.latency:
+            await asyncio.sleep(self.broker.latency)
+        if not self.broker.available:
+            raise broker_unavailable()
+        self.broker.deliver(topic, payload, retain)
+
+
+def install_from_env():
+    """
+    Installs a simulated fleet of SIMULATED_ADAPTERS adapters, for running the service without hardware.
+
+    SIMULATED_MUX_CHANNELS puts that many sensors behind a TCA9548A on each adapter,
+    SIMULATED_OPEN_LATENCY sets how long opening an adapter takes.
+    """
+    count = int(os.environ.get("SIMULATED_ADAPTERS", 0))
+    if count:
+        SimulatedFleet(
+            count,
+            open_latency=float(os.environ.get("SIMULATED_OPEN_LATENCY", 0.01)),
+            latency=float(os.environ.get("SIMULATED_LATENCY", 0.002)),
+            mux_channels=int(os.environ.get("SIMULATED_MUX_CHANNELS", 0)),
+        ).install()
@@ -0,0 +1,207 @@
+import logging
+import os
+import struct
+import zlib
+from typing import List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct("<IIHB")
+
+OFFSET_RECORD = struct.Struct("<QQ")
+
+FLAG_RETAIN = 0x01
+
+FLAG_BINARY = 0x02
+
+Record = Tuple[str, Union[str, bytes], bool]
+
+Position = Tuple[int, int]
+
+
+class SegmentLog:
+    """
+    Append-only telemetry spool made of size-bounded segment files.
+
+    Records are appended to the newest segment as `length, crc32, topic length,
+    flags` headers followed by the topic and payload. A torn or corrupt record at
+    the tail ends the readable log, so a crash mid-write loses at most that record.
+    The replay position is kept in an `offset` file replaced atomically after each
+    committed batch, and fully replayed segments are deleted.
+
+    Disk use is capped at `max_segments` segments of `segment_size` bytes. When the
+    cap is reached, the `drop_oldest` policy deletes the oldest segment and
+    `drop_newest` rejects new records until replay frees space.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = 4 * 1024 * 1024,
+        max_segments: int = 64,
+        policy: str = "drop_oldest",
+    ):
+        if policy not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"Unknown eviction policy {policy}")
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.policy = policy
+        self.evicted = 0
+        self.rejected = 0
+        os.makedirs(directory, exist_ok=True)
+        self.segments: List[int] = sorted(
+            int(name[:-4]) for name in os.listdir(directory) if name.endswith(".seg")
+        )
+        self.read_position: Position = self._load_offset()
+        self._writer = None
+        self._write_size = 0
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:020d}.seg")
+
+    def _load_offset(self) -> Position:
+        try:
+            with open(os.path.join(self.directory, "offset"), "rb") as f:
+                segment, position = OFFSET_RECORD.unpack(f.read(OFFSET_RECORD.size))
+        except (OSError, struct.error):
+            segment, position = (self.segments[0] if self.segments else 0), 0
+        if self.segments and segment < self.segments[0]:
+            segment, position = self.segments[0], 0
+        return segment, position
+
+    def _store_offset(self):
+        path = os.path.join(self.directory, "offset")
+        with open(path + ".tmp", "wb") as f:
+            f.write(OFFSET_RECORD.pack(*self.read_position))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _roll(self):
+        if self._writer is not None:
+            self._writer.close()
+        segment = self.segments[-1] + 1 if self.segments else self.read_position[0]
+        self.segments.append(segment)
+        self._writer = open(self._path(segment), "ab")
+        self._write_size = 0
+
+    def _evict_oldest(self):
+        oldest = self.segments.pop(0)
+        os.remove(self._path(oldest))
+        self.evicted += 1
+        if self.read_position[0] <= oldest:
+            self.read_position = (self.segments[0] if self.segments else oldest + 1, 0)
+            self._store_offset()
+
+    def pending(self) -> bool:
+        if not self.segments:
+            return False
+        segment, position = self.read_position
+        return segment < self.segments[-1] or position < os.path.getsize(self._path(segment))
+
+    def append(self, topic: str, payload: Union[str, bytes], retain: bool = False) -> bool:
+        """
+        Appends a record to the spool.
+
+        Args:
+            topic (str): The MQTT topic.
+            payload (Union[str, bytes]): The encoded message body.
+            retain (bool): The retain flag to replay the message with.
+
+        Returns:
+            bool: False if the record was rejected because the spool is full.
+        """
+        topic_bytes = topic.encode("utf-8")
+        flags = FLAG_RETAIN if retain else 0
+        if isinstance(payload, bytes):
+            flags |= FLAG_BINARY
+        else:
+            payload = payload.encode("utf-8")
+        body = topic_bytes + payload
+        record = RECORD_HEADER.pack(len(body), zlib.crc32(body), len(topic_bytes), flags) + body
+        if self._writer is None or self._write_size + len(record) > self.segment_size:
+            if len(self.segments) >= self.max_segments:
+                if self.policy == "drop_newest":
+                    self.rejected += 1
+                    return False
+                self._evict_oldest()
+            self._roll()
+        self._writer.write(record)
+        self._writer.flush()
+        self._write_size += len(record)
+        return True
+
+    def read_batch(self, limit: int) -> Tuple[List[Record], Position]:
+        """
+        Reads up to `limit` records from the replay position without consuming them.
+
+        Args:
+            limit (int): Maximum number of records to return.
+
+        Returns:
+            Tuple[List[Record], Position]: The records and the position to `commit` once they are delivered.
+        """
+        records: List[Record] = []
+        segment, position = self.read_position
+        while len(records) < limit and segment in self.segments:
+            with open(self._path(segment), "rb") as f:
+                f.seek(position)
+                while len(records) < limit:
+                    header = f.read(RECORD_HEADER.size)
+                    if len(header) < RECORD_HEADER.size:
+                        break
+                    length, checksum, topic_length, flags = RECORD_HEADER.unpack(header)
+                    body = f.read(length)
+                    if len(body) < length or zlib.crc32(body) != checksum:
+                        logger.warning("discarding corrupt spool tail in segment %s", segment)
+                        break
+                    payload = body[topic_length:]
+                    records.append(
+                        (
+                            body[:topic_length].decode("utf-8"),
+                            payload if flags & FLAG_BINARY else payload.decode("utf-8"),
+                            bool(flags & FLAG_RETAIN),
+                        )
+                    )
+                    position = f.tell()
+                else:
+                    break
+            if segment == self.segments[-1]:
+                break
+            segment, position = self.segments[self.segments.index(segment) + 1], 0
+        return records, (segment, position)
+
+    def commit(self, position: Position):
+        """Persists the replay position and deletes segments that were fully replayed."""
+        self.read_position = position
+        while len(self.segments) > 1 and self.segments[0] < position[0]:
+            os.remove(self._path(self.segments.pop(0)))
+        self._store_offset()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def open_spool() -> Optional[SegmentLog]:
+    """
+    Opens the spool in SPOOL_DIR, or under DATA_DIR (the `/app/data` volume by default).
+
+    Returns:
+        Optional[SegmentLog]: The spool, or None if disabled or the directory is not writable.
+    """
+    if os.environ.get("SPOOL_ENABLED", "1") == "0":
+        return None
+    directory = os.environ.get("SPOOL_DIR") or os.path.join(os.environ.get("DATA_DIR", "/app/data"), "spool")
+    try:
+        return SegmentLog(
+            directory,
+            segment_size=int(os.environ.get("SPOOL_SEGMENT_BYTES", 4 * 1024 * 1024)),
+            max_segments=int(os.environ.get("SPOOL_MAX_SEGMENTS", 64)),
+            policy=os.environ.get("SPOOL_EVICTION", "drop_oldest"),
+        )
+    except OSError as error:
+        logger.warning("telemetry spool disabled, %s is not writable (%s)", directory, error)
+        return None
@@ -0,0 +1,182 @@
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import EasyMCP2221
+
+from piphi_network_official_i2c_library.lib.adapter_io import AdapterIO, BusIO
+from piphi_network_official_i2c_library.lib.drivers import I2C_ERRORS
+from piphi_network_official_i2c_library.lib.metrics import mux_switches
+
+MUX_CHANNELS = 8
+
+UNSELECTED = -1
+
+
+def mux_addresses() -> Tuple[int, ...]:
+    """
+    Returns the addresses probed for a TCA9548A, from MUX_ADDRESSES.
+
+    Only 0x70 is probed by default: 0x76 and 0x77 are also valid mux addresses but
+    belong to the BME sensors on most boards, so they have to be opted into.
+    """
+    value = os.environ.get("MUX_ADDRESSES", "0x70")
+    return tuple(int(item, 0) for item in value.split(",") if item.strip())
+
+
+class SensorNode:
+    """One sensor on an adapter, either on the adapter's own bus or behind a mux channel."""
+
+    def __init__(self, driver: str, address: int, channel: Optional[int], probe: bytes):
+        self.driver = driver
+        self.address = address
+        self.channel = channel
+        self.probe = probe
+        self.active = False
+
+    @property
+    def sensor_id(self) -> str:
+        if self.channel is None:
+            return f"{self.address:#04x}"
+        return f"ch{self.channel}:{self.address:#04x}"
+
+    def describe(self) -> dict:
+        return {
+            "sensor_id": self.sensor_id,
+            "sensor": self.driver,
+            "address": self.address,
+            "channel": self.channel,
+        }
+
+
+class AdapterTopology:
+    """
+    Everything found on one adapter: the MCP2221, an optional TCA9548A mux and its sensors.
+
+    Sensors on the adapter's own bus answer whatever channel the mux has selected.
+    Sensors behind the mux are reached through `channel_io`, which selects their
+    channel before each transaction. The selection runs as part of the same work
+    item on the adapter's single I/O thread, which is the adapter's arbitration
+    lock: no other transaction can move the mux between the select and the call.
+    The mux is only written when the channel actually changes, and the scheduler
+    orders each adapter's due polls by channel, so a slot switches at most once
+    per channel.
+    """
+
+    def __init__(
+        self,
+        usbpath: str,
+        mcp: EasyMCP2221.Device,
+        bus: EasyMCP2221.SMBus,
+        io: AdapterIO,
+        devnum: int,
+        serial: Optional[str] = None,
+    ):
+        self.usbpath = usbpath
+        self.mcp = mcp
+        self.bus = bus
+        self.io = io
+        self.devnum = devnum
+        self.serial = serial
+        self.mux_address: Optional[int] = None
+        self.selected = UNSELECTED
+        self.sensors: Dict[str, SensorNode] = {}
+        self.switches = mux_switches.labels(usbpath)
+
+    def rebind(self, mcp: EasyMCP2221.Device, bus: EasyMCP2221.SMBus):
+        """Switches to a freshly opened handle of the same adapter."""
+        self.mcp = mcp
+        self.bus = bus
+        self.selected = UNSELECTED
+
+    @property
+    def active(self) -> bool:
+        return any(node.active for node in self.sensors.values())
+
+    def add(self, driver: str, address: int, channel: Optional[int], probe: bytes) -> SensorNode:
+        node = SensorNode(driver, address, channel, probe)
+        self.sensors[node.sensor_id] = node
+        return node
+
+    def find(self, sensor_id: Optional[str] = None) -> Optional[SensorNode]:
+        """
+        Looks up a sensor by id, or returns the first one found when no id is given.
+
+        Args:
+            sensor_id (Optional[str]): The id reported by discovery, such as `0x76` or `ch2:0x38`.
+
+        Returns:
+            Optional[SensorNode]: The sensor, or None if there is no such sensor.
+        """
+        if sensor_id is None:
+            return next(iter(self.sensors.values()), None)
+        return self.sensors.get(sensor_id)
+
+    def describe(self) -> List[dict]:
+        return [node.describe() for node in self.sensors.values()]
+
+    def on_channel(self, channel: Optional[int], fn: Callable[..., Any], /, *args, **kwargs) -> Any:
+        """Selects `channel` on the mux if needed, then runs `fn`. Must run on the adapter's I/O thread."""
+        if channel is not None and channel != self.selected:
+            self.selected = UNSELECTED
+            self.mcp.I2C_write(self.mux_address, [1 << channel])
+            self.selected = channel
+            self.switches.inc()
+        return fn(*args, **kwargs)
+
+    def deselect(self):
+        """Disconnects every mux channel. Must run on the adapter's I/O thread."""
+        self.selected = UNSELECTED
+        self.mcp.I2C_write(self.mux_address, [0x00])
+
+    def channel_io(self, channel: Optional[int]) -> BusIO:
+        if channel is None or self.mux_address is None:
+            return self.io
+        return ChannelIO(self, channel)
+
+    def io_for(self, node: SensorNode) -> BusIO:
+        return self.channel_io(node.channel)
+
+
+class ChannelIO(BusIO):
+    """
+    The I/O worker of an adapter as seen from one mux channel.
+
+    Drivers use it exactly like `AdapterIO`; every call goes to the adapter's
+    worker, and so through its timeout and metrics, with the channel selection
+    in front of it.
+    """
+
+    def __init__(self, topology: AdapterTopology, channel: int):
+        self.topology = topology
+        self.channel = channel
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        return await self.topology.io.run(self.topology.on_channel, self.channel, fn, *args, timeout=timeout, **kwargs)
+
+
+async def detect_mux(io: AdapterIO, mcp: EasyMCP2221.Device) -> Optional[int]:
+    """
+    Looks for a TCA9548A on the adapter's bus.
+
+    The mux has a single control register that reads back whatever was written to
+    it, so a device that echoes two different channel masks is taken to be a mux.
+    It is left with every channel disconnected.
+
+    Args:
+        io (AdapterIO): The I/O worker of the adapter.
+        mcp (EasyMCP2221.Device): The adapter.
+
+    Returns:
+        Optional[int]: The mux address, or None if there is no mux.
+    """
+    for address in mux_addresses():
+        try:
+            for mask in (0x05, 0x00):
+                await io.i2c_write(mcp, address, [mask])
+                if bytes(await io.i2c_read(mcp, address, 1))[0] != mask:
+                    break
+            else:
+                return address
+        except I2C_ERRORS:
+            continue
+    return None
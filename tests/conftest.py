@@ -0,0 +1,59 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from piphi_network_official_i2c_library.lib.breaker import CircuitBreaker
+from piphi_network_official_i2c_library.lib.common import PiPhiMCP2221
+from piphi_network_official_i2c_library.lib.history import history
+from piphi_network_official_i2c_library.lib.publisher import publisher
+from piphi_network_official_i2c_library.lib.simulator import SimulatedBroker, SimulatedFleet
+
+
+def poll_until(predicate, timeout=5.0, interval=0.02):
+    """Polls `predicate` until it returns something truthy, failing the test after `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = predicate()
+        if result:
+            return result
+        if time.monotonic() > deadline:
+            pytest.fail(f"condition not met within {timeout}s")
+        time.sleep(interval)
+
+
+@pytest.fixture
+def wait_for():
+    return poll_until
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = SimulatedBroker()
+    monkeypatch.setattr(publisher, "client_factory", broker.client)
+    return broker
+
+
+@pytest.fixture
+def fleet(monkeypatch):
+    fleet = SimulatedFleet(3, sensors=("BME280",), latency=0.001)
+    monkeypatch.setattr(PiPhiMCP2221, "list_ports", fleet.comports)
+    monkeypatch.setattr(PiPhiMCP2221, "device_factory", fleet.device)
+    return fleet
+
+
+@pytest.fixture
+def client(fleet, broker, monkeypatch):
+    """The app running its lifespan against `fleet` and `broker`, with the spool and history off."""
+    from piphi_network_official_i2c_library.app import app
+
+    monkeypatch.setenv("SPOOL_ENABLED", "0")
+    monkeypatch.delenv("SIMULATED_ADAPTERS", raising=False)
+    monkeypatch.setattr(history, "enabled", False)
+    monkeypatch.setattr(PiPhiMCP2221, "watch_interval", 0.1)
+    monkeypatch.setattr(CircuitBreaker, "failure_threshold", 2)
+    monkeypatch.setattr(CircuitBreaker, "backoff_min", 0.1)
+    monkeypatch.setattr(CircuitBreaker, "backoff_max", 0.2)
+    with TestClient(app) as client:
+        poll_until(lambda: client.get("/health/ready").status_code == 200)
+        yield client
@@ -0,0 +1,69 @@
+import asyncio
+import random
+
+import pytest
+
+from piphi_network_official_i2c_library.lib.adapter_io import BusIO
+from piphi_network_official_i2c_library.lib.aht20 import AHT20Engine, crc8
+from piphi_network_official_i2c_library.lib.drivers import AHT20Driver
+from piphi_network_official_i2c_library.lib.simulator import AHT20Model, SimulatedDevice
+
+
+class InlineIO(BusIO):
+    """Runs bus calls on the event loop thread, which is enough for the latency-free simulator."""
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        return fn(*args, **kwargs)
+
+
+def sensors(count, conversion_time):
+    models = [AHT20Model(rng=random.Random(index), conversion_time=conversion_time) for index in range(count)]
+    return models, [SimulatedDevice([model], latency=0, rng=random.Random(0)) for model in models]
+
+
+def measure_all(engine, devices):
+    async def run():
+        io = InlineIO()
+        return await asyncio.gather(*(engine.measure(io, device, 0x38) for device in devices))
+
+    return asyncio.run(run())
+
+
+def test_crc_matches_the_datasheet_polynomial():
+    assert crc8(b"\xBE\xEF") == 0x92
+
+
+def test_concurrent_requests_share_one_conversion_and_retry_while_busy():
+    engine = AHT20Engine(conversion_time=0.02, busy_retries=10, busy_delay=0.01, check_crc=True)
+    _, devices = sensors(3, conversion_time=0.05)
+
+    frames = measure_all(engine, devices)
+
+    assert all(frame is not None and frame[0] & 0x80 == 0 for frame in frames)
+    assert all(device.transactions >= 3 for device in devices)
+    metrics = [AHT20Driver().decode(frame) for frame in frames]
+    assert all(metric["temperature"] == pytest.approx(21.5, abs=1) for metric in metrics)
+    assert all(metric["humidity"] == pytest.approx(41.0, abs=3) for metric in metrics)
+    assert (engine.busy_timeouts, engine.crc_errors) == (0, 0)
+
+
+def test_sensor_that_stays_busy_is_given_up_on():
+    engine = AHT20Engine(conversion_time=0, busy_retries=2, busy_delay=0.001)
+    _, devices = sensors(1, conversion_time=10)
+
+    assert measure_all(engine, devices) == [None]
+    assert engine.busy_timeouts == 1
+    assert devices[0].transactions == 4
+
+
+def test_frame_failing_the_crc_is_rejected_unless_checking_is_off():
+    models, devices = sensors(1, conversion_time=0)
+    read = models[0].read
+    models[0].read = lambda size: read(size)[:6] + bytes([read(size)[6] ^ 0xFF])
+
+    checked = AHT20Engine(conversion_time=0, check_crc=True)
+    assert measure_all(checked, devices) == [None]
+    assert checked.crc_errors == 1
+
+    unchecked = AHT20Engine(conversion_time=0, check_crc=False)
+    assert measure_all(unchecked, devices)[0] is not None
@@ -0,0 +1,84 @@
+import asyncio
+import math
+import random
+
+import bme680
+import EasyMCP2221
+
+from piphi_network_official_i2c_library.lib.bme68x import (
+    FIELD0,
+    FIELD_LENGTH,
+    BME68xChip,
+    BME68xEngine,
+    BME68xRequest,
+    compensate,
+    parse_field,
+)
+from piphi_network_official_i2c_library.lib.drivers import BME68xDriver
+from piphi_network_official_i2c_library.lib.simulator import BME680Model, SimulatedDevice
+
+
+def open_chip(seed, variant=0, temp_offset=0.0, **calibration):
+    model = BME680Model(rng=random.Random(seed), tph_time=0)
+    model.registers[0xF0] = variant
+    bus = EasyMCP2221.SMBus(mcp=SimulatedDevice([model], rng=random.Random(seed)))
+    sensor = bme680.BME680(i2c_addr=model.address, i2c_device=bus)
+    BME68xDriver.configure(sensor)
+    sensor.set_temp_offset(temp_offset)
+    for name, value in calibration.items():
+        setattr(sensor.calibration_data, name, value)
+    return model, sensor, BME68xChip(sensor, bus, model.address)
+
+
+def raw_sample(model, chip):
+    model.measure()
+    return parse_field(model.registers[FIELD0:FIELD0 + FIELD_LENGTH], chip.calibration.variant)
+
+
+def vendor_metrics(sensor, raw):
+    adc_temp, adc_pres, adc_hum, adc_gas, gas_range = raw
+    temperature = sensor._calc_temperature(adc_temp) / 100.0
+    pressure = sensor._calc_pressure(adc_pres) / 100.0
+    humidity = sensor._calc_humidity(adc_hum) / 1000.0
+    x = math.log(humidity / 100) + (17.625 * temperature) / (243.04 + temperature)
+    return {
+        "temperature": temperature,
+        "pressure": pressure,
+        "humidity": humidity,
+        "gas": sensor._calc_gas_resistance(adc_gas, gas_range),
+        "dew_pt": (243.04 * x) / (17.625 - x),
+    }
+
+
+def test_batch_across_chips_matches_vendor_compensation():
+    chips = [
+        open_chip(0),
+        open_chip(1, par_t2=26000, par_p1=36000, par_h2=1000, range_sw_err=3),
+        open_chip(2, variant=1, temp_offset=1.5, par_t3=2, par_p9=-3000, par_h1=700),
+    ]
+    batch = []
+    for _ in range(8):
+        for model, sensor, chip in chips:
+            batch.append((sensor, chip, raw_sample(model, chip)))
+
+    columns = compensate([(chip.calibration, raw) for _, chip, raw in batch])
+
+    for index, (sensor, _, raw) in enumerate(batch):
+        for metric, value in vendor_metrics(sensor, raw).items():
+            assert math.isclose(columns[metric][index], value, rel_tol=1e-12), (metric, index)
+
+
+def test_engine_fails_only_the_sample_that_cannot_be_compensated():
+    good_model, good_sensor, good = open_chip(0)
+    bad_model, _, bad = open_chip(1, par_p1=0)
+    good_raw, bad_raw = raw_sample(good_model, good), raw_sample(bad_model, bad)
+
+    async def run():
+        requests = [BME68xRequest(None, good), BME68xRequest(None, bad)]
+        BME68xEngine()._compensate([(requests[0], good_raw), (requests[1], bad_raw)])
+        return await asyncio.gather(*(request.future for request in requests), return_exceptions=True)
+
+    metrics, error = asyncio.run(run())
+    assert isinstance(error, ZeroDivisionError)
+    for metric, value in vendor_metrics(good_sensor, good_raw).items():
+        assert math.isclose(metrics[metric], value, rel_tol=1e-12), metric
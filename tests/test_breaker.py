@@ -0,0 +1,107 @@
+import asyncio
+import types
+
+import pytest
+
+from piphi_network_official_i2c_library.contract.config import take_sample
+from piphi_network_official_i2c_library.lib.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from piphi_network_official_i2c_library.lib.common import PiPhiMCP2221
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    monkeypatch.setattr(CircuitBreaker, "failure_threshold", 3)
+    monkeypatch.setattr(CircuitBreaker, "backoff_min", 2.0)
+    monkeypatch.setattr(CircuitBreaker, "backoff_max", 300.0)
+    monkeypatch.setattr(CircuitBreaker, "reopen_after", 2)
+    return CircuitBreaker("/dev/ttyTEST")
+
+
+def test_opens_after_consecutive_failures_and_waits_out_the_backoff(breaker):
+    assert not breaker.record_failure(OSError("nack"), now=100)
+    assert not breaker.record_failure(OSError("nack"), now=100)
+    assert breaker.allow(now=100)
+    assert breaker.record_failure(OSError("nack"), now=100)
+    assert breaker.state == OPEN
+    assert 102.0 <= breaker.retry_at <= 104.0
+    assert not breaker.allow(now=101.9)
+
+
+def test_half_open_trial_closes_on_success(breaker):
+    for _ in range(3):
+        breaker.record_failure(OSError("nack"), now=100)
+    assert breaker.allow(now=breaker.retry_at)
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow(now=breaker.retry_at)
+    breaker.record_success()
+    assert (breaker.state, breaker.failures, breaker.consecutive_trips) == (CLOSED, 0, 0)
+
+
+def test_failed_trial_reopens_with_doubled_backoff_and_asks_for_reopen(breaker):
+    for _ in range(3):
+        breaker.record_failure(OSError("nack"), now=100)
+    retry_at = breaker.retry_at
+    assert breaker.allow(now=retry_at)
+    assert not breaker.needs_reopen
+    assert breaker.record_failure(OSError("nack"), now=retry_at)
+    assert breaker.state == OPEN
+    assert retry_at + 4.0 <= breaker.retry_at <= retry_at + 8.0
+    assert breaker.allow(now=breaker.retry_at)
+    assert breaker.needs_reopen
+    assert breaker.trips == 2
+
+
+def test_unplugged_adapter_trips_and_recovers_when_plugged_back(client, fleet, wait_for):
+    client.post("/config", json={"id": "d0", "usbpath": "/dev/ttySIM0", "secret": "s", "interval": 0.05})
+    wait_for(lambda: client.get("/devices/d0/latest").status_code == 200)
+
+    def state():
+        return client.get("/health/adapters").json()["adapters"].get("/dev/ttySIM0", {}).get("state")
+
+    fleet.unplug(0)
+    wait_for(lambda: state() in (OPEN, HALF_OPEN))
+    fleet.plug(0)
+    wait_for(lambda: state() == CLOSED)
+    stale = client.get("/devices/d0/latest").json()["timestamp"]
+    wait_for(lambda: client.get("/devices/d0/latest").json()["timestamp"] != stale)
+    assert client.get("/health/adapters").json()["adapters"]["/dev/ttySIM0"]["trips"] >= 1
+
+
+def due_for_a_trial(breaker):
+    for _ in range(3):
+        breaker.record_failure(OSError("nack"), now=100)
+    breaker.retry_at = 0
+
+
+async def cancel_soon(coroutine):
+    task = asyncio.create_task(coroutine)
+    await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def hang(*args, **kwargs):
+    await asyncio.sleep(10)
+
+
+def test_cancelled_trial_sample_opens_the_breaker_again(breaker, monkeypatch):
+    monkeypatch.setitem(CircuitBreaker.breakers, breaker.usbpath, breaker)
+    due_for_a_trial(breaker)
+    driver = types.SimpleNamespace(sample=hang)
+    sensor_dict = {"usbpath": breaker.usbpath, "driver": driver, "io": None, "handle": None}
+
+    asyncio.run(cancel_soon(take_sample(sensor_dict)))
+
+    assert (breaker.state, breaker.trips) == (OPEN, 2)
+
+
+def test_probe_cut_off_by_the_deadline_opens_the_breaker_again(breaker, monkeypatch):
+    monkeypatch.setitem(CircuitBreaker.breakers, breaker.usbpath, breaker)
+    monkeypatch.setattr(PiPhiMCP2221, "probe_adapter", hang)
+    due_for_a_trial(breaker)
+    assert breaker.allow()
+
+    asyncio.run(cancel_soon(PiPhiMCP2221().timed_probe(0, {"usbpath": breaker.usbpath}, timeout=10)))
+
+    assert breaker.state == OPEN
+    assert PiPhiMCP2221.probe_timings.pop(breaker.usbpath)["status"] == "deadline"
@@ -0,0 +1,74 @@
+import json
+
+from piphi_network_official_i2c_library.contract.config import sign_payload
+from piphi_network_official_i2c_library.lib.encoding import SCHEMA_TOPIC
+
+
+def config(device_id, usbpath, interval=0.2):
+    return {"id": device_id, "usbpath": usbpath, "secret": "s", "container_id": "c", "interval": interval}
+
+
+def test_batch_reports_duplicates_and_unknown_adapters(client):
+    response = client.post(
+        "/config/batch",
+        json=[
+            config("d0", "/dev/ttySIM0"),
+            config("d0", "/dev/ttySIM1"),
+            config("d1", "/dev/ttyMISSING"),
+            config("d2", "/dev/ttySIM1"),
+        ],
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [(result["id"], result["status"], result.get("status_code")) for result in body["results"]] == [
+        ("d0", "created", None),
+        ("d0", "error", 409),
+        ("d1", "error", 404),
+        ("d2", "created", None),
+    ]
+    assert (body["applied"], body["failed"]) == (2, 2)
+    assert set(client.get("/health/scheduler").json()["per_job"]) == {"d0", "d2"}
+
+
+def test_reapplying_a_config_updates_the_poll_in_place(client):
+    assert client.post("/config", json=config("d0", "/dev/ttySIM0")).json()["status"] == "created"
+    assert client.post("/config", json=config("d0", "/dev/ttySIM0", interval=0.5)).json()["status"] == "updated"
+    assert client.get("/health/scheduler").json()["per_job"]["d0"]["interval"] == 0.5
+
+
+def test_two_devices_cannot_claim_the_same_sensor(client):
+    body = client.post("/config/batch", json=[config("a", "/dev/ttySIM0"), config("b", "/dev/ttySIM0")]).json()
+
+    assert sorted(result.get("status_code", 200) for result in body["results"]) == [200, 404]
+    assert len(client.get("/health/scheduler").json()["per_job"]) == 1
+
+
+def test_malformed_settings_are_rejected_and_release_the_sensor(client):
+    response = client.post("/config", json={**config("d0", "/dev/ttySIM0"), "deadband": "oops"})
+    assert response.status_code == 400
+
+    assert client.post("/config", json=config("d0", "/dev/ttySIM0")).json()["status"] == "created"
+    response = client.post("/config", json={**config("d0", "/dev/ttySIM0"), "adaptive": {"factor": "fast"}})
+    assert response.status_code == 400
+    assert client.get("/health/scheduler").json()["per_job"]["d0"]["interval"] == 0.2
+
+
+def test_non_positive_or_non_numeric_rates_are_rejected(client):
+    for settings in ({"interval": -5}, {"interval": 0}, {"interval": "soon"}, {"sample_rate": -1}, {"interval": "nan"}):
+        response = client.post("/config", json={**config("d0", "/dev/ttySIM0"), **settings})
+        assert response.status_code == 422, settings
+    response = client.post("/config", json={**config("d0", "/dev/ttySIM0"), "adaptive": {"min_interval": 0}})
+    assert response.status_code == 400
+    assert client.get("/health/scheduler").json()["per_job"] == {}
+
+
+def test_in_place_update_republishes_the_compact_schema_with_the_new_signature(client, broker, wait_for):
+    def schemas():
+        return [json.loads(payload) for topic, payload, _, _ in broker.messages if topic.startswith(SCHEMA_TOPIC)]
+
+    for interval in (0.2, 0.5):
+        payload = {**config("d0", "/dev/ttySIM0", interval=interval), "encoding": "compact"}
+        client.post("/config", json=payload)
+        expected = sign_payload(payload, "s")
+        wait_for(lambda: any(schema["x-piphi-signature"] == expected for schema in schemas()))
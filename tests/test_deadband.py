@@ -0,0 +1,67 @@
+from piphi_network_official_i2c_library.lib.deadband import AdaptiveInterval, Deadband, DeadbandRule
+
+
+def test_percent_rule_ignores_unchanged_zero_baseline():
+    rule = DeadbandRule(percent=1.0)
+    assert not rule.exceeded(0, 0)
+    assert rule.exceeded(0, 1)
+
+
+def test_zero_samples_are_suppressed_until_heartbeat():
+    deadband = Deadband(default=DeadbandRule(percent=2.0), heartbeat=60)
+    published = [deadband.should_publish({"particles_03um": 0}, now) for now in range(20)]
+    assert published == [True] + [False] * 19
+    assert deadband.suppressed == 19
+    assert deadband.should_publish({"particles_03um": 0}, 60)
+
+
+def test_adaptive_interval_backs_off_on_zero_baseline():
+    deadband = Deadband(default=DeadbandRule(percent=1.0), heartbeat=0)
+    adaptive = AdaptiveInterval(base=1.0, minimum=1.0, maximum=8.0, factor=2.0, stable_samples=3)
+    deadband.should_publish({"pm25_standard": 0}, 0)
+    intervals = [adaptive.next(deadband.changed({"pm25_standard": 0})) for _ in range(9)]
+    assert intervals[-1] == 8.0
+
+
+def test_absolute_rule_compares_against_last_published_value():
+    deadband = Deadband(rules={"temperature": DeadbandRule(absolute=0.5)}, heartbeat=3600)
+    drift = [20.0, 20.2, 20.4, 20.6, 20.7, 21.0, 21.2]
+    published = [deadband.should_publish({"temperature": value}, now) for now, value in enumerate(drift)]
+    assert published == [True, False, False, True, False, False, True]
+
+
+def test_metrics_without_a_rule_never_trigger_a_publish():
+    deadband = Deadband.from_config({"metrics": {"pm25_standard": {"absolute": 5}}, "heartbeat": 3600})
+    assert deadband.should_publish({"pm25_standard": 10, "particles_03um": 100}, 0)
+    assert not deadband.should_publish({"pm25_standard": 12, "particles_03um": 900}, 1)
+    assert deadband.should_publish({"pm25_standard": 15, "particles_03um": 900}, 2)
+
+
+def test_adaptive_interval_snaps_back_to_minimum_on_change():
+    adaptive = AdaptiveInterval.from_config({"min_interval": 2, "max_interval": 16, "stable_samples": 2}, base=4)
+    intervals = [adaptive.next(changed) for changed in (False, False, False, False, False, False, True, False)]
+    assert intervals == [4, 8, 8, 16, 16, 16, 2, 2]
+
+
+def test_simulated_sensor_is_suppressed_and_polled_less_often(client, broker, wait_for):
+    response = client.post(
+        "/config",
+        json={
+            "id": "d0",
+            "usbpath": "/dev/ttySIM0",
+            "secret": "s",
+            "interval": 0.05,
+            "deadband": {"absolute": 1e9, "heartbeat": 3600},
+            "adaptive": {"min_interval": 0.05, "max_interval": 0.2, "stable_samples": 1},
+        },
+    )
+    assert response.status_code == 200
+
+    def job():
+        return client.get("/health/scheduler").json()["per_job"]["d0"]
+
+    wait_for(lambda: job()["interval"] == 0.2)
+    delivered, runs = broker.delivered, job()["runs"]
+    assert delivered > 0
+    wait_for(lambda: job()["runs"] >= runs + 2)
+    assert broker.delivered == delivered
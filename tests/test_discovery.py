@@ -0,0 +1,34 @@
+import asyncio
+
+from piphi_network_official_i2c_library.lib.common import PiPhiMCP2221
+
+
+def test_probes_missing_the_deadline_are_cancelled_and_awaited(monkeypatch):
+    stopped = []
+
+    async def probe_adapter(self, index, value):
+        if value["usbpath"] == "/dev/ttySLOW":
+            try:
+                await asyncio.sleep(10)
+            finally:
+                stopped.append(value["usbpath"])
+        value["sensor"] = "BME280"
+        return value
+
+    monkeypatch.setattr(PiPhiMCP2221, "probe_adapter", probe_adapter)
+    monkeypatch.setattr(PiPhiMCP2221, "all_mcp2221s_dict", [{"usbpath": "/dev/ttyFAST"}, {"usbpath": "/dev/ttySLOW"}])
+    monkeypatch.setattr(PiPhiMCP2221, "probe_timings", {})
+
+    async def discover():
+        results = await PiPhiMCP2221().build_discovery_results(deadline=0.05, adapter_timeout=5)
+        return results, asyncio.all_tasks() - {asyncio.current_task()}, dict(PiPhiMCP2221.probe_timings)
+
+    try:
+        results, leftover, timings = asyncio.run(discover())
+    finally:
+        for usbpath in ("/dev/ttyFAST", "/dev/ttySLOW"):
+            PiPhiMCP2221.forget_adapter(usbpath)
+
+    assert [value["usbpath"] for value in results] == ["/dev/ttyFAST"]
+    assert (stopped, leftover) == (["/dev/ttySLOW"], set())
+    assert timings["/dev/ttySLOW"]["status"] == "deadline"
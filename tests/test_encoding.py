@@ -0,0 +1,34 @@
+import json
+
+from piphi_network_official_i2c_library.contract import config
+from piphi_network_official_i2c_library.lib.encoding import COMPACT_TOPIC, CompactEncoder, decode_compact
+
+STATIC = {"device_id": "d0", "units": {"temperature": "C", "humidity": "%"}}
+
+
+def test_compact_message_round_trips_through_its_schema_document():
+    encoder = CompactEncoder(STATIC)
+    metrics = {"temperature": 21.5, "humidity": 40.25}
+    schema, unpublished = encoder.schema_for(metrics)
+    document = json.loads(json.dumps(schema.document))
+
+    decoded = decode_compact(encoder.encode(schema, metrics, 1_700_000_000.5), document)
+
+    assert unpublished
+    assert document["device_id"] == "d0" and document["metrics"] == ["temperature", "humidity"]
+    assert decoded == {"timestamp": 1_700_000_000.5, "metrics": metrics}
+    assert decode_compact(encoder.encode(schema, metrics, 0), dict(document, schema_id=0)) is None
+
+
+def test_schema_is_published_again_on_every_new_connection(monkeypatch):
+    sent = []
+    monkeypatch.setattr(config.publisher, "publish", lambda topic, payload, retain=False: sent.append(topic))
+    monkeypatch.setattr(config.publisher, "connections", 1)
+    encoder = CompactEncoder(STATIC)
+    schema, _ = encoder.schema_for({"temperature": 0.0})
+
+    for connection in (1, 1, 2, 2):
+        config.publisher.connections = connection
+        config.publish_compact(encoder, {"temperature": 20.0})
+
+    assert sent == [schema.topic, COMPACT_TOPIC, COMPACT_TOPIC, schema.topic, COMPACT_TOPIC, COMPACT_TOPIC]
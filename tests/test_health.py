@@ -0,0 +1,51 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from piphi_network_official_i2c_library.lib.common import PiPhiMCP2221
+from piphi_network_official_i2c_library.lib.history import history
+
+
+@pytest.fixture
+def app(fleet, broker, monkeypatch):
+    from piphi_network_official_i2c_library.app import app
+
+    monkeypatch.setenv("SPOOL_ENABLED", "0")
+    monkeypatch.delenv("SIMULATED_ADAPTERS", raising=False)
+    monkeypatch.setattr(history, "enabled", False)
+    monkeypatch.setattr(PiPhiMCP2221, "watch_interval", 0.1)
+    return app
+
+
+def test_ready_only_after_the_first_discovery_pass(app, fleet, wait_for):
+    fleet.open_latency = 0.5
+
+    with TestClient(app) as client:
+        health = client.get("/health")
+        ready = client.get("/health/ready")
+        assert health.status_code == 200
+        assert health.json()["ready"] is False
+        assert health.json()["discovery"] in ("pending", "running")
+        assert ready.status_code == 503
+
+        wait_for(lambda: client.get("/health/ready").status_code == 200)
+        assert client.get("/health").json() == {"status": "ok", "ready": True, "discovery": "ready"}
+        assert len(client.get("/discovery").json()["devices"]) == 3
+
+
+def test_failed_first_pass_is_made_good_by_the_watcher(app, fleet, monkeypatch, wait_for):
+    calls = []
+
+    def comports():
+        calls.append(None)
+        if len(calls) == 1:
+            raise OSError("serial enumeration failed")
+        return fleet.comports()
+
+    monkeypatch.setattr(PiPhiMCP2221, "list_ports", comports)
+    monkeypatch.setattr(PiPhiMCP2221, "watch_interval", 0.5)
+
+    with TestClient(app) as client:
+        wait_for(lambda: client.get("/health").json()["discovery"] == "failed")
+        assert client.get("/health/ready").status_code == 503
+        wait_for(lambda: client.get("/health/ready").status_code == 200)
+        assert client.get("/health").json()["discovery"] == "ready"
@@ -0,0 +1,82 @@
+import pytest
+
+from piphi_network_official_i2c_library.lib.history import HistoryStore
+
+START = 1_700_000_000 // 3600 * 3600
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.delenv("HISTORY_ENABLED", raising=False)
+    store = HistoryStore(str(tmp_path), {"1m": 1, "1h": 30})
+    store.open("sensor-1", ["temperature", "humidity"])
+    yield store
+    store.close_all()
+
+
+def test_samples_roll_up_into_minute_buckets(store):
+    for second, temperature in ((0, 20.0), (20, 22.0), (40, 24.0), (60, 30.0)):
+        store.record("sensor-1", {"temperature": temperature, "humidity": 50.0}, START + second)
+
+    result = store.query("sensor-1", START, START + 3599, None, ["temperature"], START + 120)
+
+    assert (result["tier"], result["resolution"]) == ("1m", 60)
+    buckets = result["buckets"]
+    assert buckets["time"] == [START, START + 60]
+    assert buckets["temperature"] == {"min": [20.0, 30.0], "max": [24.0, 30.0], "mean": [22.0, 30.0], "count": [3, 1]}
+    assert "humidity" not in buckets
+
+
+def test_range_query_excludes_buckets_outside_the_range(store):
+    for minute in range(10):
+        store.record("sensor-1", {"temperature": float(minute)}, START + minute * 60)
+
+    buckets = store.query("sensor-1", START + 180, START + 360, None, None, START + 600)["buckets"]
+
+    assert buckets["time"] == [START + minute * 60 for minute in range(3, 7)]
+    assert buckets["temperature"]["mean"] == [3.0, 4.0, 5.0, 6.0]
+    assert buckets["humidity"]["count"] == [0, 0, 0, 0]
+    assert buckets["humidity"]["mean"] == [None, None, None, None]
+
+
+def test_downsampled_query_merges_buckets(store):
+    for minute in range(10):
+        store.record("sensor-1", {"temperature": float(minute)}, START + minute * 60)
+
+    result = store.query("sensor-1", START, START + 599, 300, ["temperature"], START + 600)
+
+    assert result["resolution"] == 300
+    assert result["buckets"]["time"] == [START, START + 300]
+    assert result["buckets"]["temperature"] == {
+        "min": [0.0, 5.0],
+        "max": [4.0, 9.0],
+        "mean": [2.0, 7.0],
+        "count": [5, 5],
+    }
+
+
+def test_hourly_tier_answers_long_ranges_and_survives_reopen(store):
+    for hour in range(3):
+        store.record("sensor-1", {"temperature": 10.0 + hour}, START + hour * 3600)
+    store.close_all()
+
+    result = store.query("sensor-1", START, START + 3 * 86400, None, ["temperature"], START + 3 * 3600)
+
+    assert result["tier"] == "1h"
+    assert result["buckets"]["time"] == [START, START + 3600, START + 7200]
+    assert result["buckets"]["temperature"]["mean"] == [10.0, 11.0, 12.0]
+    assert store.query("unknown", START, START + 60, None, None, START) is None
+
+
+def test_old_buckets_are_overwritten_once_retention_wraps(tmp_path, monkeypatch):
+    monkeypatch.delenv("HISTORY_ENABLED", raising=False)
+    store = HistoryStore(str(tmp_path), {"1m": 5 / 1440, "1h": 1})
+    store.open("sensor-1", ["temperature"])
+    for minute in range(8):
+        store.record("sensor-1", {"temperature": float(minute)}, START + minute * 60)
+
+    buckets = store.query("sensor-1", START, START + 8 * 60, 60, None, START + 8 * 60)["buckets"]
+    store.close_all()
+
+    assert buckets["time"] == [START + minute * 60 for minute in range(4, 8)]
+    assert buckets["temperature"]["mean"] == [4.0, 5.0, 6.0, 7.0]
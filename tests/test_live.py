@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+from piphi_network_official_i2c_library.lib.latest import LatestCache, latest
+
+
+def test_readings_fan_out_to_matching_subscribers_and_drop_the_oldest():
+    cache = LatestCache(buffer_size=3)
+    cache.update("d0", {"device_id": "d0", "n": -1})
+    everything = cache.subscribe()
+    only_d1 = cache.subscribe(["d1"])
+
+    for n in range(4):
+        cache.update("d0", {"device_id": "d0", "n": n})
+    cache.update("d1", {"device_id": "d1", "n": 0})
+
+    assert [json.loads(message) for message in everything.buffer] == [
+        {"device_id": "d0", "n": 2},
+        {"device_id": "d0", "n": 3},
+        {"device_id": "d1", "n": 0},
+    ]
+    assert everything.dropped == 3
+    assert list(only_d1.buffer) == [everything.buffer[-1]]
+    assert only_d1.buffer[0] is everything.buffer[-1]
+
+    cache.unsubscribe(everything)
+    cache.update("d0", {"device_id": "d0", "n": 4})
+    assert json.loads(everything.buffer[-1])["n"] == 0
+
+
+def test_get_waits_for_the_next_reading_or_times_out():
+    async def run():
+        cache = LatestCache(buffer_size=2)
+        subscription = cache.subscribe()
+        assert await subscription.get(timeout=0.01) is None
+        asyncio.get_running_loop().call_later(0.01, cache.update, "d0", {"device_id": "d0"})
+        return await subscription.get(timeout=1)
+
+    assert json.loads(asyncio.run(run())) == {"device_id": "d0"}
+
+
+def test_websocket_streams_the_requested_device_and_unsubscribes_on_close(client, wait_for):
+    for device_id, usbpath in (("d0", "/dev/ttySIM0"), ("d1", "/dev/ttySIM1")):
+        client.post("/config", json={"id": device_id, "usbpath": usbpath, "secret": "s", "interval": 0.05})
+    wait_for(lambda: client.get("/devices/d1/latest").status_code == 200)
+
+    with client.websocket_connect("/devices/ws?device_id=d1") as websocket:
+        readings = [json.loads(websocket.receive_text()) for _ in range(3)]
+        assert len(latest.subscribers) == 1
+
+    assert {reading["device_id"] for reading in readings} == {"d1"}
+    assert readings[1]["timestamp"] != readings[2]["timestamp"]
+    wait_for(lambda: not latest.subscribers)
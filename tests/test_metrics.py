@@ -0,0 +1,45 @@
+import re
+
+from piphi_network_official_i2c_library.lib.metrics import Registry
+
+
+def test_registry_renders_the_prometheus_text_format():
+    registry = Registry()
+    counter = registry.counter("test_errors_total", "Errors.", ("adapter",))
+    histogram = registry.histogram("test_seconds", "Durations.", buckets=(0.1, 1.0))
+    registry.sampled("test_depth", "Depth.", lambda: 3)
+    counter.labels('/dev/tty"A"').inc()
+    counter.labels('/dev/tty"A"').inc(2)
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+
+    assert registry.render().splitlines() == [
+        "# HELP test_errors_total Errors.",
+        "# TYPE test_errors_total counter",
+        'test_errors_total{adapter="/dev/tty\\"A\\""} 3.0',
+        "# HELP test_seconds Durations.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1.0"} 2',
+        'test_seconds_bucket{le="+Inf"} 3',
+        "test_seconds_sum 5.55",
+        "test_seconds_count 3",
+        "# HELP test_depth Depth.",
+        "# TYPE test_depth gauge",
+        "test_depth 3.0",
+    ]
+
+
+def test_metrics_endpoint_reports_i2c_and_publisher_activity(client, wait_for):
+    client.post("/config", json={"id": "d0", "usbpath": "/dev/ttySIM0", "secret": "s", "interval": 0.05})
+    wait_for(lambda: client.get("/devices/d0/latest").status_code == 200)
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    count = re.search(r'^piphi_i2c_transaction_seconds_count\{adapter="/dev/ttySIM0"\} (\d+)$', text, re.M)
+    assert count and int(count.group(1)) > 0
+    assert "# TYPE piphi_mqtt_connected gauge" in text
+    assert "# TYPE piphi_mqtt_published_total counter" in text
@@ -0,0 +1,38 @@
+import asyncio
+
+from piphi_network_official_i2c_library.lib.metrics import publish_latency
+from piphi_network_official_i2c_library.lib.publisher import MQTTPublisher
+
+
+def observed():
+    return sum(publish_latency.labels().counts)
+
+
+def test_publish_latency_is_observed_for_queued_messages_only(tmp_path, monkeypatch, broker):
+    monkeypatch.setenv("SPOOL_ENABLED", "1")
+    monkeypatch.setenv("SPOOL_DIR", str(tmp_path))
+    publisher = MQTTPublisher()
+    publisher.client_factory = broker.client
+    publisher.backoff_min = publisher.backoff_max = 0.01
+    before = observed()
+
+    async def run():
+        broker.available = False
+        await publisher.start()
+        publisher.publish("piphi/test", "spooled 0")
+        publisher.publish("piphi/test", "spooled 1")
+        broker.available = True
+        for _ in range(100):
+            if broker.delivered >= 2:
+                break
+            await asyncio.sleep(0.01)
+        publisher.publish("piphi/test", "live")
+        for _ in range(100):
+            if broker.delivered >= 3:
+                break
+            await asyncio.sleep(0.01)
+        await publisher.stop()
+
+    asyncio.run(run())
+    assert [payload for _, payload, _, _ in broker.messages] == ["spooled 0", "spooled 1", "live"]
+    assert observed() - before == 1
@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import pytest
+
+from piphi_network_official_i2c_library.lib.scheduler import PollScheduler
+
+
+async def noop():
+    pass
+
+
+def test_jobs_on_one_adapter_share_a_phase_per_interval():
+    scheduler = PollScheduler(jitter=0.5)
+    started = time.monotonic()
+    jobs = [scheduler.add(f"a{index}", "/dev/ttyA", 10, noop) for index in range(4)]
+    slower = scheduler.add("slow", "/dev/ttyA", 20, noop)
+    aligned = scheduler.add("aligned", "/dev/ttyA", 10, noop, aligned=True)
+
+    assert len({job.due for job in jobs}) == 1
+    assert started <= jobs[0].due <= started + 5
+    assert started <= slower.due <= started + 10
+    assert aligned.due % 10 == 0
+
+    scheduler.set_interval("a3", 20)
+    assert jobs[3].due == slower.due
+    scheduler.set_interval("a3", 10)
+    assert jobs[3].due == jobs[0].due
+
+
+def test_runs_at_a_fixed_rate():
+    async def run():
+        scheduler = PollScheduler(jitter=0)
+        moments = []
+
+        async def sample():
+            moments.append(time.monotonic())
+
+        job = scheduler.add("job", "/dev/ttyA", 0.05, sample)
+        first = job.due
+        await scheduler.start()
+        await asyncio.sleep(0.27)
+        await scheduler.stop()
+        return first, moments
+
+    first, moments = asyncio.run(run())
+    assert len(moments) >= 5
+    for index, moment in enumerate(moments):
+        assert 0 <= moment - (first + index * 0.05) < 0.03
+
+
+def test_due_jobs_on_one_adapter_run_in_one_slot_ordered_by_channel():
+    async def run():
+        scheduler = PollScheduler(jitter=0.5)
+        order = []
+
+        def job(channel):
+            async def sample():
+                order.append(channel)
+                await asyncio.sleep(0.005)
+
+            return sample
+
+        for channel in (2, 0, 3, 1):
+            scheduler.add(f"ch{channel}", "/dev/ttyA", 0.1, job(channel), channel=channel)
+        await scheduler.start()
+        await asyncio.sleep(0.35)
+        await scheduler.stop()
+        return order
+
+    order = asyncio.run(run())
+    assert len(order) >= 8
+    assert order[:8] == [0, 1, 2, 3, 0, 1, 2, 3]
+
+
+def test_slow_job_is_skipped_instead_of_queued_twice():
+    async def run():
+        scheduler = PollScheduler(jitter=0)
+        running = []
+
+        async def slow():
+            running.append(len(running) + 1)
+            await asyncio.sleep(0.08)
+            running.append(-1)
+
+        job = scheduler.add("slow", "/dev/ttyA", 0.02, slow)
+        await scheduler.start()
+        await asyncio.sleep(0.2)
+        await scheduler.stop()
+        return job, scheduler, running
+
+    job, scheduler, running = asyncio.run(run())
+    assert job.overruns > 0
+    assert scheduler.overruns == job.overruns
+    depth = 0
+    for event in running:
+        depth += 1 if event > 0 else -1
+        assert depth <= 1
+
+
+def test_non_positive_interval_is_refused():
+    scheduler = PollScheduler()
+    with pytest.raises(ValueError):
+        scheduler.add("job", "/dev/ttyA", 0, noop)
+    scheduler.add("job", "/dev/ttyA", 1, noop)
+    with pytest.raises(ValueError):
+        scheduler.set_interval("job", -1)
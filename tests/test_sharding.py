@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from piphi_network_official_i2c_library.lib.common import PiPhiMCP2221
+from piphi_network_official_i2c_library.lib.latest import latest
+from piphi_network_official_i2c_library.lib.sharding import ShardSupervisor
+
+
+async def eventually(predicate, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not met in time"
+        await asyncio.sleep(0.05)
+
+
+def test_adapters_are_split_by_a_stable_hash():
+    usbpaths = [f"/dev/ttySIM{index}" for index in range(16)]
+    shards = [PiPhiMCP2221.shard_for(usbpath, 3) for usbpath in usbpaths]
+
+    assert shards == [PiPhiMCP2221.shard_for(usbpath, 3) for usbpath in usbpaths]
+    assert set(shards) == {0, 1, 2}
+
+
+def test_worker_that_dies_is_restarted_and_resumes_its_devices(tmp_path, monkeypatch):
+    monkeypatch.setenv("SIMULATED_ADAPTERS", "4")
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("SPOOL_ENABLED", "0")
+    monkeypatch.setenv("HISTORY_ENABLED", "0")
+    monkeypatch.setenv("MQTT_PORT", "1")
+    monkeypatch.setattr(latest, "readings", {})
+
+    async def run():
+        supervisor = ShardSupervisor(2, request_timeout=10)
+        supervisor.backoff_min = 0.1
+        await supervisor.start()
+        try:
+            await eventually(lambda: supervisor.ready)
+            discovered = await supervisor.discover()
+            assert sorted(device["usbpath"] for device in discovered["devices"]) == [
+                f"/dev/ttySIM{index}" for index in range(4)
+            ]
+            payload = {"id": "d0", "usbpath": "/dev/ttySIM0", "secret": "s", "interval": 0.1}
+            await supervisor.configure(payload)
+            await eventually(lambda: latest.get("d0") is not None)
+
+            shard = supervisor.shard_for("/dev/ttySIM0")
+            pid = shard.pid
+            shard.process.kill()
+            await eventually(lambda: shard.restarts == 1 and shard.ready)
+            latest.readings.pop("d0", None)
+            await eventually(lambda: latest.get("d0") is not None)
+            return pid, supervisor.stats()
+        finally:
+            await supervisor.stop()
+
+    pid, stats = asyncio.run(run())
+    worker = stats["workers"][PiPhiMCP2221.shard_for("/dev/ttySIM0", 2)]
+    assert worker["pid"] != pid
+    assert (worker["restarts"], worker["devices"]) == (1, 1)
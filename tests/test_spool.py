@@ -0,0 +1,91 @@
+import asyncio
+import os
+
+from piphi_network_official_i2c_library.lib.publisher import MQTTPublisher
+from piphi_network_official_i2c_library.lib.spool import SegmentLog
+
+
+def segment_files(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".seg"))
+
+
+def tear_tail(directory, length=3):
+    path = segment_files(directory)[-1]
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - length)
+
+
+def test_replay_skips_torn_tail_and_resumes_after_restart(tmp_path):
+    spool = SegmentLog(str(tmp_path))
+    for index in range(3):
+        spool.append("piphi/a", f"message {index}", retain=index == 0)
+    records, position = spool.read_batch(1)
+    assert records == [("piphi/a", "message 0", True)]
+    spool.commit(position)
+    spool.close()
+    tear_tail(str(tmp_path))
+
+    spool = SegmentLog(str(tmp_path))
+    spool.append("piphi/b", b"\x00binary")
+    records, position = spool.read_batch(10)
+    assert records == [("piphi/a", "message 1", False), ("piphi/b", b"\x00binary", False)]
+    spool.commit(position)
+    spool.close()
+
+    spool = SegmentLog(str(tmp_path))
+    assert not spool.pending()
+    assert spool.read_batch(10)[0] == []
+    assert len(segment_files(str(tmp_path))) == 1
+
+
+def test_drop_newest_rejects_records_once_full(tmp_path):
+    spool = SegmentLog(str(tmp_path), segment_size=64, max_segments=2, policy="drop_newest")
+    accepted = [spool.append("t", "x" * 40) for _ in range(4)]
+    assert accepted == [True, True, False, False]
+    assert spool.rejected == 2
+
+
+def test_publisher_replays_spool_after_outage_and_restart(tmp_path, monkeypatch, broker):
+    monkeypatch.setenv("SPOOL_ENABLED", "1")
+    monkeypatch.setenv("SPOOL_DIR", str(tmp_path))
+
+    def publisher():
+        publisher = MQTTPublisher()
+        publisher.client_factory = broker.client
+        publisher.backoff_min = publisher.backoff_max = 0.01
+        return publisher
+
+    async def outage():
+        broker.available = False
+        first = publisher()
+        await first.start()
+        for index in range(5):
+            first.publish("piphi/test", f"message {index}")
+        await asyncio.sleep(0.05)
+        await first.stop()
+        return first
+
+    first = asyncio.run(outage())
+    assert (broker.delivered, first.spooled) == (0, 5)
+    tear_tail(str(tmp_path))
+
+    async def restart():
+        broker.available = True
+        second = publisher()
+        await second.start()
+        for _ in range(100):
+            if broker.delivered >= 4:
+                break
+            await asyncio.sleep(0.01)
+        second.publish("piphi/test", "live")
+        await asyncio.sleep(0.05)
+        await second.stop()
+
+    asyncio.run(restart())
+    assert [payload for _, payload, _, _ in broker.messages] == [
+        "message 0",
+        "message 1",
+        "message 2",
+        "message 3",
+        "live",
+    ]
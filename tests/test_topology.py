@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from piphi_network_official_i2c_library.lib.adapter_io import AdapterIO, BusIO
+from piphi_network_official_i2c_library.lib.common import PiPhiMCP2221
+from piphi_network_official_i2c_library.lib.simulator import SimulatedFleet
+from piphi_network_official_i2c_library.lib.topology import ChannelIO
+
+USBPATH = "/dev/ttySIM0"
+
+
+@pytest.fixture
+def fleet(monkeypatch):
+    fleet = SimulatedFleet(1, sensors=("AHT20", "BME280", "PMSA003I"), latency=0, open_latency=0, mux_channels=3)
+    monkeypatch.setattr(PiPhiMCP2221, "device_factory", fleet.device)
+    yield fleet
+    PiPhiMCP2221.forget_adapter(USBPATH)
+
+
+def probe(fleet):
+    value = {"usbpath": USBPATH, "serial": fleet.ports[0].serial_number}
+    return asyncio.run(PiPhiMCP2221().probe_adapter(0, value))
+
+
+def test_sensors_behind_the_mux_are_mapped_to_their_channels(fleet):
+    value = probe(fleet)
+
+    assert value["mux_address"] == 0x70
+    assert [sensor["sensor_id"] for sensor in value["sensors"]] == ["ch0:0x38", "ch1:0x76", "ch2:0x12"]
+    assert value["sensor"] == "AHT20"
+    assert fleet.devices[0].mux.mask == 0x00
+
+
+def test_channel_left_selected_by_a_previous_run_is_not_taken_for_the_root_bus(fleet):
+    fleet.devices[0].mux.mask = 1 << 1
+
+    value = probe(fleet)
+
+    assert [(sensor["sensor_id"], sensor["channel"]) for sensor in value["sensors"]] == [
+        ("ch0:0x38", 0),
+        ("ch1:0x76", 1),
+        ("ch2:0x12", 2),
+    ]
+
+
+def test_channel_io_selects_its_channel_once_on_the_adapter_worker(fleet):
+    probe(fleet)
+    topology = PiPhiMCP2221.mcp_mapping[USBPATH]
+    mux = fleet.devices[0].mux
+
+    async def read():
+        first, second = topology.channel_io(2), topology.channel_io(2)
+        assert isinstance(first, ChannelIO) and isinstance(first, BusIO)
+        assert topology.channel_io(None) is topology.io
+        frames = [bytes(await io.i2c_read(topology.mcp, 0x12, 2)) for io in (first, second)]
+        return frames
+
+    switches = topology.switches.value
+    frames = asyncio.run(read())
+
+    assert frames == [b"BM", b"BM"]
+    assert (mux.mask, topology.selected) == (1 << 2, 2)
+    assert topology.switches.value == switches + 1
+    assert isinstance(topology.io, AdapterIO)